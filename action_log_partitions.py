@@ -0,0 +1,150 @@
+import logging
+from datetime import date
+from typing import Dict, Any, List, Optional
+
+from config import AUDIT_RETENTION_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Колонки и индексы журнала действий. Секционированная таблица в MySQL не может
+# иметь внешних ключей, а первичный ключ обязан включать ключ секционирования.
+_ACTION_LOGS_COLUMNS = """
+    log_id BIGINT UNSIGNED NOT NULL AUTO_INCREMENT,
+    user_id BIGINT DEFAULT NULL,
+    deal_id BINARY(16),
+    action VARCHAR(100) NOT NULL,
+    details TEXT,
+    ip_address VARCHAR(45),
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (log_id, created_at),
+    INDEX idx_user_created (user_id, created_at),
+    INDEX idx_deal_action (deal_id, action)
+"""
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.year * 12 + day.month - 1 + months
+    return date(month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    """Имя секции месяца: p202610 - записи за октябрь 2026"""
+    return f"p{month:%Y%m}"
+
+
+def oldest_retained_month(today: Optional[date] = None) -> date:
+    """Первый месяц, который еще хранится по политике retention_months"""
+    return add_months(month_start(today or date.today()), -AUDIT_RETENTION_SETTINGS['retention_months'])
+
+
+def _partition_clause(month: date) -> str:
+    return f"PARTITION {partition_name(month)} VALUES LESS THAN ('{add_months(month, 1):%Y-%m-%d}')"
+
+
+def action_logs_ddl(table: str = "action_logs", first_month: Optional[date] = None) -> str:
+    """CREATE TABLE журнала с секциями от first_month до premake_months вперед
+
+    Последняя секция pmax (MAXVALUE) всегда пуста: новые месяцы выделяются
+    из нее через REORGANIZE PARTITION без копирования данных.
+    """
+    current = month_start(date.today())
+    month = month_start(first_month or current)
+    last = add_months(current, AUDIT_RETENTION_SETTINGS['premake_months'])
+    partitions = []
+    while month <= last:
+        partitions.append(_partition_clause(month))
+        month = add_months(month, 1)
+    partitions.append("PARTITION pmax VALUES LESS THAN (MAXVALUE)")
+    return (
+        f"CREATE TABLE IF NOT EXISTS {table} ({_ACTION_LOGS_COLUMNS}) "
+        f"ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci "
+        f"PARTITION BY RANGE COLUMNS(created_at) ({', '.join(partitions)})"
+    )
+
+
+class ActionLogPartitions:
+    """Ротация помесячных секций action_logs и применение политики хранения
+
+    Новые секции создаются заранее (premake_months), секции старше
+    retention_months удаляются DROP PARTITION или, при archive=True,
+    переносятся в отдельную таблицу EXCHANGE PARTITION. Обе операции
+    меняют только метаданные и не зависят от числа строк.
+    """
+
+    def __init__(self, db, table: str = "action_logs"):
+        self.db = db
+        self.table = table
+
+    async def list_partitions(self) -> List[Dict[str, Any]]:
+        """Секции таблицы с их верхней границей (пусто, если таблица не секционирована)"""
+        async with self.db.query('action_log_partitions') as cursor:
+            await cursor.execute(
+                """SELECT partition_name, partition_description, table_rows
+                   FROM information_schema.partitions
+                   WHERE table_schema = DATABASE() AND table_name = %s AND partition_name IS NOT NULL
+                   ORDER BY partition_ordinal_position""",
+                (self.table,),
+                name='list_partitions'
+            )
+            return [
+                {'name': name, 'less_than': description, 'rows': rows}
+                for name, description, rows in await cursor.fetchall()
+            ]
+
+    async def rotate(self, today: Optional[date] = None) -> Dict[str, List[str]]:
+        """Создание будущих секций и удаление/архивирование просроченных"""
+        partitions = await self.list_partitions()
+        if not partitions:
+            logger.warning(f"⚠️ Таблица {self.table} не секционирована, запустите migrate_action_logs.py")
+            return {'created': [], 'expired': []}
+
+        current = month_start(today or date.today())
+        existing = {partition['name'] for partition in partitions}
+        created = await self._create_future(current, existing)
+        expired = await self._expire_old(current, [p['name'] for p in partitions if p['name'] != 'pmax'])
+        if created or expired:
+            logger.info(f"🗂️ Секции {self.table}: созданы {created}, удалены/архивированы {expired}")
+        return {'created': created, 'expired': expired}
+
+    async def _create_future(self, current: date, existing: set) -> List[str]:
+        created = []
+        for i in range(AUDIT_RETENTION_SETTINGS['premake_months'] + 1):
+            month = add_months(current, i)
+            if partition_name(month) in existing:
+                continue
+            # pmax пуста, поэтому REORGANIZE не переносит строк
+            async with self.db.query('action_log_partition_add') as cursor:
+                await cursor.execute(
+                    f"ALTER TABLE {self.table} REORGANIZE PARTITION pmax INTO "
+                    f"({_partition_clause(month)}, PARTITION pmax VALUES LESS THAN (MAXVALUE))"
+                )
+            created.append(partition_name(month))
+        return created
+
+    async def _expire_old(self, current: date, names: List[str]) -> List[str]:
+        oldest_kept = partition_name(oldest_retained_month(current))
+        expired = []
+        for name in names:
+            if name >= oldest_kept:
+                continue
+            if AUDIT_RETENTION_SETTINGS['archive']:
+                await self._archive(name)
+            else:
+                async with self.db.query('action_log_partition_drop') as cursor:
+                    await cursor.execute(f"ALTER TABLE {self.table} DROP PARTITION {name}")
+            expired.append(name)
+        return expired
+
+    async def _archive(self, name: str):
+        """Перенос секции в таблицу {table}_archive_YYYYMM обменом (EXCHANGE PARTITION)"""
+        archive = f"{self.table}_archive_{name[1:]}"
+        async with self.db.query('action_log_partition_archive') as cursor:
+            await cursor.execute(f"CREATE TABLE IF NOT EXISTS {archive} LIKE {self.table}")
+            await cursor.execute(f"ALTER TABLE {archive} REMOVE PARTITIONING")
+            await cursor.execute(f"ALTER TABLE {self.table} EXCHANGE PARTITION {name} WITH TABLE {archive}")
+            await cursor.execute(f"ALTER TABLE {self.table} DROP PARTITION {name}")
+        logger.info(f"📦 Секция {name} перенесена в {archive}")
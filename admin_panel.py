@@ -1,20 +1,23 @@
 import asyncio
+import html
 import logging
-from typing import Dict, List
+from typing import Dict, List, Any
 from datetime import datetime, timedelta
 
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import InlineKeyboardMarkup
 
-from database_manager import DatabaseManager
+from storage_backend import StorageBackend, Notification
+from broadcast import BroadcastEngine
+from pagination import page_navigation_row, parse_page_callback
+import keyboards
 from config import BOT_TOKEN, NOTIFICATION_SETTINGS
 
 logger = logging.getLogger(__name__)
 
 class AdminPanel:
-    def __init__(self, db: DatabaseManager, bot: Bot):
+    def __init__(self, db: StorageBackend, bot: Bot):
         self.db = db
         self.bot = bot
         self.admin_chat_id = NOTIFICATION_SETTINGS.get('admin_chat_id')
@@ -25,17 +28,7 @@ class AdminPanel:
     
     def get_admin_keyboard(self) -> InlineKeyboardMarkup:
         """Главное меню администратора"""
-        builder = InlineKeyboardBuilder()
-        builder.button(text="📊 Статистика", callback_data="admin_stats")
-        builder.button(text="👥 Пользователи", callback_data="admin_users")
-        builder.button(text="💼 Активные сделки", callback_data="admin_active_deals")
-        builder.button(text="📋 Все сделки", callback_data="admin_all_deals")
-        builder.button(text="💰 Завершить сделку", callback_data="admin_complete_deal")
-        builder.button(text="❌ Отменить сделку", callback_data="admin_cancel_deal")
-        builder.button(text="📨 Рассылка", callback_data="admin_broadcast")
-        builder.button(text="🔒 Заблокировать пользователя", callback_data="admin_block_user")
-        builder.adjust(2, 2, 2, 2)
-        return builder.as_markup()
+        return keyboards.ADMIN_MENU
     
     async def send_admin_menu(self, chat_id: int):
         """Отправка админского меню"""
@@ -51,8 +44,14 @@ class AdminPanel:
         """Показ статистики бота"""
         stats = await self.db.get_admin_stats()
         
-        # Получаем статистику за последние 24 часа
-        today_stats = await self._get_today_stats()
+        # Получаем статистику за сегодня и за неделю из дневной сводки
+        today_stats, week_stats = await asyncio.gather(
+            self._get_today_stats(),
+            self._get_period_stats(7)
+        )
+        payments_today = ", ".join(
+            f"{crypto_type}: {volume:.2f}" for crypto_type, volume in sorted(today_stats['payments'].items())
+        ) or "нет"
         
         text = (
             f"📊 <b>Статистика Modern Escrow Bot</b>\n\n"
@@ -60,75 +59,85 @@ class AdminPanel:
             f"💼 Активных сделок: <b>{stats.get('active_deals', 0)}</b>\n"
             f"✅ Завершенных сделок: <b>{stats.get('completed_deals', 0)}</b>\n"
             f"💰 Общий объем: <b>{stats.get('total_volume', 0):.2f} USDT</b>\n\n"
-            f"📈 <b>За последние 24 часа:</b>\n"
+            f"📈 <b>За сегодня:</b>\n"
             f"👤 Новых пользователей: <b>{today_stats.get('new_users', 0)}</b>\n"
             f"💼 Новых сделок: <b>{today_stats.get('new_deals', 0)}</b>\n"
-            f"✅ Завершенных сделок: <b>{today_stats.get('completed_today', 0)}</b>\n"
-            f"💰 Объем за день: <b>{today_stats.get('volume_today', 0):.2f} USDT</b>"
+            f"✅ Завершенных сделок: <b>{today_stats.get('completed', 0)}</b>\n"
+            f"💰 Объем за день: <b>{today_stats.get('volume', 0):.2f} USDT</b>\n"
+            f"💳 Платежи за день: <b>{payments_today}</b>\n\n"
+            f"📅 <b>За 7 дней:</b>\n"
+            f"👤 Новых пользователей: <b>{week_stats['new_users']}</b>\n"
+            f"💼 Новых сделок: <b>{week_stats['new_deals']}</b>\n"
+            f"✅ Завершенных сделок: <b>{week_stats['completed']}</b>\n"
+            f"💰 Объем: <b>{week_stats['volume']:.2f} USDT</b>"
         )
         
-        back_button = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")]
-        ])
-        
         await self.bot.send_message(
             chat_id=chat_id,
             text=text,
-            reply_markup=back_button,
+            reply_markup=keyboards.ADMIN_BACK,
             parse_mode="HTML"
         )
     
-    async def show_active_deals(self, chat_id: int):
-        """Показ активных сделок"""
-        try:
-            async with self.db.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute("""
-                        SELECT d.deal_id, d.creator_id, d.buyer_id, d.amount, 
-                               d.status, d.created_at, u1.username as creator_username,
-                               u2.username as buyer_username
-                        FROM deals d
-                        LEFT JOIN users u1 ON d.creator_id = u1.user_id
-                        LEFT JOIN users u2 ON d.buyer_id = u2.user_id
-                        WHERE d.status IN ('active', 'joined', 'paid')
-                        ORDER BY d.created_at DESC
-                        LIMIT 10
-                    """)
-                    deals = await cursor.fetchall()
-            
-            if not deals:
-                text = "💼 <b>Активные сделки</b>\n\nНет активных сделок."
-            else:
-                text = "💼 <b>Активные сделки</b>\n\n"
-                for deal in deals:
-                    deal_id, creator_id, buyer_id, amount, status, created_at, creator_username, buyer_username = deal
-                    status_emoji = {"active": "🟡", "joined": "🔵", "paid": "🟠"}.get(status, "❓")
-                    
-                    buyer_info = f"@{buyer_username}" if buyer_username else "Ожидание"
-                    
-                    text += (
-                        f"{status_emoji} <code>{deal_id[:8]}...</code>\n"
-                        f"💰 {amount} USDT | 👤 @{creator_username} → {buyer_info}\n"
-                        f"📅 {created_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-                    )
-            
-            back_button = InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")]
-            ])
-            
-            await self.bot.send_message(
-                chat_id=chat_id,
-                text=text,
-                reply_markup=back_button,
-                parse_mode="HTML"
-            )
-            
-        except Exception as e:
-            logger.error(f"Ошибка получения активных сделок: {e}")
+    async def show_active_deals(self, chat_id: int, position: Dict[str, Any] = None):
+        """Показ активных сделок (постранично, position - after / before из курсора)"""
+        page = await self.db.get_active_deals(**(position or {}))
+        if page is None:
             await self.bot.send_message(
                 chat_id=chat_id,
                 text="❌ Ошибка получения данных о сделках"
             )
+            return
+        
+        deals = page['deals']
+        if not deals:
+            text = "💼 <b>Активные сделки</b>\n\nНет активных сделок."
+        else:
+            text = "💼 <b>Активные сделки</b>\n\n"
+            for deal in deals:
+                status_emoji = {"active": "🟡", "joined": "🔵", "paid": "🟠"}.get(deal['status'], "❓")
+                
+                buyer_info = f"@{deal['buyer_username']}" if deal['buyer_username'] else "Ожидание"
+                
+                text += (
+                    f"{status_emoji} <code>{deal['deal_id']}</code>\n"
+                    f"💰 {deal['amount']} USDT | 👤 @{deal['creator_username']} → {buyer_info}\n"
+                    f"📅 {deal['created_at'].strftime('%d.%m.%Y %H:%M')}\n\n"
+                )
+        
+        await self.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=keyboards.with_navigation(page_navigation_row("admin_ad", page), keyboards.ADMIN_BACK),
+            parse_mode="HTML"
+        )
+    
+    async def show_audit_log(self, chat_id: int, user_id: int, days: int = 7):
+        """Журнал действий пользователя за последние days дней
+        
+        Период задается диапазоном created_at, поэтому запрос читает только
+        секции action_logs за эти месяцы.
+        """
+        since = datetime.now() - timedelta(days=days)
+        logs = await self.db.get_action_logs(since, user_id=user_id, limit=30)
+        
+        if not logs:
+            text = f"🗂️ <b>Журнал пользователя {user_id}</b> за {days} дн.\n\nЗаписей нет."
+        else:
+            text = f"🗂️ <b>Журнал пользователя {user_id}</b> за {days} дн.\n\n"
+            for log in logs:
+                deal_info = f" <code>{log['deal_id']}</code>" if log['deal_id'] else ""
+                text += (
+                    f"📅 {log['created_at'].strftime('%d.%m.%Y %H:%M')} "
+                    f"<b>{html.escape(log['action'])}</b>{deal_info}\n"
+                )
+        
+        await self.bot.send_message(
+            chat_id=chat_id,
+            text=text,
+            reply_markup=keyboards.ADMIN_BACK,
+            parse_mode="HTML"
+        )
     
     async def force_complete_deal(self, deal_id: str) -> bool:
         """Принудительное завершение сделки администратором"""
@@ -138,15 +147,14 @@ class AdminPanel:
             if not deal:
                 return False
             
-            # Завершаем сделку
-            success = await self.db.complete_deal(deal_id)
+            # Завершаем сделку; уведомления участникам доставит отправщик outbox
+            success = await self.db.complete_deal(
+                deal_id, self._participant_notifications(deal, "✅ <b>Сделка завершена администратором</b>")
+            )
             
             if success:
-                # Уведомляем участников
-                await self._notify_deal_completion(deal)
-                
                 # Логируем действие администратора
-                await self.db._log_action(
+                await self.db.log_action(
                     self.admin_chat_id, 
                     deal_id, 
                     "admin_force_complete", 
@@ -167,15 +175,14 @@ class AdminPanel:
             if not deal:
                 return False
             
-            # Отменяем сделку
-            success = await self.db.cancel_deal(deal_id)
+            # Отменяем сделку; уведомления участникам доставит отправщик outbox
+            success = await self.db.cancel_deal(
+                deal_id, self._participant_notifications(deal, "❌ <b>Сделка отменена администратором</b>")
+            )
             
             if success:
-                # Уведомляем участников
-                await self._notify_deal_cancellation(deal)
-                
                 # Логируем действие администратора
-                await self.db._log_action(
+                await self.db.log_action(
                     self.admin_chat_id, 
                     deal_id, 
                     "admin_force_cancel", 
@@ -191,164 +198,71 @@ class AdminPanel:
     async def broadcast_message(self, message_text: str) -> Dict[str, int]:
         """Рассылка сообщения всем пользователям"""
         try:
-            async with self.db.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute("SELECT user_id FROM users WHERE is_active = TRUE")
-                    users = await cursor.fetchall()
-            
-            sent_count = 0
-            failed_count = 0
-            
-            for user in users:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user[0],
-                        text=f"📢 <b>Сообщение от администрации</b>\n\n{message_text}",
-                        parse_mode="HTML"
-                    )
-                    sent_count += 1
-                    await asyncio.sleep(0.1)  # Чтобы не превысить лимиты API
-                except Exception:
-                    failed_count += 1
-            
-            return {"sent": sent_count, "failed": failed_count}
-            
+            return await BroadcastEngine(self.db, self.bot).start(message_text)
         except Exception as e:
             logger.error(f"Ошибка рассылки: {e}")
-            return {"sent": 0, "failed": 0}
+            return {"sent": 0, "failed": 0, "blocked": 0}
     
-    async def block_user(self, user_id: int) -> bool:
-        """Блокировка пользователя"""
+    async def resume_broadcasts(self) -> List[Dict[str, int]]:
+        """Продолжение рассылок, прерванных остановкой бота"""
         try:
-            async with self.db.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        "UPDATE users SET is_active = FALSE WHERE user_id = %s",
-                        (user_id,)
-                    )
-                    
-                    # Отменяем все активные сделки пользователя
-                    await cursor.execute(
-                        "UPDATE deals SET status = 'cancelled' WHERE (creator_id = %s OR buyer_id = %s) AND status IN ('active', 'joined', 'paid')",
-                        (user_id, user_id)
-                    )
-                    
-                    # Логируем действие
-                    await self.db._log_action(
-                        self.admin_chat_id, 
-                        None, 
-                        "admin_block_user", 
-                        f"User {user_id} blocked by admin"
-                    )
-                    
-                    return True
-                    
+            return await BroadcastEngine(self.db, self.bot).resume_unfinished()
         except Exception as e:
-            logger.error(f"Ошибка блокировки пользователя {user_id}: {e}")
-            return False
+            logger.error(f"Ошибка возобновления рассылок: {e}")
+            return []
+    
+    async def block_user(self, user_id: int) -> bool:
+        """Блокировка пользователя (с отменой его активных сделок)"""
+        return await self.db.block_user(user_id, self.admin_chat_id)
     
-    async def _get_today_stats(self) -> Dict[str, int]:
+    async def _get_today_stats(self) -> Dict[str, Any]:
         """Получение статистики за сегодня"""
-        try:
-            today = datetime.now().date()
-            async with self.db.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    stats = {}
-                    
-                    # Новые пользователи за сегодня
-                    await cursor.execute(
-                        "SELECT COUNT(*) FROM users WHERE DATE(registration_date) = %s",
-                        (today,)
-                    )
-                    stats['new_users'] = (await cursor.fetchone())[0]
-                    
-                    # Новые сделки за сегодня
-                    await cursor.execute(
-                        "SELECT COUNT(*) FROM deals WHERE DATE(created_at) = %s",
-                        (today,)
-                    )
-                    stats['new_deals'] = (await cursor.fetchone())[0]
-                    
-                    # Завершенные сделки за сегодня
-                    await cursor.execute(
-                        "SELECT COUNT(*) FROM deals WHERE DATE(updated_at) = %s AND status = 'completed'",
-                        (today,)
-                    )
-                    stats['completed_today'] = (await cursor.fetchone())[0]
-                    
-                    # Объем за сегодня
-                    await cursor.execute(
-                        "SELECT SUM(amount) FROM deals WHERE DATE(updated_at) = %s AND status = 'completed'",
-                        (today,)
-                    )
-                    result = await cursor.fetchone()
-                    stats['volume_today'] = float(result[0]) if result[0] else 0.0
-                    
-                    return stats
-                    
-        except Exception as e:
-            logger.error(f"Ошибка получения статистики за сегодня: {e}")
-            return {}
+        return await self._get_period_stats(1)
     
-    async def _notify_deal_completion(self, deal: Dict):
-        """Уведомление о завершении сделки"""
-        try:
-            completion_message = (
-                f"✅ <b>Сделка завершена администратором</b>\n\n"
-                f"🆔 ID: <code>{deal['deal_id']}</code>\n"
-                f"💰 Сумма: {deal['amount']} USDT\n"
-                f"📝 Условие: {deal['condition']}"
-            )
-            
-            # Уведомляем создателя
-            await self.bot.send_message(
-                chat_id=deal['creator_id'],
-                text=completion_message,
-                parse_mode="HTML"
-            )
-            
-            # Уведомляем покупателя, если есть
-            if deal['buyer_id']:
-                await self.bot.send_message(
-                    chat_id=deal['buyer_id'],
-                    text=completion_message,
-                    parse_mode="HTML"
+    async def _get_period_stats(self, days: int) -> Dict[str, Any]:
+        """Статистика за последние days дней из дневной сводки (O(дней))"""
+        stats = {'new_users': 0, 'new_deals': 0, 'completed': 0, 'volume': 0.0, 'payments': {}}
+        
+        for row in await self.db.get_daily_stats(days):
+            if row['crypto_type'] == 'ALL':
+                stats['new_users'] += row['new_users']
+                stats['new_deals'] += row['new_deals']
+                stats['completed'] += row['completed_deals']
+                stats['volume'] += float(row['volume'])
+            else:
+                stats['payments'][row['crypto_type']] = (
+                    stats['payments'].get(row['crypto_type'], 0.0) + float(row['volume'])
                 )
-                
-        except Exception as e:
-            logger.error(f"Ошибка уведомления о завершении сделки: {e}")
+        
+        return stats
     
-    async def _notify_deal_cancellation(self, deal: Dict):
-        """Уведомление об отмене сделки"""
-        try:
-            cancellation_message = (
-                f"❌ <b>Сделка отменена администратором</b>\n\n"
-                f"🆔 ID: <code>{deal['deal_id']}</code>\n"
-                f"💰 Сумма: {deal['amount']} USDT\n"
-                f"📝 Условие: {deal['condition']}"
-            )
-            
-            # Уведомляем создателя
-            await self.bot.send_message(
-                chat_id=deal['creator_id'],
-                text=cancellation_message,
-                parse_mode="HTML"
-            )
-            
-            # Уведомляем покупателя, если есть
-            if deal['buyer_id']:
-                await self.bot.send_message(
-                    chat_id=deal['buyer_id'],
-                    text=cancellation_message,
-                    parse_mode="HTML"
-                )
-                
-        except Exception as e:
-            logger.error(f"Ошибка уведомления об отмене сделки: {e}")
+    def _participant_notifications(self, deal: Dict, title: str) -> List[Notification]:
+        """Уведомления создателю и покупателю (если есть) для outbox"""
+        text = (
+            f"{title}\n\n"
+            f"🆔 ID: <code>{deal['deal_id']}</code>\n"
+            f"💰 Сумма: {deal['amount']} USDT\n"
+            f"📝 Условие: {deal['condition']}"
+        )
+        return [(user_id, text) for user_id in (deal['creator_id'], deal['buyer_id']) if user_id]
 
 def register_admin_handlers(dp, admin_panel):
     """Регистрация обработчиков админ панели"""
     
+    @dp.message(Command("audit"))
+    async def handle_audit_command(message: types.Message):
+        """/audit <user_id> [дней] - журнал действий пользователя"""
+        if not admin_panel.is_admin(message.from_user.id):
+            return
+        
+        args = (message.text or "").split()[1:]
+        if not args or not all(arg.isdigit() for arg in args[:2]):
+            await message.answer("Использование: /audit <user_id> [дней]")
+            return
+        
+        days = min(int(args[1]), 366) if len(args) > 1 else 7
+        await admin_panel.show_audit_log(message.chat.id, int(args[0]), days)
+    
     @dp.callback_query(F.data.startswith("admin_"))
     async def handle_admin_callbacks(callback: types.CallbackQuery):
         """Обработка callback'ов админ панели"""
@@ -364,6 +278,8 @@ def register_admin_handlers(dp, admin_panel):
             await admin_panel.show_users(callback.message.chat.id)
         elif action == "admin_active_deals":
             await admin_panel.show_active_deals(callback.message.chat.id)
+        elif action.startswith("admin_ad:"):
+            await admin_panel.show_active_deals(callback.message.chat.id, parse_page_callback(action))
         elif action == "admin_all_deals":
             await admin_panel.show_all_deals(callback.message.chat.id)
         
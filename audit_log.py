@@ -0,0 +1,133 @@
+import asyncio
+import logging
+from typing import Optional, Dict, Any, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+AuditRecord = Tuple[Optional[int], Optional[str], str, Optional[str]]
+
+
+class AuditLogWriter:
+    """Фоновая пакетная запись action_logs
+
+    Обработчики только кладут запись в ограниченную очередь (при переполнении
+    ожидают - backpressure), а фоновая задача пишет накопленное одним
+    многострочным INSERT по достижении batch_size или flush_interval.
+    """
+
+    def __init__(self, db, batch_size: int = 200, flush_interval: float = 1.0,
+                 queue_size: int = 10000, max_retries: int = 3):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.queue: "asyncio.Queue" = asyncio.Queue(maxsize=queue_size)
+        self._task: Optional[asyncio.Task] = None
+
+        # Счетчики для метрик
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        """Запуск фоновой задачи записи"""
+        if not self.running:
+            self._task = asyncio.create_task(self._run(), name="audit-log-writer")
+
+    async def log(self, user_id: Optional[int], deal_id: Optional[str], action: str, details: str = None):
+        """Постановка записи в очередь (ожидает, если очередь заполнена)"""
+        await self.queue.put((user_id, deal_id, action, details))
+        self.enqueued += 1
+
+    async def close(self):
+        """Дозапись всей очереди и остановка фоновой задачи"""
+        if not self.running:
+            return
+
+        await self.queue.put(_STOP)
+        await self._task
+        self._task = None
+        logger.info(f"📝 Журнал действий сброшен: записано {self.written}, потеряно {self.dropped}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики очереди для метрик"""
+        return {
+            'queued': self.queue.qsize(),
+            'queue_size': self.queue.maxsize,
+            'enqueued': self.enqueued,
+            'written': self.written,
+            'batches': self.batches,
+            'dropped': self.dropped
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        # Ожидание queue.get() с таймаутом не отменяет его: задача get переживает
+        # таймаут и переходит в следующий пакет, поэтому извлеченная запись не теряется
+        getter: Optional[asyncio.Task] = None
+
+        try:
+            while not stopping:
+                if getter is None:
+                    getter = asyncio.create_task(self.queue.get())
+                item = await getter
+                getter = None
+                if item is _STOP:
+                    break
+
+                batch: List[AuditRecord] = [item]
+                deadline = loop.time() + self.flush_interval
+
+                while len(batch) < self.batch_size:
+                    try:
+                        item = self.queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        timeout = deadline - loop.time()
+                        if timeout <= 0:
+                            break
+                        getter = asyncio.create_task(self.queue.get())
+                        done, _ = await asyncio.wait({getter}, timeout=timeout)
+                        if not done:
+                            break
+                        item = getter.result()
+                        getter = None
+
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+
+                await self._write(batch)
+        finally:
+            if getter is not None:
+                getter.cancel()
+
+    async def _write(self, batch: List[AuditRecord]):
+        """Запись пакета одним многострочным INSERT"""
+        query = (
+            "INSERT INTO action_logs (user_id, deal_id, action, details) VALUES "
+            + ", ".join(["(%s, %s, %s, %s)"] * len(batch))
+        )
+        params = [value for record in batch for value in record]
+
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                async with self.db.query('audit_log_flush') as cursor:
+                    await cursor.execute(query, params)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except Exception as e:
+                logger.error(f"Ошибка записи журнала действий (попытка {attempt}): {e}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(0.5 * attempt)
+
+        self.dropped += len(batch)
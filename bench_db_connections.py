@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк: количество соединений из пула на одну операцию DatabaseManager
+
+По умолчанию используется встроенная заглушка пула (MySQL не нужен).
+С флагом --mysql счетчик оборачивает реальный пул из MYSQL_CONFIG.
+"""
+
+import argparse
+import asyncio
+import time
+
+from database_manager import DatabaseManager
+from deal_ids import new_deal_code
+
+
+class _StubCursor:
+    """Курсор-заглушка: запоминает запросы и отдает фиктивную строку сделки"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.rowcount = 1
+
+    async def execute(self, query, args=None):
+        self.pool.statements += 1
+
+    async def fetchone(self):
+        return (1, 2, 100.0, 'joined')
+
+    async def fetchall(self):
+        return []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _StubConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+    def cursor(self, *cursor_classes):
+        return _StubCursor(self.pool)
+
+
+class StubPool:
+    """Пул-заглушка с имитацией задержки установки соединения"""
+
+    def __init__(self, acquire_latency: float = 0.0005):
+        self.acquire_latency = acquire_latency
+        self.acquired = 0
+        self.statements = 0
+
+    async def acquire(self):
+        self.acquired += 1
+        await asyncio.sleep(self.acquire_latency)
+        return _StubConnection(self)
+
+    async def release(self, conn):
+        pass
+
+
+class CountingPool:
+    """Обертка над реальным пулом aiomysql, считающая захваты соединений"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.acquired = 0
+
+    def __getattr__(self, item):
+        return getattr(self.pool, item)
+
+    async def acquire(self):
+        self.acquired += 1
+        return await self.pool.acquire()
+
+    def release(self, conn):
+        return self.pool.release(conn)
+
+
+async def run_benchmark(db: DatabaseManager, iterations: int):
+    creator_id, buyer_id = 900000001, 900000002
+    await db.register_user(creator_id, "bench_creator", "Bench")
+    await db.register_user(buyer_id, "bench_buyer", "Bench")
+
+    deal_ids = [new_deal_code() for _ in range(iterations)]
+    operations = {
+        'create_deal': lambda i: db.create_deal(deal_ids[i], creator_id, 10.0, "benchmark condition", "pass"),
+        'join_deal': lambda i: db.join_deal(deal_ids[i], buyer_id),
+        'add_transaction': lambda i: db.add_transaction(deal_ids[i], buyer_id, 'payment', 10.0, 'USDT_TRC20'),
+        'complete_deal': lambda i: db.complete_deal(deal_ids[i]),
+    }
+
+    print(f"{'Операция':<18}{'соед./оп.':>12}{'запросов/оп.':>15}{'мс/оп.':>10}")
+    for name, operation in operations.items():
+        acquired, statements = db.pool.acquired, getattr(db.pool, 'statements', None)
+        started = time.perf_counter()
+        for i in range(iterations):
+            await operation(i)
+        elapsed = time.perf_counter() - started
+
+        per_op_statements = (
+            f"{(db.pool.statements - statements) / iterations:>15.2f}"
+            if statements is not None else f"{'n/a':>15}"
+        )
+        print(
+            f"{name:<18}"
+            f"{(db.pool.acquired - acquired) / iterations:>12.2f}"
+            f"{per_op_statements}"
+            f"{elapsed * 1000 / iterations:>10.3f}"
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Соединения из пула на операцию DatabaseManager")
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--mysql', action='store_true', help="использовать реальный MySQL из MYSQL_CONFIG")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if args.mysql:
+        await db.initialize()
+        db.pool = CountingPool(db.pool)
+    else:
+        db.pool = StubPool()
+
+    try:
+        await run_benchmark(db, args.iterations)
+    finally:
+        if args.mysql:
+            db.pool = db.pool.pool
+            await db.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
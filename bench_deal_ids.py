@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк идентификаторов сделок: случайный UUID в VARCHAR(36) против
+упорядоченного по времени BINARY(16)
+
+По умолчанию считается модель листового уровня B+-дерева InnoDB
+(страницы 16 КБ, деление страницы пополам при вставке в середину и новая
+страница при вставке в конец): число страниц и их заполненность для
+кластерного индекса deals и вторичного индекса с тем же ключом.
+С флагом --mysql в реальной БД из .env создаются две временные таблицы
+со схемой deals, в каждую вставляется --rows строк, и выводятся скорость
+вставки и размеры данных и индексов из information_schema.
+"""
+
+import argparse
+import asyncio
+import bisect
+import time
+import uuid
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from deal_ids import new_deal_id
+
+PAGE_SIZE = 16384
+# Полезная часть страницы InnoDB (заголовки, каталог) и служебные байты записи
+PAGE_PAYLOAD = 15 * 1024
+ROW_OVERHEAD = 18
+
+# Остальные колонки строки deals (creator_id, buyer_id, amount, статус, даты, пароль, условие)
+DEAL_ROW_BYTES = 8 + 8 + 7 + 1 + 4 + 4 + 20 + 60
+
+
+def _uuid_key() -> bytes:
+    return str(uuid.uuid4()).encode()
+
+
+def _ordered_key() -> bytes:
+    return new_deal_id()
+
+
+def simulate_leaves(keys, row_bytes: int) -> dict:
+    """Листовой уровень индекса после вставки keys по порядку"""
+    capacity = max(2, PAGE_PAYLOAD // (row_bytes + ROW_OVERHEAD))
+    first_keys = []
+    pages = []
+    splits = 0
+    for key in keys:
+        if not pages:
+            first_keys.append(key)
+            pages.append([key])
+            continue
+        index = max(0, bisect.bisect_right(first_keys, key) - 1)
+        page = pages[index]
+        bisect.insort(page, key)
+        if key < first_keys[index]:
+            first_keys[index] = key
+        if len(page) <= capacity:
+            continue
+        splits += 1
+        if index == len(pages) - 1 and page[-1] == key:
+            # Вставка в конец последней страницы: InnoDB начинает новую страницу
+            moved = [page.pop()]
+        else:
+            middle = len(page) // 2
+            moved = page[middle:]
+            del page[middle:]
+        pages.insert(index + 1, moved)
+        first_keys.insert(index + 1, moved[0])
+
+    rows = sum(len(page) for page in pages)
+    return {
+        'pages': len(pages),
+        'splits': splits,
+        'fill': rows / (len(pages) * capacity),
+        'size_mb': len(pages) * PAGE_SIZE / 1024 / 1024
+    }
+
+
+def run_model(rows: int):
+    print(f"📐 Модель листового уровня, строк: {rows}\n")
+    print(f"{'Индекс':<50}{'ключ':>8}{'страниц':>10}{'разделений':>12}{'заполн.':>9}{'МБ':>8}")
+    for title, make_key, key_bytes in (("UUID VARCHAR(36)", _uuid_key, 37), ("UUIDv7 BINARY(16)", _ordered_key, 16)):
+        keys = [make_key() for _ in range(rows)]
+        # Во вторичном индексе (status, created_at, deal_id) порядок задает время создания,
+        # от ключа зависит только размер записи (в нее входит первичный ключ)
+        for index, index_keys, row_bytes in (
+            ("кластерный (deals)", keys, key_bytes + DEAL_ROW_BYTES),
+            ("вторичный (status, created_at)", list(enumerate(keys)), 1 + 4 + key_bytes),
+        ):
+            result = simulate_leaves(index_keys, row_bytes)
+            print(f"{index + ', ' + title:<50}{key_bytes:>8}{result['pages']:>10}{result['splits']:>12}"
+                  f"{result['fill']:>9.0%}{result['size_mb']:>8.2f}")
+
+
+_BENCH_TABLE = """
+    CREATE TABLE {name} (
+        deal_id {key_type} PRIMARY KEY,
+        creator_id BIGINT NOT NULL,
+        buyer_id BIGINT DEFAULT NULL,
+        amount DECIMAL(15,2) NOT NULL,
+        `condition` TEXT NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        status ENUM('active', 'joined', 'paid', 'completed', 'cancelled') DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        INDEX idx_creator_created (creator_id, created_at, deal_id),
+        INDEX idx_buyer_created (buyer_id, created_at, deal_id),
+        INDEX idx_status_created (status, created_at, deal_id)
+    ) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+async def run_mysql(rows: int, batch: int):
+    from database_manager import DatabaseManager
+
+    db = DatabaseManager()
+    await db.connect_pool()
+    print(f"🗄️ MySQL, строк: {rows}, пакет: {batch}\n")
+    print(f"{'Ключ':<20}{'строк/с':>10}{'данные, МБ':>12}{'индексы, МБ':>13}")
+    try:
+        for title, name, key_type, make_key in (
+            ("UUID VARCHAR(36)", "bench_ids_uuid", "VARCHAR(36)", lambda: str(uuid.uuid4())),
+            ("UUIDv7 BINARY(16)", "bench_ids_bin", "BINARY(16)", new_deal_id),
+        ):
+            async with db.query('bench_create') as cursor:
+                await cursor.execute(f"DROP TABLE IF EXISTS {name}")
+                await cursor.execute(_BENCH_TABLE.format(name=name, key_type=key_type))
+
+            started = time.perf_counter()
+            for offset in range(0, rows, batch):
+                values = [
+                    (make_key(), 900000000 + (i % 1000), 10.0, "benchmark condition", "pass")
+                    for i in range(offset, min(rows, offset + batch))
+                ]
+                async with db.query('bench_insert') as cursor:
+                    await cursor.executemany(
+                        f"INSERT INTO {name} (deal_id, creator_id, amount, `condition`, password) "
+                        f"VALUES (%s, %s, %s, %s, %s)",
+                        values
+                    )
+            elapsed = time.perf_counter() - started
+
+            async with db.query('bench_size') as cursor:
+                await cursor.execute(f"ANALYZE TABLE {name}")
+                await cursor.fetchall()
+                await cursor.execute(
+                    """SELECT data_length, index_length FROM information_schema.tables
+                       WHERE table_schema = DATABASE() AND table_name = %s""",
+                    (name,)
+                )
+                data_length, index_length = await cursor.fetchone()
+                await cursor.execute(f"DROP TABLE {name}")
+            print(f"{title:<20}{rows / elapsed:>10.0f}{data_length / 1024 / 1024:>12.2f}"
+                  f"{index_length / 1024 / 1024:>13.2f}")
+    finally:
+        await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Вставка и размер индексов: UUID VARCHAR(36) против BINARY(16)")
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--batch', type=int, default=500, help="строк в одном INSERT (только --mysql)")
+    parser.add_argument('--mysql', action='store_true', help="замер на реальной БД из .env")
+    args = parser.parse_args()
+
+    if args.mysql:
+        asyncio.run(run_mysql(args.rows, args.batch))
+    else:
+        run_model(args.rows)
+
+
+if __name__ == "__main__":
+    main()
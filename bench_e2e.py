@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Сквозной бенчмарк обработчиков: диспетчер modern_escrow_bot против
+локального поддельного Bot API
+
+Поддельный Bot API (aiohttp) отвечает на sendMessage, editMessageText,
+sendMediaGroup и другие вызовы с настраиваемой задержкой; бот направляется
+на него через TelegramAPIServer. Генератор проводит пары пользователей по
+полным сценариям: /start и капча (ответ берется из отправленной ботом
+клавиатуры), меню, создание сделки через DealStates, присоединение по
+ссылке /start join_<код> с паролем, а также просмотры админ-панели.
+Обновления подаются в dp.feed_raw_update, как в webhook-воркере.
+
+Выводятся пропускная способность и p50/p95/p99 по каждому обработчику.
+Для проверки регрессий: --save-baseline сохраняет результат в JSON,
+--baseline сравнивает с ним и завершается с кодом 1, если пропускная
+способность упала или p95 обработчика вырос больше --max-regression.
+Хранилище - в памяти (по умолчанию) или SQLite во временном файле.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+BENCH_TOKEN = "123456789:benchmark-token"
+ADMIN_ID = 700000001
+BASE_USER_ID = 800000000
+
+_CAPTCHA_ANIMAL = re.compile(r"Выберите животное: <b>(.+?)</b>")
+_JOIN_LINK = re.compile(r"start=join_(\w+)")
+
+
+class FakeBotAPI:
+    """Локальный Bot API: правдоподобные ответы и последнее сообщение бота в каждом чате"""
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.calls: Counter = Counter()
+        # chat_id -> последнее отправленное или отредактированное сообщение
+        self.last_messages: Dict[int, dict] = {}
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self, host: str = "127.0.0.1") -> str:
+        """Запуск на свободном порту; возвращает базовый адрес для TelegramAPIServer"""
+        app = web.Application(client_max_size=16 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, 0)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        return f"http://{host}:{port}"
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def _message(self, chat_id, text: str = None, photo: bool = False, reply_markup: str = None) -> dict:
+        message = {
+            'message_id': next(self._message_ids),
+            'date': int(time.time()),
+            'chat': {'id': int(chat_id), 'type': 'private'}
+        }
+        if photo:
+            file_id = f"bench_photo_{message['message_id']}"
+            message['photo'] = [{'file_id': file_id, 'file_unique_id': file_id, 'width': 330, 'height': 330}]
+            if text:
+                message['caption'] = text
+        elif text is not None:
+            message['text'] = text
+        self.last_messages[int(chat_id)] = {**message, 'reply_markup': json.loads(reply_markup) if reply_markup else None}
+        return message
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        params = await request.post()
+        self.calls[method] += 1
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + random.uniform(0, self.jitter))
+
+        if method == 'getme':
+            result = {'id': int(BENCH_TOKEN.split(':')[0]), 'is_bot': True,
+                      'first_name': 'Escrow Bench', 'username': 'escrow_bench_bot'}
+        elif method in ('sendmessage', 'editmessagetext'):
+            result = self._message(params['chat_id'], params.get('text'), reply_markup=params.get('reply_markup'))
+        elif method in ('sendphoto', 'editmessagecaption', 'editmessagemedia'):
+            result = self._message(params['chat_id'], params.get('caption'), photo=True,
+                                   reply_markup=params.get('reply_markup'))
+        elif method == 'sendmediagroup':
+            media = json.loads(params['media'])
+            result = [self._message(params['chat_id'], item.get('caption'), photo=True) for item in media]
+        else:
+            # answerCallbackQuery, deleteMessage, editMessageReplyMarkup и т.п.
+            result = True
+        return web.json_response({'ok': True, 'result': result})
+
+
+class FlowDriver:
+    """Подача сценариев в диспетчер и замер задержек по обработчикам"""
+
+    def __init__(self, dp, bot, api: FakeBotAPI):
+        self.dp = dp
+        self.bot = bot
+        self.api = api
+        self.handler_latencies: Dict[str, List[float]] = defaultdict(list)
+        self.update_latencies: List[float] = []
+        self.failures: Counter = Counter()
+        dp.message.middleware(self._time_handler)
+        dp.callback_query.middleware(self._time_handler)
+
+    async def _time_handler(self, handler, event, data):
+        name = data['handler'].callback.__name__
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            self.handler_latencies[name].append(time.perf_counter() - started)
+
+    async def feed(self, update: dict):
+        started = time.perf_counter()
+        await self.dp.feed_raw_update(self.bot, update)
+        self.update_latencies.append(time.perf_counter() - started)
+
+    async def message(self, user_id: int, text: str):
+        from bench_webhook_load import make_message_update
+        await self.feed(make_message_update(user_id, text))
+
+    async def callback(self, user_id: int, data: str):
+        from bench_webhook_load import make_callback_update
+        await self.feed(make_callback_update(user_id, data))
+
+    async def register(self, user_id: int):
+        """/start и ответ на капчу кнопкой с животным из текста сообщения бота"""
+        await self.message(user_id, "/start")
+        sent = self.api.last_messages.get(user_id) or {}
+        match = _CAPTCHA_ANIMAL.search(sent.get('text') or "")
+        if not match or not sent.get('reply_markup'):
+            self.failures['captcha'] += 1
+            return
+        buttons = [button for row in sent['reply_markup']['inline_keyboard'] for button in row]
+        answer = next((button['callback_data'] for button in buttons if button['text'] == match.group(1)), None)
+        if answer is None:
+            self.failures['captcha'] += 1
+            return
+        await self.callback(user_id, answer)
+
+    async def deal_flow(self, index: int):
+        """Создатель и покупатель: регистрация, меню, создание сделки, присоединение по ссылке"""
+        creator_id, buyer_id = BASE_USER_ID + 2 * index, BASE_USER_ID + 2 * index + 1
+        password = f"pass{index}"
+        await self.register(creator_id)
+        await self.register(buyer_id)
+
+        for data in ('profile', 'my_deals', 'support', 'back_to_menu'):
+            await self.callback(creator_id, data)
+
+        await self.callback(creator_id, 'create_deal')
+        await self.message(creator_id, random.choice(('10', '25.5', '100', '250')))
+        await self.message(creator_id, f"Бенчмарк: передача товара №{index}")
+        await self.message(creator_id, password)
+
+        match = _JOIN_LINK.search((self.api.last_messages.get(creator_id) or {}).get('text') or "")
+        if not match:
+            self.failures['create_deal'] += 1
+            return
+        await self.message(buyer_id, f"/start join_{match.group(1)}")
+        await self.message(buyer_id, password)
+        await self.callback(buyer_id, 'profile')
+
+    async def admin_flow(self):
+        await self.message(ADMIN_ID, "/admin")
+        for data in ('admin_stats', 'admin_active_deals'):
+            await self.callback(ADMIN_ID, data)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def summarize(driver: FlowDriver, elapsed: float) -> dict:
+    handlers = {}
+    for name, latencies in sorted(driver.handler_latencies.items()):
+        latencies.sort()
+        handlers[name] = {
+            'count': len(latencies),
+            'p50_ms': _percentile(latencies, 0.5),
+            'p95_ms': _percentile(latencies, 0.95),
+            'p99_ms': _percentile(latencies, 0.99)
+        }
+    updates = sorted(driver.update_latencies)
+    return {
+        'updates': len(updates),
+        'seconds': elapsed,
+        'throughput': len(updates) / elapsed if elapsed else 0.0,
+        'update_p50_ms': _percentile(updates, 0.5) if updates else 0.0,
+        'update_p99_ms': _percentile(updates, 0.99) if updates else 0.0,
+        'handlers': handlers,
+        'api_calls': dict(driver.api.calls),
+        'failures': dict(driver.failures)
+    }
+
+
+def print_report(result: dict):
+    print(f"📨 Обновлений: {result['updates']} за {result['seconds']:.2f} с")
+    print(f"⚡ Пропускная способность: {result['throughput']:.0f} updates/sec")
+    print(f"⏱️ Обновление целиком: p50={result['update_p50_ms']:.2f} мс, p99={result['update_p99_ms']:.2f} мс\n")
+    print(f"{'Обработчик':<28}{'вызовов':>9}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}")
+    for name, stats in result['handlers'].items():
+        print(f"{name:<28}{stats['count']:>9}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    print(f"\n📡 Вызовы Bot API: {result['api_calls']}")
+    if result['failures']:
+        print(f"❌ Сбои сценариев: {result['failures']}")
+
+
+def compare_with_baseline(result: dict, baseline: dict, max_regression: float, min_count: int = 20) -> List[str]:
+    """Регрессии относительно сохраненного результата (пустой список - проверка пройдена)"""
+    regressions = []
+    if result['throughput'] < baseline['throughput'] * (1 - max_regression):
+        regressions.append(f"пропускная способность {result['throughput']:.0f} < "
+                           f"{baseline['throughput']:.0f} updates/sec")
+    for name, stats in result['handlers'].items():
+        before = baseline['handlers'].get(name)
+        if not before or stats['count'] < min_count:
+            continue
+        if stats['p95_ms'] > before['p95_ms'] * (1 + max_regression):
+            regressions.append(f"{name}: p95 {stats['p95_ms']:.2f} мс > {before['p95_ms']:.2f} мс")
+    return regressions
+
+
+async def run(args) -> dict:
+    from aiogram.client.telegram import TelegramAPIServer
+    from modern_escrow_bot import setup_bot
+    from notification_outbox import NotificationRelay
+
+    escrow_bot, dp, bot = setup_bot()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    api = FakeBotAPI(args.api_latency_ms, args.api_jitter_ms)
+    bot.session.api = TelegramAPIServer.from_base(await api.start())
+    await escrow_bot.db.initialize()
+    # Уведомления из outbox (создателю о присоединении) отправляются, как в боте, фоном
+    relay = asyncio.create_task(NotificationRelay(escrow_bot.db, bot).run())
+    driver = FlowDriver(dp, bot, api)
+    await driver.register(ADMIN_ID)
+
+    flows = iter(range(args.flows))
+
+    async def worker():
+        for index in flows:
+            await driver.deal_flow(index)
+            if args.admin_every and index % args.admin_every == 0:
+                await driver.admin_flow()
+
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        return summarize(driver, time.perf_counter() - started)
+    finally:
+        relay.cancel()
+        await asyncio.gather(relay, return_exceptions=True)
+        await escrow_bot.db.close()
+        await bot.session.close()
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сквозной бенчмарк обработчиков с поддельным Bot API")
+    parser.add_argument('--flows', type=int, default=500, help="пар создатель/покупатель")
+    parser.add_argument('--concurrency', type=int, default=20, help="сценариев одновременно")
+    parser.add_argument('--admin-every', type=int, default=10, help="просмотр админ-панели каждые N сценариев")
+    parser.add_argument('--api-latency-ms', type=float, default=0.0, help="задержка ответа Bot API")
+    parser.add_argument('--api-jitter-ms', type=float, default=0.0, help="случайная добавка к задержке")
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="вывести результат в JSON")
+    parser.add_argument('--save-baseline', metavar='PATH', help="сохранить результат как эталон")
+    parser.add_argument('--baseline', metavar='PATH', help="сравнить с эталоном (код 1 при регрессии)")
+    parser.add_argument('--max-regression', type=float, default=0.2, help="допустимое ухудшение, доля")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    for name in ('save_baseline', 'baseline'):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    workdir = tempfile.mkdtemp(prefix="escrow_bench_")
+    # Окружение бота задается до импорта config
+    os.environ.update({
+        'BOT_TOKEN': BENCH_TOKEN,
+        'ADMIN_CHAT_ID': str(ADMIN_ID),
+        'STORAGE_BACKEND': args.storage,
+        'SQLITE_PATH': os.path.join(workdir, "bench.sqlite3"),
+        'FSM_STORAGE': 'memory',
+        'BOT_MODE': 'polling'
+    })
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    result = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"💾 Эталон сохранен: {args.save_baseline}")
+
+    if result['failures']:
+        sys.exit(1)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(result, json.load(f), args.max_regression)
+        for regression in regressions:
+            print(f"❌ Регрессия: {regression}")
+        if regressions:
+            sys.exit(1)
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
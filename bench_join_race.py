@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Стресс-тест гонки присоединения: сотни одновременных join_deal к одной сделке
+
+Проверяет, что ровно один покупатель выигрывает сделку. По умолчанию
+используется заглушка пула, которая выполняет условный UPDATE атомарно,
+как InnoDB; с флагом --mysql тест идет против реального MySQL.
+"""
+
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from database_manager import DatabaseManager
+from deal_ids import new_deal_code, decode_deal_code
+
+
+class _RaceStubCursor:
+    """Курсор-заглушка: атомарно применяет условный UPDATE к таблице в памяти"""
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.rowcount = 0
+
+    async def execute(self, query, args=None):
+        # Имитируем сетевую задержку до сервера, чтобы запросы перемешались
+        await asyncio.sleep(random.uniform(0, 0.002))
+
+        if query.startswith("UPDATE deals SET buyer_id"):
+            buyer_id, deal_id, not_creator = args[0], args[1], args[2]
+            password = args[3] if len(args) > 3 else None
+            row = self.pool.deals.get(deal_id)
+            matched = (
+                row is not None and row['status'] == 'active' and row['buyer_id'] is None
+                and row['creator_id'] != not_creator
+                and (password is None or row['password'] == password)
+            )
+            if matched:
+                row.update(buyer_id=buyer_id, status='joined')
+            self.rowcount = 1 if matched else 0
+        else:
+            self.rowcount = 1
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _RaceStubConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def cursor(self, *cursor_classes):
+        return _RaceStubCursor(self.pool)
+
+    async def begin(self):
+        pass
+
+    async def commit(self):
+        pass
+
+    async def rollback(self):
+        pass
+
+
+class RaceStubPool:
+    def __init__(self):
+        self.deals = {}
+
+    async def acquire(self):
+        return _RaceStubConnection(self)
+
+    async def release(self, conn):
+        pass
+
+
+async def prepare_mysql(db: DatabaseManager, creator_id: int, buyer_ids, deal_id: str, password: str):
+    await db.register_user(creator_id, "race_creator", "Race")
+    for buyer_id in buyer_ids:
+        await db.register_user(buyer_id, f"race_buyer_{buyer_id}", "Race")
+    await db.create_deal(deal_id, creator_id, 10.0, "race condition test", password)
+
+
+async def run_race(db: DatabaseManager, buyers: int, use_mysql: bool) -> bool:
+    creator_id = 910000000
+    buyer_ids = [creator_id + i for i in range(1, buyers + 1)]
+    deal_id = new_deal_code()
+    password = "race"
+
+    if use_mysql:
+        await prepare_mysql(db, creator_id, buyer_ids, deal_id, password)
+    else:
+        db.pool.deals[decode_deal_code(deal_id)] = {
+            'creator_id': creator_id, 'buyer_id': None, 'status': 'active', 'password': password
+        }
+
+    # Часть покупателей вводит неверный пароль - они не должны выиграть
+    attempts = [
+        db.join_deal(deal_id, buyer_id, password=password if buyer_id % 5 else "wrong")
+        for buyer_id in buyer_ids
+    ]
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*attempts)
+    elapsed = time.perf_counter() - started
+
+    winners = [result['buyer_id'] for result in results if result]
+    deal = await db.get_deal(deal_id) if use_mysql else db.pool.deals[decode_deal_code(deal_id)]
+
+    print(f"👥 Попыток присоединения: {buyers}")
+    print(f"⏱️ Время: {elapsed * 1000:.1f} мс")
+    print(f"🏆 Победителей: {len(winners)}")
+    print(f"💼 Сделка: status={deal['status']}, buyer_id={deal['buyer_id']}")
+
+    ok = len(winners) == 1 and deal['buyer_id'] == winners[0] and winners[0] % 5 != 0
+    print("✅ Гонка обработана корректно" if ok else "❌ Нарушена атомарность присоединения")
+    return ok
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Стресс-тест одновременного присоединения к сделке")
+    parser.add_argument('--buyers', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--mysql', action='store_true', help="использовать реальный MySQL из MYSQL_CONFIG")
+    args = parser.parse_args()
+
+    db = DatabaseManager()
+    if args.mysql:
+        await db.initialize()
+    else:
+        db.pool = RaceStubPool()
+
+    try:
+        results = [await run_race(db, args.buyers, args.mysql) for _ in range(args.rounds)]
+    finally:
+        if args.mysql:
+            await db.close()
+
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
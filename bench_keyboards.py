@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Микробенчмарк клавиатур: аллокации и время на один обработчик
+
+Сравнивает прежнюю сборку клавиатур через InlineKeyboardBuilder на каждый
+вызов ("до") с реестром keyboards.py ("после"). В каждый замер входит
+и сериализация model_dump, которую aiogram выполняет при отправке.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import keyboards
+
+ANIMALS = ["🐱", "🐶", "🐺", "🦊", "🐻", "🐨", "🐯", "🦁", "🐸", "🐧"]
+DEAL_ID = "0b7c1f0e-9a59-4f3e-9d59-2f6a5c1d7e11"
+
+
+# Прежние реализации (как было до реестра)
+
+def legacy_main_menu() -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="💼 Создать сделку", callback_data="create_deal")
+    builder.button(text="👤 Профиль", callback_data="profile")
+    builder.button(text="📋 Мои сделки", callback_data="my_deals")
+    builder.button(text="🆘 Поддержка", callback_data="support")
+    builder.adjust(2, 2)
+    return builder.as_markup()
+
+
+def legacy_back() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_menu")]
+    ])
+
+
+def legacy_deal_cancel(deal_id: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    builder.button(text="❌ Отменить сделку", callback_data=f"cancel_deal_{deal_id}")
+    return builder.as_markup()
+
+
+def legacy_captcha(animals, correct: str) -> InlineKeyboardMarkup:
+    builder = InlineKeyboardBuilder()
+    for animal in animals:
+        builder.button(text=animal, callback_data=f"captcha_{animal}_{correct}")
+    builder.adjust(3, 2, 1)
+    return builder.as_markup()
+
+
+CASES = {
+    'main_menu': (legacy_main_menu, lambda: keyboards.MAIN_MENU),
+    'back_button': (legacy_back, lambda: keyboards.BACK_TO_MENU),
+    'deal_cancel': (lambda: legacy_deal_cancel(DEAL_ID), lambda: keyboards.deal_cancel_keyboard(DEAL_ID)),
+    'captcha': (
+        lambda: legacy_captcha(ANIMALS[:5], ANIMALS[0]),
+        lambda: keyboards.captcha_keyboard([(a, f"captcha_{a}_{ANIMALS[0]}") for a in ANIMALS[:5]])
+    ),
+}
+
+
+def handler(build):
+    """Обработчик в миниатюре: получить клавиатуру и сериализовать ее для отправки"""
+    markup = build()
+    return markup, markup.model_dump(warnings=False)
+
+
+def measure_allocations(build, iterations: int):
+    """Блоки памяти, созданные вызовом и живые до отправки, и пик памяти на вызов"""
+    handler(build)  # прогрев кешей pydantic
+    tracemalloc.start()
+    blocks = 0
+    peak = 0
+    for _ in range(iterations):
+        before = tracemalloc.take_snapshot()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = handler(build)
+        peak += tracemalloc.get_traced_memory()[1] - current
+        after = tracemalloc.take_snapshot()
+        blocks += sum(max(0, stat.count_diff) for stat in after.compare_to(before, 'lineno'))
+        del result
+    tracemalloc.stop()
+    return blocks / iterations, peak / iterations
+
+
+def measure_time(build, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        handler(build)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Аллокации клавиатур на обработчик: до и после реестра")
+    parser.add_argument('--iterations', type=int, default=20000, help="вызовов для замера времени")
+    parser.add_argument('--alloc-iterations', type=int, default=50, help="вызовов для замера аллокаций")
+    args = parser.parse_args()
+
+    print("Блоки - объекты, созданные обработчиком; пик - максимум памяти во время вызова (байт)\n")
+    print(f"{'Клавиатура':<14}{'блоков до':>11}{'после':>8}{'пик до':>10}{'после':>8}{'мкс до':>9}{'после':>8}")
+    for name, (before, after) in CASES.items():
+        alloc_before, peak_before = measure_allocations(before, args.alloc_iterations)
+        alloc_after, peak_after = measure_allocations(after, args.alloc_iterations)
+        time_before = measure_time(before, args.iterations)
+        time_after = measure_time(after, args.iterations)
+        print(f"{name:<14}{alloc_before:>11.0f}{alloc_after:>8.0f}{peak_before:>10.0f}{peak_after:>8.0f}"
+              f"{time_before:>9.1f}{time_after:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест пула соединений: задержка получения соединения (acquire)
+
+Запускает N конкурентных "обработчиков", каждый выполняет серию коротких
+запросов через DatabaseManager.query, и выводит p50/p95/p99 ожидания
+соединения, число отказов по acquire_timeout и состояние пула.
+
+По умолчанию используется модель пула aiomysql (минимальный/максимальный
+размер, задержка установки соединения), с флагом --mysql - реальная БД
+из .env. Сравниваются холодный пул (без прогрева) и пул с настройками
+DB_POOL_SETTINGS.
+"""
+
+import argparse
+import asyncio
+import collections
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from config import DB_POOL_SETTINGS
+from database_manager import DatabaseManager, PoolTimeoutError
+
+
+class _SimCursor:
+    def __init__(self, query_latency: float):
+        self.query_latency = query_latency
+        self.rowcount = 1
+
+    async def execute(self, query, args=None):
+        await asyncio.sleep(self.query_latency)
+
+    async def fetchone(self):
+        return (1,)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _SimConnection:
+    def __init__(self, query_latency: float):
+        self.query_latency = query_latency
+        self.last_usage = asyncio.get_running_loop().time()
+        self.closed = False
+
+    def cursor(self, *cursor_classes):
+        self.last_usage = asyncio.get_running_loop().time()
+        return _SimCursor(self.query_latency)
+
+    async def ping(self, reconnect: bool = False):
+        await asyncio.sleep(0.0002)
+
+    def close(self):
+        self.closed = True
+
+
+class SimulatedPool:
+    """Модель пула aiomysql: новые соединения открываются с задержкой connect_latency"""
+
+    def __init__(self, minsize: int, maxsize: int, connect_latency: float, query_latency: float):
+        self.minsize = minsize
+        self.maxsize = maxsize
+        self.connect_latency = connect_latency
+        self.query_latency = query_latency
+        self._free = collections.deque()
+        self._used = set()
+        self._connecting = 0
+        self._cond = asyncio.Condition()
+        self.connects = 0
+
+    @property
+    def size(self) -> int:
+        return len(self._free) + len(self._used) + self._connecting
+
+    @property
+    def freesize(self) -> int:
+        return len(self._free)
+
+    async def _connect(self):
+        self._connecting += 1
+        try:
+            await asyncio.sleep(self.connect_latency)
+            self.connects += 1
+            return _SimConnection(self.query_latency)
+        finally:
+            self._connecting -= 1
+
+    async def fill(self):
+        while self.size < self.minsize:
+            self._free.append(await self._connect())
+
+    async def acquire(self):
+        async with self._cond:
+            while True:
+                if self._free:
+                    conn = self._free.popleft()
+                    self._used.add(conn)
+                    return conn
+                if self.size < self.maxsize:
+                    # Как и aiomysql, пул открывает соединение, удерживая условие
+                    conn = await self._connect()
+                    self._used.add(conn)
+                    return conn
+                await self._cond.wait()
+
+    async def release(self, conn):
+        self._used.discard(conn)
+        if not conn.closed:
+            self._free.append(conn)
+        async with self._cond:
+            self._cond.notify()
+
+
+async def run_scenario(db: DatabaseManager, handlers: int, queries: int) -> dict:
+    waits = []
+    timeouts = 0
+    peak = {'in_use': 0, 'waiters': 0}
+
+    async def handler():
+        nonlocal timeouts
+        for _ in range(queries):
+            started = time.perf_counter()
+            try:
+                async with db.query('bench_select') as cursor:
+                    waits.append(time.perf_counter() - started)
+                    stats = db.get_pool_stats()
+                    peak['in_use'] = max(peak['in_use'], stats['in_use'])
+                    peak['waiters'] = max(peak['waiters'], stats['waiters'])
+                    await cursor.execute("SELECT 1")
+                    await cursor.fetchone()
+            except PoolTimeoutError:
+                timeouts += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler() for _ in range(handlers)))
+    elapsed = time.perf_counter() - started
+
+    waits.sort()
+
+    def percentile(p: float) -> float:
+        return waits[min(len(waits) - 1, int(len(waits) * p))] * 1000 if waits else 0.0
+
+    return {
+        'queries': len(waits), 'elapsed': elapsed, 'timeouts': timeouts,
+        'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+        'peak_in_use': peak['in_use'], 'peak_waiters': peak['waiters']
+    }
+
+
+async def make_db(args, warm: bool) -> DatabaseManager:
+    db = DatabaseManager()
+    if args.mysql:
+        DB_POOL_SETTINGS['warmup'] = args.warmup if warm else 0
+        await db.initialize()
+        return db
+
+    pool = SimulatedPool(
+        minsize=DB_POOL_SETTINGS['minsize'] if warm else 1,
+        maxsize=DB_POOL_SETTINGS['maxsize'],
+        connect_latency=args.connect_ms / 1000,
+        query_latency=args.query_ms / 1000
+    )
+    await pool.fill()
+    db.pool = pool
+    if warm:
+        DB_POOL_SETTINGS['warmup'] = args.warmup
+        await db._warm_up_pool()
+    return db
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Задержка получения соединения из пула под нагрузкой")
+    parser.add_argument('--handlers', type=int, default=200, help="конкурентных обработчиков")
+    parser.add_argument('--queries', type=int, default=20, help="запросов на обработчик")
+    parser.add_argument('--warmup', type=int, default=DB_POOL_SETTINGS['warmup'])
+    parser.add_argument('--connect-ms', type=float, default=30.0, help="задержка установки соединения (модель)")
+    parser.add_argument('--query-ms', type=float, default=2.0, help="длительность запроса (модель)")
+    parser.add_argument('--acquire-timeout', type=float, default=DB_POOL_SETTINGS['acquire_timeout'])
+    parser.add_argument('--mysql', action='store_true', help="использовать реальную БД из .env")
+    args = parser.parse_args()
+    DB_POOL_SETTINGS['acquire_timeout'] = args.acquire_timeout
+
+    print(f"👥 Обработчиков: {args.handlers}, запросов на обработчик: {args.queries}, "
+          f"пул: {DB_POOL_SETTINGS['minsize']}..{DB_POOL_SETTINGS['maxsize']}, "
+          f"acquire_timeout: {DB_POOL_SETTINGS['acquire_timeout']} с\n")
+    print(f"{'Пул':<14}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}{'таймаутов':>11}{'занято max':>12}{'ждут max':>10}")
+
+    for title, warm in (("холодный", False), ("прогретый", True)):
+        db = await make_db(args, warm)
+        try:
+            result = await run_scenario(db, args.handlers, args.queries)
+        finally:
+            if args.mysql:
+                await db.close()
+        print(f"{title:<14}{result['p50']:>10.2f}{result['p95']:>10.2f}{result['p99']:>10.2f}"
+              f"{result['timeouts']:>11}{result['peak_in_use']:>12}{result['peak_waiters']:>10}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Генератор нагрузки для webhook-режима: воспроизводит синтетические обновления
+
+Отправляет POST-запросы с обновлениями (/start, кнопки меню) на адрес
+webhook-сервера и выводит пропускную способность (updates/sec) и задержку
+приема.
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+
+import aiohttp
+
+from config import WEBHOOK_SETTINGS
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def make_user(user_id: int) -> dict:
+    return {'id': user_id, 'is_bot': False, 'first_name': 'Load', 'username': f'load_{user_id}'}
+
+
+def make_message_update(user_id: int, text: str) -> dict:
+    """Синтетическое обновление с текстовым сообщением"""
+    return {
+        'update_id': next(_update_ids),
+        'message': {
+            'message_id': next(_message_ids),
+            'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'},
+            'from': make_user(user_id),
+            'text': text
+        }
+    }
+
+
+def make_callback_update(user_id: int, data: str) -> dict:
+    """Синтетическое обновление с нажатием inline-кнопки"""
+    return {
+        'update_id': next(_update_ids),
+        'callback_query': {
+            'id': str(next(_update_ids)),
+            'chat_instance': str(user_id),
+            'from': make_user(user_id),
+            'data': data,
+            'message': {
+                'message_id': next(_message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'text': 'menu'
+            }
+        }
+    }
+
+
+def generate_updates(total: int, users: int):
+    """Смесь обновлений: /start и переходы по меню от случайных пользователей"""
+    base_user_id = 700000000
+    for _ in range(total):
+        user_id = base_user_id + random.randrange(users)
+        if random.random() < 0.3:
+            yield make_message_update(user_id, '/start')
+        else:
+            yield make_callback_update(user_id, random.choice(['profile', 'my_deals', 'support', 'back_to_menu']))
+
+
+async def run_load(url: str, secret: str, total: int, users: int, concurrency: int):
+    headers = {'X-Telegram-Bot-Api-Secret-Token': secret} if secret else {}
+    updates = generate_updates(total, users)
+    latencies = []
+    statuses = {}
+
+    async def sender(session: aiohttp.ClientSession):
+        for update in updates:
+            started = time.perf_counter()
+            async with session.post(url, json=update, headers=headers) as response:
+                await response.read()
+                statuses[response.status] = statuses.get(response.status, 0) + 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as session:
+        await asyncio.gather(*(sender(session) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    def percentile(p: float) -> float:
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    print(f"📨 Отправлено обновлений: {len(latencies)} за {elapsed:.2f} с")
+    print(f"⚡ Пропускная способность: {len(latencies) / elapsed:.0f} updates/sec")
+    print(f"⏱️ Задержка приема: p50={percentile(0.5):.1f} мс, p95={percentile(0.95):.1f} мс, p99={percentile(0.99):.1f} мс")
+    print(f"📊 Коды ответа: {statuses}")
+
+
+def main():
+    default_url = f"http://127.0.0.1:{WEBHOOK_SETTINGS['port']}{WEBHOOK_SETTINGS['path']}"
+
+    parser = argparse.ArgumentParser(description="Нагрузочный тест webhook-режима")
+    parser.add_argument('--url', default=default_url)
+    parser.add_argument('--secret', default=WEBHOOK_SETTINGS['secret_token'])
+    parser.add_argument('--updates', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=50)
+    args = parser.parse_args()
+
+    asyncio.run(run_load(args.url, args.secret, args.updates, args.users, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Optional, Dict, Any, List
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from config import BROADCAST_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Ответы Telegram, после которых пользователь помечается неактивным
+_UNREACHABLE_MARKERS = ("bot was blocked", "user is deactivated", "chat not found", "bot was kicked")
+
+
+class TokenBucket:
+    """Ограничитель скорости: не более rate операций в секунду с запасом burst"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Остановка выдачи токенов (после RetryAfter от Telegram)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class BroadcastEngine:
+    """Потоковая рассылка с ограничением скорости и возобновлением по чекпоинту
+
+    ID активных пользователей читаются страницами по первичному ключу
+    (WHERE user_id > последний_обработанный), страница отправляется пачками
+    по checkpoint_every конкурентно под общим token bucket, после каждой
+    пачки в БД сохраняется чекпоинт - поэтому прерванную рассылку можно
+    продолжить с места остановки, повторно отправив не больше одной пачки.
+    """
+
+    def __init__(self, db, bot: Bot,
+                 rate: float = BROADCAST_SETTINGS['global_rate'],
+                 per_chat_interval: float = BROADCAST_SETTINGS['per_chat_interval'],
+                 concurrency: int = BROADCAST_SETTINGS['concurrency'],
+                 page_size: int = BROADCAST_SETTINGS['page_size'],
+                 checkpoint_every: int = BROADCAST_SETTINGS['checkpoint_every'],
+                 max_retries: int = BROADCAST_SETTINGS['max_retries']):
+        self.db = db
+        self.bot = bot
+        self.bucket = TokenBucket(rate, burst=max(1, int(rate)))
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.checkpoint_every = checkpoint_every
+        self.max_retries = max_retries
+        self._last_sent: Dict[int, float] = {}
+
+    async def start(self, message_text: str) -> Dict[str, int]:
+        """Запуск новой рассылки"""
+        broadcast_id = str(uuid.uuid4())
+        await self.db.create_broadcast(broadcast_id, message_text)
+        logger.info(f"📨 Рассылка {broadcast_id} запущена")
+        return await self.run(broadcast_id)
+
+    async def resume_unfinished(self) -> List[Dict[str, int]]:
+        """Продолжение рассылок, прерванных остановкой бота"""
+        results = []
+        for broadcast in await self.db.get_unfinished_broadcasts():
+            logger.info(f"📨 Продолжение рассылки {broadcast['broadcast_id']} с user_id > {broadcast['last_user_id']}")
+            results.append(await self.run(broadcast['broadcast_id']))
+        return results
+
+    async def run(self, broadcast_id: str) -> Dict[str, int]:
+        """Отправка рассылки начиная с сохраненного чекпоинта"""
+        broadcast = await self.db.get_broadcast(broadcast_id)
+        if not broadcast:
+            return {"sent": 0, "failed": 0, "blocked": 0}
+
+        text = f"📢 <b>Сообщение от администрации</b>\n\n{broadcast['message_text']}"
+        totals = {"sent": broadcast['sent'], "failed": broadcast['failed'], "blocked": broadcast['blocked']}
+        last_user_id = broadcast['last_user_id']
+
+        while True:
+            user_ids = await self.db.get_active_user_ids_page(last_user_id, self.page_size)
+            if not user_ids:
+                break
+
+            # Чекпоинт после каждой пачки: при возобновлении повторно получат не больше checkpoint_every
+            for start in range(0, len(user_ids), self.checkpoint_every):
+                batch_ids = user_ids[start:start + self.checkpoint_every]
+                batch = await self._send_batch(batch_ids, text)
+                if batch['unreachable']:
+                    await self.db.deactivate_users(batch['unreachable'])
+
+                totals['sent'] += batch['sent']
+                totals['failed'] += batch['failed']
+                totals['blocked'] += len(batch['unreachable'])
+                last_user_id = batch_ids[-1]
+                await self.db.save_broadcast_checkpoint(broadcast_id, last_user_id, **totals)
+
+        await self.db.finish_broadcast(broadcast_id)
+        logger.info(f"✅ Рассылка {broadcast_id} завершена: {totals}")
+        return totals
+
+    async def _send_batch(self, user_ids: List[int], text: str) -> Dict[str, Any]:
+        result = {"sent": 0, "failed": 0, "unreachable": []}
+        pending = asyncio.Queue()
+        for user_id in user_ids:
+            pending.put_nowait(user_id)
+
+        async def worker():
+            while not pending.empty():
+                user_id = pending.get_nowait()
+                outcome = await self._deliver(user_id, text)
+                if outcome == 'unreachable':
+                    result['unreachable'].append(user_id)
+                else:
+                    result[outcome] += 1
+
+        await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(user_ids)))))
+        return result
+
+    async def _deliver(self, chat_id: int, text: str) -> str:
+        for _ in range(self.max_retries + 1):
+            await self._wait_chat_slot(chat_id)
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, parse_mode="HTML")
+                return 'sent'
+            except TelegramRetryAfter as e:
+                logger.warning(f"⚠️ Flood control при рассылке, пауза {e.retry_after} с")
+                self.bucket.pause(e.retry_after)
+            except (TelegramForbiddenError, TelegramBadRequest) as e:
+                if any(marker in str(e).lower() for marker in _UNREACHABLE_MARKERS):
+                    return 'unreachable'
+                logger.error(f"Ошибка отправки рассылки {chat_id}: {e}")
+                return 'failed'
+            except Exception as e:
+                logger.error(f"Ошибка отправки рассылки {chat_id}: {e}")
+                return 'failed'
+        return 'failed'
+
+    async def _wait_chat_slot(self, chat_id: int):
+        """Соблюдение лимита Telegram на частоту сообщений в один чат"""
+        last_sent = self._last_sent.get(chat_id)
+        now = time.monotonic()
+        if last_sent is not None and now - last_sent < self.per_chat_interval:
+            await asyncio.sleep(self.per_chat_interval - (now - last_sent))
+        self._last_sent[chat_id] = time.monotonic()
+
+        # Интервал нужен только для повторов - не держим историю бесконечно
+        if len(self._last_sent) > self.page_size * 2:
+            self._last_sent.clear()
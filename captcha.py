@@ -0,0 +1,69 @@
+import base64
+import hashlib
+import hmac
+import random
+import struct
+import time
+from typing import List, Optional, Tuple
+
+from config import BOT_TOKEN, CAPTCHA_SETTINGS
+
+CAPTCHA_ANIMALS = ["🐱", "🐶", "🐺", "🦊", "🐻", "🐨", "🐯", "🦁", "🐸", "🐧"]
+
+# Префикс callback_data кнопок капчи
+CALLBACK_PREFIX = "cp:"
+
+_MAC_SIZE = 12
+_TOKEN = struct.Struct(">BI")  # индекс животного, время истечения (unix)
+
+# Ключ подписи: явный секрет или производный от токена бота - одинаковый во всех процессах
+_SECRET = (CAPTCHA_SETTINGS['secret'] or hashlib.sha256(b"captcha:" + BOT_TOKEN.encode()).hexdigest()).encode()
+
+
+def _sign(user_id: int, animal_index: int, expires_at: int, correct: bool) -> bytes:
+    message = f"{user_id}:{animal_index}:{expires_at}:{'ok' if correct else 'no'}".encode()
+    return hmac.new(_SECRET, message, hashlib.sha256).digest()[:_MAC_SIZE]
+
+
+def _encode(animal_index: int, expires_at: int, mac: bytes) -> str:
+    token = base64.urlsafe_b64encode(_TOKEN.pack(animal_index, expires_at) + mac).rstrip(b"=").decode()
+    return CALLBACK_PREFIX + token
+
+
+def issue_captcha(user_id: int, choices: int = 5) -> Tuple[str, List[Tuple[str, str]]]:
+    """Новая капча: правильное животное и кнопки (текст, callback_data)
+
+    Каждая кнопка несет подписанный токен "индекс животного + срок действия".
+    Подпись правильной кнопки считается с меткой "ok", остальных - с "no",
+    поэтому без секрета по callback_data ответ не определить, а проверка
+    не требует хранилища (ни FSM, ни БД).
+    """
+    animals = random.sample(range(len(CAPTCHA_ANIMALS)), choices)
+    correct_index = random.choice(animals)
+    expires_at = int(time.time()) + CAPTCHA_SETTINGS['ttl']
+
+    buttons = [
+        (CAPTCHA_ANIMALS[index],
+         _encode(index, expires_at, _sign(user_id, index, expires_at, index == correct_index)))
+        for index in animals
+    ]
+    return CAPTCHA_ANIMALS[correct_index], buttons
+
+
+def verify_captcha(user_id: int, callback_data: str) -> Optional[bool]:
+    """True - выбран правильный ответ, False - неверный, None - токен поврежден или истек"""
+    try:
+        token = callback_data[len(CALLBACK_PREFIX):]
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        animal_index, expires_at = _TOKEN.unpack(raw[:_TOKEN.size])
+        mac = raw[_TOKEN.size:]
+    except (ValueError, struct.error):
+        return None
+
+    if len(mac) != _MAC_SIZE or expires_at < time.time():
+        return None
+    if hmac.compare_digest(mac, _sign(user_id, animal_index, expires_at, True)):
+        return True
+    if hmac.compare_digest(mac, _sign(user_id, animal_index, expires_at, False)):
+        return False
+    return None
@@ -10,9 +10,24 @@ MYSQL_CONFIG: Dict[str, any] = {
     'port': int(os.getenv('MYSQL_PORT', 3306)),
     'user': os.getenv('MYSQL_USER', 'escrow_bot'),
     'password': os.getenv('MYSQL_PASSWORD', 'strong_password_here'),
-    'database': os.getenv('MYSQL_DATABASE', 'modern_escrow_bot')
+    'database': os.getenv('MYSQL_DATABASE', 'modern_escrow_bot'),
+    # Реплика для чтения (необязательно): без MYSQL_REPLICA_HOST все запросы идут на основной сервер.
+    # Пользователь, пароль и база по умолчанию те же, что у основного сервера.
+    'replica': {
+        'host': os.getenv('MYSQL_REPLICA_HOST'),
+        'port': int(os.getenv('MYSQL_REPLICA_PORT', os.getenv('MYSQL_PORT', 3306))),
+        'user': os.getenv('MYSQL_REPLICA_USER'),
+        'password': os.getenv('MYSQL_REPLICA_PASSWORD'),
+        'maxsize': int(os.getenv('MYSQL_REPLICA_POOL_MAX', 10)),
+        'max_lag': float(os.getenv('MYSQL_REPLICA_MAX_LAG', 5)),  # отставание, после которого чтения идут на основной
+        'pin_seconds': float(os.getenv('MYSQL_REPLICA_PIN_SECONDS', 10)),  # чтения пользователя после его изменений
+        'check_interval': float(os.getenv('MYSQL_REPLICA_CHECK_INTERVAL', 2))  # период проверки отставания
+    }
 }
 
+# Обязательные параметры подключения к основному серверу
+MYSQL_REQUIRED_KEYS = ('host', 'port', 'user', 'password', 'database')
+
 # Адреса кошельков
 WALLET_ADDRESSES = {
     'TRC20_USDT': 'TREBy39rXoWMTfuZcobHNR49EKfnXPbbdE',
@@ -24,10 +39,16 @@ SECURITY_SETTINGS = {
     'min_password_length': 4,
     'min_condition_length': 10,
     'max_deal_amount': 100000.0,  # максимальная сумма сделки в USDT
-    'session_timeout': 3600,  # таймаут сессии в секундах
+    'session_timeout': 3600,  # таймаут FSM-сессии в секундах с последнего обращения
     'max_active_deals_per_user': 1
 }
 
+# Капча при регистрации: подписанные токены в callback_data, без хранения состояния
+CAPTCHA_SETTINGS = {
+    'secret': os.getenv('CAPTCHA_SECRET', ''),  # по умолчанию выводится из BOT_TOKEN
+    'ttl': int(os.getenv('CAPTCHA_TTL', 300))  # срок действия капчи в секундах
+}
+
 # Настройки уведомлений
 NOTIFICATION_SETTINGS = {
     'admin_chat_id': os.getenv('ADMIN_CHAT_ID', None),
@@ -44,6 +65,110 @@ LOG_SETTINGS = {
     'backup_count': 5
 }
 
+# Настройки фоновой записи журнала действий (action_logs);
+# записи изменений в транзакциях пишутся курсором транзакции, а не через очередь
+AUDIT_LOG_SETTINGS = {
+    'enabled': True,
+    'batch_size': 200,  # максимальное число строк в одном INSERT
+    'flush_interval': 1.0,  # максимальная задержка записи в секундах
+    'queue_size': 10000  # при заполнении обработчики ожидают (backpressure)
+}
+
+# Хранение журнала действий (action_logs секционирована по месяцам created_at)
+AUDIT_RETENTION_SETTINGS = {
+    'retention_months': int(os.getenv('AUDIT_RETENTION_MONTHS', 12)),  # полных месяцев хранения
+    'archive': os.getenv('AUDIT_ARCHIVE', 'false').lower() == 'true',  # переносить в архив вместо удаления
+    'premake_months': 2,  # секций, создаваемых заранее
+    'rotate_interval': int(os.getenv('AUDIT_ROTATE_INTERVAL', 86400))  # период ротации в секундах
+}
+
+# Настройки кеша блокировки панели (участие в незавершенных сделках)
+ACTIVE_DEAL_LOCK_SETTINGS = {
+    # Режим проверки: каждый ответ из памяти сверяется с БД, расхождения логируются
+    'consistency_check': os.getenv('DEAL_LOCK_CONSISTENCY_CHECK', 'false').lower() == 'true'
+}
+
+# Хранилище данных бота: mysql (MYSQL_CONFIG), sqlite (один узел без MySQL)
+# или memory (в памяти процесса: тесты и замеры обработчиков без БД)
+STORAGE_SETTINGS = {
+    'backend': os.getenv('STORAGE_BACKEND', 'mysql'),
+    'sqlite_path': os.getenv('SQLITE_PATH', 'escrow_bot.sqlite3')
+}
+
+# Хранилище состояний FSM: memory, redis (REDIS_CONFIG) или mysql (таблица fsm_storage)
+FSM_STORAGE_SETTINGS = {
+    'backend': os.getenv('FSM_STORAGE', 'memory'),
+    'key_prefix': 'fsm',
+    'touch_interval': 60  # mysql: продление срока сессии при чтении не чаще раза в N секунд
+}
+
+# Режим приема обновлений: polling или webhook (с пулом процессов-воркеров)
+WEBHOOK_SETTINGS = {
+    'mode': os.getenv('BOT_MODE', 'polling'),
+    'url': os.getenv('WEBHOOK_URL', ''),  # публичный адрес, например https://bot.example.com/webhook
+    'path': os.getenv('WEBHOOK_PATH', '/webhook'),
+    'host': os.getenv('WEBHOOK_HOST', '0.0.0.0'),
+    'port': int(os.getenv('WEBHOOK_PORT', 8080)),
+    'secret_token': os.getenv('WEBHOOK_SECRET', ''),
+    'workers': int(os.getenv('WEBHOOK_WORKERS', 4)),
+    'worker_queue_size': 1000,  # при заполнении очереди воркера Telegram получает 503 и повторит доставку
+    'worker_concurrency': 100,  # одновременно обрабатываемых обновлений в воркере
+    'drain_timeout': 30,  # секунд на дообработку очередей при остановке
+    'lock_resync_interval': 30  # период сверки кеша блокировки панели в воркерах (макс. устаревание между воркерами)
+}
+
+# Кеш QR кодов для оплаты (ключ - адрес и сумма)
+QR_CACHE_SETTINGS = {
+    'max_size': int(os.getenv('QR_CACHE_MAX_SIZE', 512))
+}
+
+# Настройки рассылки (лимиты Telegram: ~30 сообщений/с всего, ~1 сообщение/с в чат)
+BROADCAST_SETTINGS = {
+    'global_rate': 25.0,  # сообщений в секунду по всем чатам
+    'per_chat_interval': 1.0,  # минимальный интервал между сообщениями в один чат
+    'concurrency': 20,  # одновременных отправок
+    'page_size': 1000,  # ID пользователей на страницу
+    'checkpoint_every': 50,  # отправок между чекпоинтами (столько получат повторно после сбоя)
+    'max_retries': 3  # повторов после RetryAfter
+}
+
+# Outbox уведомлений участникам сделок: доставка фоновыми воркерами с повторами
+OUTBOX_SETTINGS = {
+    'workers': int(os.getenv('OUTBOX_WORKERS', 8)),  # одновременных отправок (разным чатам)
+    'batch_size': 200,  # новых строк за один опрос таблицы
+    'poll_interval': float(os.getenv('OUTBOX_POLL_INTERVAL', 1.0)),  # опрос, если записи сделал другой процесс
+    'max_attempts': 8,  # после этого уведомление помечается failed
+    'base_delay': 2.0,  # задержка первого повтора в секундах (далее удваивается)
+    'max_delay': 600.0
+}
+
+# Материализованные глобальные счетчики админ-статистики
+STATS_SETTINGS = {
+    'summary_slots': 16,  # число строк-слотов stats_summary (снижает конкуренцию за одну строку)
+    'reconcile_interval': int(os.getenv('STATS_RECONCILE_INTERVAL', 3600))  # сверка со счетом по таблицам
+}
+
+# Пул соединений с MySQL
+DB_POOL_SETTINGS = {
+    'minsize': int(os.getenv('DB_POOL_MIN', 5)),  # соединений, которые пул держит всегда
+    'maxsize': int(os.getenv('DB_POOL_MAX', 20)),
+    'warmup': int(os.getenv('DB_POOL_WARMUP', 10)),  # соединений, открываемых заранее при старте и после простоя
+    'acquire_timeout': float(os.getenv('DB_POOL_ACQUIRE_TIMEOUT', 3)),  # ожидание свободного соединения, сек
+    'recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),  # закрывать простаивавшие дольше (меньше wait_timeout MySQL)
+    'pre_ping_idle': 30,  # проверять ping соединение, простаивавшее дольше N секунд
+    'keepalive_interval': 60  # период проверки и дозаполнения простаивающего пула
+}
+
+# Метрики запросов к БД и HTTP-эндпоинт /metrics (формат Prometheus)
+METRICS_SETTINGS = {
+    'slow_query_ms': int(os.getenv('SLOW_QUERY_MS', 200)),  # порог медленного запроса
+    'explain_slow_queries': os.getenv('EXPLAIN_SLOW_QUERIES', 'true').lower() == 'true',
+    'explain_interval': 60,  # не чаще одного EXPLAIN в N секунд на запрос
+    'enabled': os.getenv('METRICS_ENABLED', 'false').lower() == 'true',
+    'host': os.getenv('METRICS_HOST', '127.0.0.1'),
+    'port': int(os.getenv('METRICS_PORT', 9100))  # в webhook-режиме воркер N слушает port + 1 + N
+}
+
 # Настройки Redis (если используется для кеширования)
 REDIS_CONFIG = {
     'host': os.getenv('REDIS_HOST', 'localhost'),
@@ -52,6 +177,15 @@ REDIS_CONFIG = {
     'password': os.getenv('REDIS_PASSWORD', None)
 }
 
+# Настройки кеша регистрации пользователей
+USER_CACHE_SETTINGS = {
+    'max_size': int(os.getenv('USER_CACHE_MAX_SIZE', 50000)),
+    'ttl': int(os.getenv('USER_CACHE_TTL', 600)),  # TTL положительных ответов в секундах
+    'negative_ttl': int(os.getenv('USER_CACHE_NEGATIVE_TTL', 30)),  # TTL отрицательных ответов
+    'use_redis': os.getenv('USER_CACHE_USE_REDIS', 'false').lower() == 'true',
+    'redis_ttl': int(os.getenv('USER_CACHE_REDIS_TTL', 3600))
+}
+
 # Текстовые сообщения
 MESSAGES = {
     'welcome': "🎉 <b>Добро пожаловать в Modern Escrow Bot 2025!</b>\n\nСамый современный и безопасный эскроу-бот для криптовалютных сделок.",
@@ -77,14 +211,10 @@ def validate_config():
     if BOT_TOKEN == "YOUR_BOT_TOKEN_HERE":
         raise ValueError("❌ Необходимо установить BOT_TOKEN в переменных окружения")
     
-    if not all(MYSQL_CONFIG.values()):
-        raise ValueError("❌ Необходимо заполнить все параметры MySQL конфигурации")
+    if STORAGE_SETTINGS['backend'] == 'mysql':
+        if not all(MYSQL_CONFIG[key] for key in MYSQL_REQUIRED_KEYS):
+            raise ValueError("❌ Необходимо заполнить все параметры MySQL конфигурации")
+    elif FSM_STORAGE_SETTINGS['backend'] == 'mysql':
+        raise ValueError("❌ FSM_STORAGE=mysql требует STORAGE_BACKEND=mysql")
     
     return True
-
-# Автоматическая валидация при импорте
-if __name__ != "__main__":
-    try:
-        validate_config()
-    except ValueError as e:
-        print(f"Ошибка конфигурации: {e}")
\ No newline at end of file
@@ -1,140 +1,408 @@
 import asyncio
 import logging
-from typing import Optional, Dict, List, Any
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Any, Tuple, Sequence
 from datetime import datetime
 import aiomysql
-from config import MYSQL_CONFIG
+from config import (
+    MYSQL_CONFIG, REDIS_CONFIG, USER_CACHE_SETTINGS, AUDIT_LOG_SETTINGS, ACTIVE_DEAL_LOCK_SETTINGS,
+    STATS_SETTINGS, METRICS_SETTINGS, DB_POOL_SETTINGS, AUDIT_RETENTION_SETTINGS
+)
+from action_log_partitions import ActionLogPartitions
+from audit_log import AuditLogWriter
+from query_metrics import QueryMetrics, InstrumentedCursor
+from replica_router import ReplicaRouter
+from schema_migrations import SchemaMigrator
+from storage_backend import StorageBackend, Notification, keyset_page
+from deal_ids import encode_deal_code, decode_deal_code
+from deal_locks import ActiveDealLocks
+from user_cache import UserRegistrationCache
 
 logger = logging.getLogger(__name__)
 
-class DatabaseManager:
+# Запросы, для которых MySQL умеет показать план (DDL не объясняется)
+_EXPLAINABLE = re.compile(r"\s*\(?\s*(SELECT|INSERT|UPDATE|DELETE|REPLACE)\b", re.IGNORECASE)
+
+
+def _keyset_position(after, before) -> Tuple[Optional[Tuple[datetime, str]], bool]:
+    """Ключ и направление чтения: вперед (к старым, DESC) или назад (к новым, ASC)"""
+    if before is not None:
+        return before, False
+    return after, True
+
+
+def _keyset_condition(prefix: str, key, descending: bool, inclusive: bool = False) -> Tuple[str, tuple]:
+    """Условие "строго после ключа (created_at, deal_id)" в порядке чтения
+    
+    Записано через OR, а не сравнением кортежей, чтобы MySQL строил range
+    по индексу (..., created_at, deal_id). С inclusive подходит и сам ключ.
+    """
+    if key is None:
+        return "", ()
+    op = "<" if descending else ">"
+    created_at, deal_id = key
+    return (f" AND ({prefix}created_at {op} %s OR ({prefix}created_at = %s AND "
+            f"{prefix}deal_id {op}{'=' if inclusive else ''} %s))",
+            (created_at, created_at, _deal_key(deal_id)))
+
+
+def _deal_key(deal_id: Optional[str]) -> Optional[bytes]:
+    """BINARY(16) deal_id для запроса из публичного кода сделки
+    
+    Некорректный код дает NULL, который не совпадает ни с одной строкой.
+    """
+    return None if deal_id is None else decode_deal_code(deal_id)
+
+
+def _with_code(row: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Строка результата с публичным кодом сделки вместо 16 байт deal_id"""
+    if row and isinstance(row.get('deal_id'), (bytes, bytearray)):
+        row['deal_id'] = encode_deal_code(bytes(row['deal_id']))
+    return row
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не получено за DB_POOL_SETTINGS['acquire_timeout']"""
+
+
+class DatabaseManager(StorageBackend):
+    """Хранилище бота в MySQL (основная реализация StorageBackend)"""
+    
     def __init__(self):
         self.pool = None
+        self.audit_writer = None
+        self.action_log_partitions = ActionLogPartitions(self)
+        self.replica = ReplicaRouter(MYSQL_CONFIG, MYSQL_CONFIG['replica'])
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self.deal_locks = ActiveDealLocks()
+        self.query_metrics = QueryMetrics(slow_query_seconds=METRICS_SETTINGS['slow_query_ms'] / 1000)
+        self._explained_at: Dict[str, float] = {}
+        self._explain_tasks = set()
         
+        # Счетчики пула для метрик
+        self.pool_waiters = 0
+        self.pool_timeouts = 0
+        self.stale_connections = 0
+        self.user_cache = UserRegistrationCache(
+            max_size=USER_CACHE_SETTINGS['max_size'],
+            ttl=USER_CACHE_SETTINGS['ttl'],
+            negative_ttl=USER_CACHE_SETTINGS['negative_ttl'],
+            redis_config=REDIS_CONFIG if USER_CACHE_SETTINGS['use_redis'] else None,
+            redis_ttl=USER_CACHE_SETTINGS['redis_ttl']
+        )
+        
+    async def connect_pool(self):
+        """Пул соединений с основным сервером (без создания таблиц и фоновых задач)"""
+        self.pool = await aiomysql.create_pool(
+            host=MYSQL_CONFIG['host'],
+            port=MYSQL_CONFIG['port'],
+            user=MYSQL_CONFIG['user'],
+            password=MYSQL_CONFIG['password'],
+            db=MYSQL_CONFIG['database'],
+            charset='utf8mb4',
+            autocommit=True,
+            minsize=DB_POOL_SETTINGS['minsize'],
+            maxsize=DB_POOL_SETTINGS['maxsize'],
+            pool_recycle=DB_POOL_SETTINGS['recycle']
+        )
+    
     async def initialize(self):
-        """Инициализация пула соединений и создание таблиц"""
-        try:
-            self.pool = await aiomysql.create_pool(
-                host=MYSQL_CONFIG['host'],
-                port=MYSQL_CONFIG['port'],
-                user=MYSQL_CONFIG['user'],
-                password=MYSQL_CONFIG['password'],
-                db=MYSQL_CONFIG['database'],
-                charset='utf8mb4',
-                autocommit=True,
-                maxsize=20,
-                minsize=1
-            )
+        """Инициализация пула соединений и применение миграций схемы"""
+        try:
+            await self.connect_pool()
+            await self._warm_up_pool()
+            await self.replica.connect()
             
-            await self._create_tables()
+            await SchemaMigrator(self).upgrade()
+            await self.user_cache.connect()
+            await self._load_active_deal_locks()
+            await self._seed_stats_summary()
+            
+            if AUDIT_LOG_SETTINGS['enabled']:
+                self.audit_writer = AuditLogWriter(
+                    self,
+                    batch_size=AUDIT_LOG_SETTINGS['batch_size'],
+                    flush_interval=AUDIT_LOG_SETTINGS['flush_interval'],
+                    queue_size=AUDIT_LOG_SETTINGS['queue_size']
+                )
+                self.audit_writer.start()
+            self._keepalive_task = asyncio.create_task(self._pool_keepalive())
             logger.info("✅ База данных инициализирована успешно")
             
         except Exception as e:
             logger.error(f"❌ Ошибка инициализации БД: {e}")
             raise
     
-    async def _create_tables(self):
-        """Создание таблиц базы данных"""
-        async with self.pool.acquire() as conn:
-            async with conn.cursor() as cursor:
-                # Таблица пользователей
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS users (
-                        user_id BIGINT PRIMARY KEY,
-                        username VARCHAR(255),
-                        first_name VARCHAR(255),
-                        registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        is_active BOOLEAN DEFAULT TRUE,
-                        completed_deals INT DEFAULT 0,
-                        total_volume DECIMAL(15,2) DEFAULT 0.00
-                    ) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                
-                # Таблица сделок
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS deals (
-                        deal_id VARCHAR(36) PRIMARY KEY,
-                        creator_id BIGINT NOT NULL,
-                        buyer_id BIGINT DEFAULT NULL,
-                        amount DECIMAL(15,2) NOT NULL,
-                        condition TEXT NOT NULL,
-                        password VARCHAR(255) NOT NULL,
-                        status ENUM('active', 'joined', 'paid', 'completed', 'cancelled') DEFAULT 'active',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                        FOREIGN KEY (creator_id) REFERENCES users(user_id),
-                        FOREIGN KEY (buyer_id) REFERENCES users(user_id),
-                        INDEX idx_creator_status (creator_id, status),
-                        INDEX idx_buyer_status (buyer_id, status),
-                        INDEX idx_status (status)
-                    ) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                
-                # Таблица транзакций
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS transactions (
-                        transaction_id INT AUTO_INCREMENT PRIMARY KEY,
-                        deal_id VARCHAR(36) NOT NULL,
-                        user_id BIGINT NOT NULL,
-                        transaction_type ENUM('payment', 'refund', 'release') NOT NULL,
-                        amount DECIMAL(15,2) NOT NULL,
-                        crypto_type ENUM('USDT_TRC20', 'TON') NOT NULL,
-                        tx_hash VARCHAR(255),
-                        status ENUM('pending', 'confirmed', 'failed') DEFAULT 'pending',
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (deal_id) REFERENCES deals(deal_id) ON DELETE CASCADE,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id),
-                        INDEX idx_deal_status (deal_id, status),
-                        INDEX idx_user_type (user_id, transaction_type)
-                    ) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                
-                # Таблица логов действий
-                await cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS action_logs (
-                        log_id INT AUTO_INCREMENT PRIMARY KEY,
-                        user_id BIGINT NOT NULL,
-                        deal_id VARCHAR(36),
-                        action VARCHAR(100) NOT NULL,
-                        details TEXT,
-                        ip_address VARCHAR(45),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users(user_id),
-                        INDEX idx_user_action (user_id, action),
-                        INDEX idx_deal_action (deal_id, action),
-                        INDEX idx_created_at (created_at)
-                    ) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-                """)
-                
+    @asynccontextmanager
+    async def connection(self, name: str):
+        """Соединение из пула с замером времени ожидания под именем операции
+        
+        Ожидание ограничено acquire_timeout: при исчерпании пула обработчик
+        быстро получает PoolTimeoutError, а не висит в очереди.
+        """
+        self.pool_waiters += 1
+        started = time.perf_counter()
+        try:
+            conn = await self._acquire(self.pool)
+        except Exception:
+            self.query_metrics.observe_error(name)
+            raise
+        finally:
+            self.pool_waiters -= 1
+        
+        self.query_metrics.observe_pool_wait(name, time.perf_counter() - started)
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+    
+    async def _acquire(self, pool):
+        """Живое соединение из пула (основного или реплики) за отведенное время"""
+        deadline = time.monotonic() + DB_POOL_SETTINGS['acquire_timeout']
+        while True:
+            conn = await self._acquire_within(pool, deadline - time.monotonic())
+            if await self._is_alive(conn):
+                return conn
+            # Закрытое соединение пул при возврате просто отбрасывает
+            conn.close()
+            await pool.release(conn)
+    
+    async def _acquire_within(self, pool, timeout: float):
+        if timeout <= 0:
+            self.pool_timeouts += 1
+            raise PoolTimeoutError("Истекло время ожидания соединения с БД")
+        
+        task = asyncio.ensure_future(pool.acquire())
+        try:
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon_acquire(pool, task)
+            raise
+        if task in done:
+            return task.result()
+        
+        self._abandon_acquire(pool, task)
+        self.pool_timeouts += 1
+        raise PoolTimeoutError(
+            f"Нет свободного соединения с БД за {DB_POOL_SETTINGS['acquire_timeout']} с "
+            f"(занято {pool.size - pool.freesize} из {pool.maxsize}, ожидают {self.pool_waiters})"
+        )
+    
+    def _abandon_acquire(self, pool, task: asyncio.Future):
+        """Отмена ожидания; соединение, полученное в момент отмены, возвращается в пул"""
+        def release_orphan(finished: asyncio.Future):
+            if not finished.cancelled() and finished.exception() is None:
+                asyncio.ensure_future(pool.release(finished.result()))
+        
+        task.cancel()
+        task.add_done_callback(release_orphan)
+    
+    async def _is_alive(self, conn) -> bool:
+        """Pre-ping соединения, простаивавшего дольше pre_ping_idle"""
+        last_usage = getattr(conn, 'last_usage', None)
+        if last_usage is None or asyncio.get_running_loop().time() - last_usage < DB_POOL_SETTINGS['pre_ping_idle']:
+            return True
+        try:
+            await conn.ping(reconnect=False)
+            return True
+        except Exception as e:
+            self.stale_connections += 1
+            logger.warning(f"⚠️ Соединение с БД не отвечает, заменяем: {e}")
+            return False
+    
+    async def _warm_up_pool(self):
+        """Заранее открыть warmup соединений, чтобы первые запросы не ждали подключения"""
+        target = min(DB_POOL_SETTINGS['warmup'], self.pool.maxsize)
+        missing = target - self.pool.size
+        if missing <= 0:
+            return
+        
+        # Пул сначала выдает свободные соединения, поэтому они удерживаются вместе
+        # с новыми: открывается ровно missing соединений, занятые не учитываются дважды
+        conns = await asyncio.gather(
+            *(self.pool.acquire() for _ in range(self.pool.freesize + missing)), return_exceptions=True
+        )
+        await self._release_all(conns)
+        logger.info(f"🔥 Пул БД прогрет: {self.pool.size} соединений")
+    
+    async def _pool_keepalive(self):
+        """Периодическая проверка простаивающих соединений и дозаполнение пула
+        
+        Соединения, которые MySQL закрыл по wait_timeout, обнаруживаются
+        pre-ping здесь, а не в обработчике; свободные соединения проверяются
+        параллельно. Пока в пуле есть занятые соединения, проверка и прогрев
+        не выполняются - они нужны только после простоя.
+        """
+        while True:
+            await asyncio.sleep(DB_POOL_SETTINGS['keepalive_interval'])
+            if self.pool.size - self.pool.freesize > 0:
+                continue
+            try:
+                conns = await asyncio.gather(
+                    *(self._acquire(self.pool) for _ in range(self.pool.freesize)), return_exceptions=True
+                )
+                await self._release_all(conns)
+                await self._warm_up_pool()
+            except Exception as e:
+                logger.error(f"Ошибка проверки пула соединений: {e}")
+    
+    async def _release_all(self, conns: List[Any]):
+        """Возврат в пул соединений, полученных через gather(..., return_exceptions=True)"""
+        for conn in conns:
+            if not isinstance(conn, BaseException):
+                await self.pool.release(conn)
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Состояние пула: занятые, свободные и ожидающие соединения"""
+        if self.pool is None:
+            return {}
+        return {
+            'size': self.pool.size,
+            'minsize': self.pool.minsize,
+            'maxsize': self.pool.maxsize,
+            'in_use': self.pool.size - self.pool.freesize,
+            'idle': self.pool.freesize,
+            'waiters': self.pool_waiters,
+            'acquire_timeouts': self.pool_timeouts,
+            'stale_connections': self.stale_connections
+        }
+    
+    @asynccontextmanager
+    async def query(self, name: str, *cursor_classes):
+        """Курсор для запросов вне транзакции (autocommit)
+        
+        Все запросы DatabaseManager идут через query / transaction: время
+        ожидания пула, задержка, число строк и ошибки учитываются в
+        query_metrics под именем операции.
+        """
+        async with self.connection(name) as conn:
+            async with conn.cursor(*cursor_classes) as cursor:
+                yield self._instrument(cursor, name)
+    
+    @asynccontextmanager
+    async def read(self, name: str, *cursor_classes, user_id: Optional[int] = None):
+        """Курсор для чтения, допускающего отставание реплики
+        
+        Запрос уходит на реплику, если она настроена и исправна, а чтения
+        пользователя user_id не закреплены за основным сервером после его
+        изменений. Если соединение с репликой получить не удалось, реплика
+        исключается и запрос сразу выполняется на основном сервере.
+        """
+        pool = self.replica.choose(user_id)
+        conn = None
+        if pool is not None:
+            try:
+                conn = await self._acquire(pool)
+            except Exception as e:
+                self.replica.mark_down(e)
+        
+        if conn is None:
+            async with self.query(name, *cursor_classes) as cursor:
+                yield cursor
+            return
+        
+        try:
+            async with conn.cursor(*cursor_classes) as cursor:
+                yield self._instrument(cursor, name)
+        except aiomysql.OperationalError as e:
+            # Обрыв соединения с репликой: следующие чтения пойдут на основной сервер
+            self.replica.mark_down(e)
+            raise
+        finally:
+            await pool.release(conn)
+    
+    @asynccontextmanager
+    async def transaction(self, name: str, *cursor_classes):
+        """Единица работы: одно соединение и одна явная транзакция
+        
+        Все запросы внутри блока выполняются на одном соединении и
+        фиксируются одним COMMIT. При исключении выполняется ROLLBACK.
+        """
+        async with self.connection(name) as conn:
+            await conn.begin()
+            try:
+                async with conn.cursor(*cursor_classes) as cursor:
+                    yield self._instrument(cursor, name)
+                await conn.commit()
+            except BaseException:
+                await conn.rollback()
+                raise
+    
+    def _instrument(self, cursor, name: str) -> InstrumentedCursor:
+        return InstrumentedCursor(cursor, name, self.query_metrics, self._on_slow_query)
+    
+    def _on_slow_query(self, name: str, query: str, args, elapsed: float):
+        """Лог медленного запроса; план EXPLAIN снимается в фоне на отдельном соединении"""
+        logger.warning(f"🐢 Медленный запрос {name}: {elapsed * 1000:.0f} мс: {' '.join(query.split())[:500]}")
+        
+        if not METRICS_SETTINGS['explain_slow_queries'] or not _EXPLAINABLE.match(query):
+            return
+        now = time.monotonic()
+        if now - self._explained_at.get(name, float('-inf')) < METRICS_SETTINGS['explain_interval']:
+            return
+        self._explained_at[name] = now
+        
+        task = asyncio.create_task(self._explain(name, query, args))
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+    
+    async def _explain(self, name: str, query: str, args):
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.cursor(aiomysql.DictCursor) as cursor:
+                    await cursor.execute(f"EXPLAIN {query}", args)
+                    plan = await cursor.fetchall()
+            for row in plan:
+                logger.warning(
+                    f"🐢 EXPLAIN {name}: table={row.get('table')} type={row.get('type')} "
+                    f"key={row.get('key')} rows={row.get('rows')} extra={row.get('Extra')}"
+                )
+        except Exception as e:
+            logger.error(f"Ошибка EXPLAIN для {name}: {e}")
+    
     async def register_user(self, user_id: int, username: str, first_name: str) -> bool:
         """Регистрация нового пользователя"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        "INSERT IGNORE INTO users (user_id, username, first_name) VALUES (%s, %s, %s)",
-                        (user_id, username, first_name)
-                    )
-                    
-                    # Логируем действие
-                    await self._log_action(user_id, None, "user_registration", f"Username: {username}")
-                    
-                    return True
+            async with self.transaction('register_user') as cursor:
+                await cursor.execute(
+                    "INSERT IGNORE INTO users (user_id, username, first_name) VALUES (%s, %s, %s)",
+                    (user_id, username, first_name)
+                )
+                
+                if cursor.rowcount > 0:
+                    await self._bump_daily_stats(cursor, new_users=1)
+                    await self._bump_summary(cursor, total_users=1)
+                
+                # Логируем действие
+                await self._log_action(user_id, None, "user_registration", f"Username: {username}", cursor=cursor)
+                
+            self.replica.pin(user_id)
+            await self.user_cache.set(user_id, True)
+            return True
         except Exception as e:
             logger.error(f"Ошибка регистрации пользователя {user_id}: {e}")
             return False
     
     async def is_user_registered(self, user_id: int) -> bool:
-        """Проверка регистрации пользователя"""
+        """Проверка регистрации пользователя (через кеш)"""
+        cached = await self.user_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        "SELECT user_id FROM users WHERE user_id = %s",
-                        (user_id,)
-                    )
-                    result = await cursor.fetchone()
-                    return result is not None
+            async with self.query('is_user_registered') as cursor:
+                await cursor.execute(
+                    "SELECT user_id FROM users WHERE user_id = %s",
+                    (user_id,)
+                )
+                result = await cursor.fetchone()
+            
+            registered = result is not None
+            await self.user_cache.set(user_id, registered)
+            return registered
         except Exception as e:
             logger.error(f"Ошибка проверки регистрации {user_id}: {e}")
             return False
@@ -142,18 +410,21 @@ class DatabaseManager:
     async def create_deal(self, deal_id: str, creator_id: int, amount: float, condition: str, password: str) -> bool:
         """Создание новой сделки"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        """INSERT INTO deals (deal_id, creator_id, amount, condition, password) 
-                           VALUES (%s, %s, %s, %s, %s)""",
-                        (deal_id, creator_id, amount, condition, password)
-                    )
-                    
-                    # Логируем действие
-                    await self._log_action(creator_id, deal_id, "deal_created", f"Amount: {amount} USDT")
-                    
-                    return True
+            async with self.transaction('create_deal') as cursor:
+                await cursor.execute(
+                    """INSERT INTO deals (deal_id, creator_id, amount, `condition`, password) 
+                       VALUES (%s, %s, %s, %s, %s)""",
+                    (_deal_key(deal_id), creator_id, amount, condition, password)
+                )
+                await self._bump_daily_stats(cursor, new_deals=1)
+                await self._bump_summary(cursor, active_deals=1)
+                
+                # Логируем действие
+                await self._log_action(creator_id, deal_id, "deal_created", f"Amount: {amount} USDT", cursor=cursor)
+                
+            self.deal_locks.add_deal(deal_id, creator_id)
+            self.replica.pin(creator_id)
+            return True
         except Exception as e:
             logger.error(f"Ошибка создания сделки {deal_id}: {e}")
             return False
@@ -161,60 +432,84 @@ class DatabaseManager:
     async def get_deal(self, deal_id: str) -> Optional[Dict[str, Any]]:
         """Получение информации о сделке"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
-                    await cursor.execute(
-                        "SELECT * FROM deals WHERE deal_id = %s",
-                        (deal_id,)
-                    )
-                    return await cursor.fetchone()
+            async with self.query('get_deal', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT * FROM deals WHERE deal_id = %s",
+                    (_deal_key(deal_id),)
+                )
+                return _with_code(await cursor.fetchone())
         except Exception as e:
             logger.error(f"Ошибка получения сделки {deal_id}: {e}")
             return None
     
-    async def join_deal(self, deal_id: str, buyer_id: int) -> bool:
-        """Присоединение покупателя к сделке"""
+    async def join_deal(self, deal_id: str, buyer_id: int, password: str = None,
+                        deal: Optional[Dict[str, Any]] = None,
+                        notifications: Sequence[Notification] = ()) -> Optional[Dict[str, Any]]:
+        """Атомарное присоединение покупателя к сделке (compare-and-set)
+        
+        Один условный UPDATE: выигрывает только тот покупатель, чей запрос
+        первым перевел сделку из 'active' в 'joined'. Если передан password,
+        он проверяется в том же запросе. Возвращает строку сделки при успехе
+        (собранную из снимка deal - сумма, условие и создатель неизменны,
+        поэтому повторный SELECT не нужен) или None, если присоединиться
+        не удалось. Запись журнала и уведомления notifications (в outbox)
+        пишутся той же транзакцией, на одном соединении.
+        """
+        query = """UPDATE deals SET buyer_id = %s, status = 'joined' 
+                   WHERE deal_id = %s AND status = 'active' 
+                   AND buyer_id IS NULL AND creator_id <> %s"""
+        params = [buyer_id, _deal_key(deal_id), buyer_id]
+        
+        if password is not None:
+            query += " AND password = CAST(%s AS BINARY)"
+            params.append(password)
+        
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # Проверяем, что сделка активна и свободна
-                    await cursor.execute(
-                        "SELECT status, buyer_id FROM deals WHERE deal_id = %s",
-                        (deal_id,)
-                    )
-                    result = await cursor.fetchone()
-                    
-                    if not result or result[0] != 'active' or result[1] is not None:
-                        return False
-                    
-                    # Присоединяем покупателя
-                    await cursor.execute(
-                        "UPDATE deals SET buyer_id = %s, status = 'joined' WHERE deal_id = %s",
-                        (buyer_id, deal_id)
-                    )
-                    
-                    # Логируем действие
-                    await self._log_action(buyer_id, deal_id, "deal_joined", "Buyer joined the deal")
-                    
-                    return True
+            async with self.transaction('join_deal') as cursor:
+                await cursor.execute(query, params)
+                if cursor.rowcount != 1:
+                    return None
+                
+                # Логируем действие
+                await self._log_action(buyer_id, deal_id, "deal_joined", "Buyer joined the deal", cursor=cursor)
+                await self._enqueue_notifications(cursor, deal_id, notifications)
+            
+            if notifications:
+                self._outbox_written()
+            self.deal_locks.set_buyer(deal_id, buyer_id, (deal or {}).get('creator_id'))
+            self.replica.pin(*self.deal_locks.participants(deal_id), buyer_id)
+            
+            joined = dict(deal or {})
+            joined.update(deal_id=deal_id, buyer_id=buyer_id, status='joined')
+            return joined
         except Exception as e:
             logger.error(f"Ошибка присоединения к сделке {deal_id}: {e}")
-            return False
+            return None
     
-    async def cancel_deal(self, deal_id: str) -> bool:
-        """Отмена сделки"""
+    async def cancel_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        """Отмена сделки (с записью уведомлений в outbox той же транзакцией)"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        "UPDATE deals SET status = 'cancelled' WHERE deal_id = %s",
-                        (deal_id,)
-                    )
+            async with self.transaction('cancel_deal') as cursor:
+                # Отменить можно только незавершенную сделку
+                await cursor.execute(
+                    """UPDATE deals SET status = 'cancelled' 
+                       WHERE deal_id = %s AND status IN ('active', 'joined', 'paid')""",
+                    (_deal_key(deal_id),)
+                )
+                cancelled = cursor.rowcount > 0
+                if cancelled:
+                    await self._bump_summary(cursor, active_deals=-1)
+                    await self._enqueue_notifications(cursor, deal_id, notifications)
                     
                     # Логируем действие
-                    await self._log_action(None, deal_id, "deal_cancelled", "Deal cancelled by creator")
-                    
-                    return cursor.rowcount > 0
+                    await self._log_action(None, deal_id, "deal_cancelled", "Deal cancelled by creator", cursor=cursor)
+                
+            if cancelled:
+                self.replica.pin(*self.deal_locks.participants(deal_id))
+                self.deal_locks.release_deal(deal_id)
+                if notifications:
+                    self._outbox_written()
+            return cancelled
         except Exception as e:
             logger.error(f"Ошибка отмены сделки {deal_id}: {e}")
             return False
@@ -222,183 +517,751 @@ class DatabaseManager:
     async def get_active_deal_by_creator(self, creator_id: int) -> Optional[Dict[str, Any]]:
         """Получение активной сделки пользователя как создателя"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
-                    await cursor.execute(
-                        """SELECT * FROM deals 
-                           WHERE creator_id = %s AND status IN ('active', 'joined', 'paid')""",
-                        (creator_id,)
-                    )
-                    return await cursor.fetchone()
+            async with self.query('get_active_deal_by_creator', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    """SELECT * FROM deals 
+                       WHERE creator_id = %s AND status IN ('active', 'joined', 'paid')""",
+                    (creator_id,)
+                )
+                return _with_code(await cursor.fetchone())
         except Exception as e:
             logger.error(f"Ошибка поиска активной сделки создателя {creator_id}: {e}")
             return None
     
     async def is_user_in_active_deal(self, user_id: int) -> bool:
-        """Проверка участия пользователя в активной сделке"""
+        """Проверка участия пользователя в активной сделке (из памяти)"""
+        locked = self.deal_locks.is_locked(user_id)
+        
+        if locked is not None and not ACTIVE_DEAL_LOCK_SETTINGS['consistency_check']:
+            return locked
+        
+        actual = await self._query_user_in_active_deal(user_id)
+        if locked is not None and actual is not None and locked != actual:
+            self.deal_locks.mismatches += 1
+            logger.warning(f"⚠️ Расхождение кеша блокировки для {user_id}: память={locked}, БД={actual}")
+        
+        if actual is None:
+            return bool(locked)
+        return actual
+    
+    async def _query_user_in_active_deal(self, user_id: int) -> Optional[bool]:
+        """Проверка участия пользователя в активной сделке по БД
+        
+        Два EXISTS вместо (creator_id = %s OR buyer_id = %s): каждая ветка
+        идет по своему индексу idx_creator_status / idx_buyer_status.
+        """
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        """SELECT COUNT(*) FROM deals 
-                           WHERE (creator_id = %s OR buyer_id = %s) 
-                           AND status IN ('active', 'joined', 'paid')""",
-                        (user_id, user_id)
-                    )
-                    result = await cursor.fetchone()
-                    return result[0] > 0
+            async with self.query('query_user_in_active_deal') as cursor:
+                await cursor.execute(
+                    """SELECT EXISTS(SELECT 1 FROM deals 
+                                     WHERE creator_id = %s AND status IN ('active', 'joined', 'paid'))
+                           OR EXISTS(SELECT 1 FROM deals 
+                                     WHERE buyer_id = %s AND status IN ('active', 'joined', 'paid'))""",
+                    (user_id, user_id)
+                )
+                result = await cursor.fetchone()
+                return bool(result[0])
         except Exception as e:
             logger.error(f"Ошибка проверки активных сделок {user_id}: {e}")
-            return False
+            return None
+    
+    async def _fetch_active_deal_participants(self) -> List[tuple]:
+        """Участники всех незавершенных сделок (по индексу idx_status)"""
+        async with self.query('fetch_active_deal_participants') as cursor:
+            await cursor.execute(
+                """SELECT deal_id, creator_id, buyer_id FROM deals 
+                   WHERE status IN ('active', 'joined', 'paid')"""
+            )
+            return [(encode_deal_code(deal_id), creator_id, buyer_id)
+                    for deal_id, creator_id, buyer_id in await cursor.fetchall()]
+    
+    async def _load_active_deal_locks(self):
+        """Загрузка состояния блокировки панели при старте"""
+        self.deal_locks.load(await self._fetch_active_deal_participants())
+        logger.info(f"🔒 Загружено незавершенных сделок: {self.deal_locks.get_stats()['active_deals']}")
+    
+    async def verify_active_deal_locks(self, repair: bool = True) -> Dict[str, Any]:
+        """Сверка состояния блокировки панели с БД
+        
+        Возвращает расхождения (missing / stale / changed). При repair=True
+        состояние перезагружается из БД, если расхождения найдены.
+        """
+        try:
+            rows = await self._fetch_active_deal_participants()
+        except Exception as e:
+            logger.error(f"Ошибка сверки кеша блокировки: {e}")
+            return {}
+        
+        report = self.deal_locks.diff(rows)
+        inconsistent = any(report.values())
+        if inconsistent:
+            self.deal_locks.mismatches += 1
+            logger.warning(f"⚠️ Кеш блокировки расходится с БД: {report}")
+            if repair:
+                self.deal_locks.load(rows)
+        
+        report['consistent'] = not inconsistent
+        return report
     
     async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
         """Получение статистики пользователя"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
-                    await cursor.execute(
-                        "SELECT completed_deals, total_volume, registration_date FROM users WHERE user_id = %s",
-                        (user_id,)
-                    )
-                    result = await cursor.fetchone()
+            async with self.read('get_user_stats', aiomysql.DictCursor, user_id=user_id) as cursor:
+                await cursor.execute(
+                    "SELECT completed_deals, total_volume, registration_date FROM users WHERE user_id = %s",
+                    (user_id,)
+                )
+                result = await cursor.fetchone()
                     
-                    if result:
-                        return {
-                            'completed_deals': result['completed_deals'],
-                            'total_volume': float(result['total_volume']),
-                            'registration_date': result['registration_date'].strftime('%d.%m.%Y')
-                        }
-                    else:
-                        return {'completed_deals': 0, 'total_volume': 0.0, 'registration_date': 'N/A'}
+                if result:
+                    return {
+                        'completed_deals': result['completed_deals'],
+                        'total_volume': float(result['total_volume']),
+                        'registration_date': result['registration_date'].strftime('%d.%m.%Y')
+                    }
+                else:
+                    return {'completed_deals': 0, 'total_volume': 0.0, 'registration_date': 'N/A'}
         except Exception as e:
             logger.error(f"Ошибка получения статистики {user_id}: {e}")
             return {'completed_deals': 0, 'total_volume': 0.0, 'registration_date': 'N/A'}
     
-    async def get_user_deals(self, user_id: int, limit: int = 10) -> List[Dict[str, Any]]:
-        """Получение списка сделок пользователя"""
+    async def get_user_deals(self, user_id: int, limit: int = 10,
+                             after: Optional[Tuple[datetime, str]] = None,
+                             before: Optional[Tuple[datetime, str]] = None) -> Optional[Dict[str, Any]]:
+        """Страница сделок пользователя (keyset-пагинация, новые сначала)
+        
+        after / before - ключ (created_at, deal_id) последней / первой строки
+        соседней страницы. Сделки, где пользователь создатель и где покупатель,
+        читаются двумя ветками UNION ALL по индексам idx_creator_created и
+        idx_buyer_created - каждая ветка является range scan не длиннее limit + 1.
+        При ошибке возвращается None.
+        """
+        key, descending = _keyset_position(after, before)
+        order = "DESC" if descending else "ASC"
+        keyset, keyset_args = _keyset_condition("", key, descending)
+        behind, behind_args = _keyset_condition("", key, not descending, inclusive=True)
+        branch = (f"""(SELECT deal_id, amount, status, created_at FROM deals 
+                       WHERE {{column}} = %s{keyset} 
+                       ORDER BY created_at {order}, deal_id {order} LIMIT %s)""")
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor(aiomysql.DictCursor) as cursor:
+            async with self.read('get_user_deals', aiomysql.DictCursor, user_id=user_id) as cursor:
+                await cursor.execute(
+                    f"""{branch.format(column='creator_id')} 
+                        UNION ALL 
+                        {branch.format(column='buyer_id')} 
+                        ORDER BY created_at {order}, deal_id {order} 
+                        LIMIT %s""",
+                    (user_id, *keyset_args, limit + 1,
+                     user_id, *keyset_args, limit + 1,
+                     limit + 1)
+                )
+                rows = [_with_code(row) for row in await cursor.fetchall()]
+                
+                # Есть ли сделки по другую сторону курсора (кнопка обратного перехода)
+                has_behind = False
+                if key is not None:
                     await cursor.execute(
-                        """SELECT deal_id, amount, status, created_at 
-                           FROM deals 
-                           WHERE creator_id = %s OR buyer_id = %s 
-                           ORDER BY created_at DESC 
-                           LIMIT %s""",
-                        (user_id, user_id, limit)
+                        f"""SELECT EXISTS(SELECT 1 FROM deals WHERE creator_id = %s{behind}) 
+                                OR EXISTS(SELECT 1 FROM deals WHERE buyer_id = %s{behind}) AS behind""",
+                        (user_id, *behind_args, user_id, *behind_args), name='get_user_deals_behind'
                     )
-                    return await cursor.fetchall()
+                    has_behind = bool((await cursor.fetchone())['behind'])
+            return keyset_page(list(rows), limit, after, before, has_behind)
         except Exception as e:
             logger.error(f"Ошибка получения сделок пользователя {user_id}: {e}")
-            return []
+            return None
+    
+    async def get_active_deals(self, limit: int = 10,
+                               after: Optional[Tuple[datetime, str]] = None,
+                               before: Optional[Tuple[datetime, str]] = None) -> Optional[Dict[str, Any]]:
+        """Страница незавершенных сделок для админ-панели (keyset по idx_status_created; None при ошибке)"""
+        key, descending = _keyset_position(after, before)
+        order = "DESC" if descending else "ASC"
+        keyset, keyset_args = _keyset_condition("d.", key, descending)
+        behind, behind_args = _keyset_condition("", key, not descending, inclusive=True)
+        try:
+            async with self.read('get_active_deals', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    f"""SELECT d.deal_id, d.creator_id, d.buyer_id, d.amount, 
+                               d.status, d.created_at, u1.username as creator_username,
+                               u2.username as buyer_username
+                        FROM deals d
+                        LEFT JOIN users u1 ON d.creator_id = u1.user_id
+                        LEFT JOIN users u2 ON d.buyer_id = u2.user_id
+                        WHERE d.status IN ('active', 'joined', 'paid'){keyset}
+                        ORDER BY d.created_at {order}, d.deal_id {order}
+                        LIMIT %s""",
+                    (*keyset_args, limit + 1)
+                )
+                rows = [_with_code(row) for row in await cursor.fetchall()]
+                
+                has_behind = False
+                if key is not None:
+                    await cursor.execute(
+                        f"""SELECT EXISTS(SELECT 1 FROM deals 
+                                          WHERE status IN ('active', 'joined', 'paid'){behind}) AS behind""",
+                        behind_args, name='get_active_deals_behind'
+                    )
+                    has_behind = bool((await cursor.fetchone())['behind'])
+            return keyset_page(list(rows), limit, after, before, has_behind)
+        except Exception as e:
+            logger.error(f"Ошибка получения активных сделок: {e}")
+            return None
     
     async def add_transaction(self, deal_id: str, user_id: int, transaction_type: str, 
                             amount: float, crypto_type: str, tx_hash: str = None) -> bool:
         """Добавление транзакции"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        """INSERT INTO transactions 
-                           (deal_id, user_id, transaction_type, amount, crypto_type, tx_hash) 
-                           VALUES (%s, %s, %s, %s, %s, %s)""",
-                        (deal_id, user_id, transaction_type, amount, crypto_type, tx_hash)
-                    )
-                    
-                    # Логируем действие
-                    await self._log_action(user_id, deal_id, f"transaction_{transaction_type}", 
-                                         f"Amount: {amount}, Type: {crypto_type}")
-                    
-                    return True
+            async with self.transaction('add_transaction') as cursor:
+                await cursor.execute(
+                    """INSERT INTO transactions 
+                       (deal_id, user_id, transaction_type, amount, crypto_type, tx_hash) 
+                       VALUES (%s, %s, %s, %s, %s, %s)""",
+                    (_deal_key(deal_id), user_id, transaction_type, amount, crypto_type, tx_hash)
+                )
+                
+                if transaction_type == 'payment':
+                    await self._bump_daily_stats(cursor, crypto_type=crypto_type, volume=amount)
+                
+                # Логируем действие
+                await self._log_action(user_id, deal_id, f"transaction_{transaction_type}", 
+                                     f"Amount: {amount}, Type: {crypto_type}", cursor=cursor)
+                
+            self.replica.pin(user_id)
+            return True
         except Exception as e:
             logger.error(f"Ошибка добавления транзакции: {e}")
             return False
     
-    async def complete_deal(self, deal_id: str) -> bool:
-        """Завершение сделки"""
+    async def complete_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        """Завершение сделки (с записью уведомлений в outbox той же транзакцией)"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    # Получаем данные сделки
-                    await cursor.execute(
-                        "SELECT creator_id, buyer_id, amount FROM deals WHERE deal_id = %s",
-                        (deal_id,)
-                    )
-                    deal_data = await cursor.fetchone()
-                    
-                    if not deal_data:
-                        return False
-                    
-                    creator_id, buyer_id, amount = deal_data
-                    
-                    # Обновляем статус сделки
-                    await cursor.execute(
-                        "UPDATE deals SET status = 'completed' WHERE deal_id = %s",
-                        (deal_id,)
-                    )
-                    
-                    # Обновляем статистику пользователей
-                    for user_id in [creator_id, buyer_id]:
-                        if user_id:
-                            await cursor.execute(
-                                """UPDATE users 
-                                   SET completed_deals = completed_deals + 1, 
-                                       total_volume = total_volume + %s 
-                                   WHERE user_id = %s""",
-                                (amount, user_id)
-                            )
-                    
-                    # Логируем действие
-                    await self._log_action(None, deal_id, "deal_completed", f"Amount: {amount}")
-                    
-                    return True
+            async with self.transaction('complete_deal') as cursor:
+                # Получаем данные сделки (с блокировкой строки до конца транзакции)
+                await cursor.execute(
+                    "SELECT creator_id, buyer_id, amount, status FROM deals WHERE deal_id = %s FOR UPDATE",
+                    (_deal_key(deal_id),)
+                )
+                deal_data = await cursor.fetchone()
+                
+                # Завершить можно только незавершенную сделку (иначе статистика учтется дважды)
+                if not deal_data or deal_data[3] not in ('active', 'joined', 'paid'):
+                    return False
+                
+                creator_id, buyer_id, amount, _ = deal_data
+                
+                # Обновляем статус сделки
+                await cursor.execute(
+                    "UPDATE deals SET status = 'completed' WHERE deal_id = %s",
+                    (_deal_key(deal_id),)
+                )
+                
+                # Обновляем статистику обоих участников одним запросом
+                participants = [user_id for user_id in (creator_id, buyer_id) if user_id]
+                await cursor.execute(
+                    f"""UPDATE users 
+                        SET completed_deals = completed_deals + 1, 
+                            total_volume = total_volume + %s 
+                        WHERE user_id IN ({', '.join(['%s'] * len(participants))})""",
+                    (amount, *participants)
+                )
+                await self._bump_daily_stats(cursor, completed_deals=1, volume=amount)
+                await self._bump_summary(cursor, active_deals=-1, completed_deals=1, total_volume=amount)
+                
+                # Логируем действие
+                await self._log_action(None, deal_id, "deal_completed", f"Amount: {amount}", cursor=cursor)
+                await self._enqueue_notifications(cursor, deal_id, notifications)
+                
+            self.replica.pin(creator_id, buyer_id)
+            self.deal_locks.release_deal(deal_id)
+            if notifications:
+                self._outbox_written()
+            return True
         except Exception as e:
             logger.error(f"Ошибка завершения сделки {deal_id}: {e}")
             return False
     
-    async def _log_action(self, user_id: int, deal_id: str, action: str, details: str = None):
-        """Логирование действий пользователей"""
+    async def _enqueue_notifications(self, cursor, deal_id: str, notifications: Sequence[Notification]):
+        """Запись уведомлений в outbox в текущей транзакции"""
+        if not notifications:
+            return
+        await cursor.execute(
+            f"""INSERT INTO notification_outbox (chat_id, deal_id, text) 
+                VALUES {', '.join(['(%s, %s, %s)'] * len(notifications))}""",
+            [value for chat_id, text in notifications for value in (chat_id, _deal_key(deal_id), text)],
+            name='enqueue_notifications'
+        )
+    
+    async def _bump_daily_stats(self, cursor, crypto_type: str = 'ALL', new_users: int = 0,
+                                new_deals: int = 0, completed_deals: int = 0, volume: float = 0):
+        """Инкремент дневной сводки в текущей транзакции"""
+        await cursor.execute(
+            """INSERT INTO daily_stats 
+               (stat_date, crypto_type, new_users, new_deals, completed_deals, volume) 
+               VALUES (CURDATE(), %s, %s, %s, %s, %s) 
+               ON DUPLICATE KEY UPDATE 
+                   new_users = new_users + VALUES(new_users), 
+                   new_deals = new_deals + VALUES(new_deals), 
+                   completed_deals = completed_deals + VALUES(completed_deals), 
+                   volume = volume + VALUES(volume)""",
+            (crypto_type, new_users, new_deals, completed_deals, volume),
+            name='bump_daily_stats'
+        )
+    
+    async def get_daily_stats(self, days: int = 1) -> List[Dict[str, Any]]:
+        """Строки дневной сводки за последние days дней (включая сегодня)"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    await cursor.execute(
-                        "INSERT INTO action_logs (user_id, deal_id, action, details) VALUES (%s, %s, %s, %s)",
-                        (user_id, deal_id, action, details)
-                    )
+            async with self.read('get_daily_stats', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    """SELECT stat_date, crypto_type, new_users, new_deals, completed_deals, volume 
+                       FROM daily_stats 
+                       WHERE stat_date > CURDATE() - INTERVAL %s DAY 
+                       ORDER BY stat_date""",
+                    (days,)
+                )
+                return await cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка получения дневной статистики: {e}")
+            return []
+    
+    async def rebuild_daily_stats(self, since=None) -> bool:
+        """Пересчет дневной сводки по исходным таблицам (начиная с даты since)"""
+        since = since or '1970-01-01'
+        try:
+            async with self.transaction('rebuild_daily_stats') as cursor:
+                await cursor.execute("DELETE FROM daily_stats WHERE stat_date >= %s", (since,))
+                
+                await cursor.execute(
+                    """INSERT INTO daily_stats (stat_date, crypto_type, new_users) 
+                       SELECT DATE(registration_date), 'ALL', COUNT(*) FROM users 
+                       WHERE registration_date >= %s GROUP BY DATE(registration_date) 
+                       ON DUPLICATE KEY UPDATE new_users = VALUES(new_users)""",
+                    (since,)
+                )
+                await cursor.execute(
+                    """INSERT INTO daily_stats (stat_date, crypto_type, new_deals) 
+                       SELECT DATE(created_at), 'ALL', COUNT(*) FROM deals 
+                       WHERE created_at >= %s GROUP BY DATE(created_at) 
+                       ON DUPLICATE KEY UPDATE new_deals = VALUES(new_deals)""",
+                    (since,)
+                )
+                await cursor.execute(
+                    """INSERT INTO daily_stats (stat_date, crypto_type, completed_deals, volume) 
+                       SELECT DATE(updated_at), 'ALL', COUNT(*), SUM(amount) FROM deals 
+                       WHERE status = 'completed' AND updated_at >= %s GROUP BY DATE(updated_at) 
+                       ON DUPLICATE KEY UPDATE completed_deals = VALUES(completed_deals), volume = VALUES(volume)""",
+                    (since,)
+                )
+                await cursor.execute(
+                    """INSERT INTO daily_stats (stat_date, crypto_type, volume) 
+                       SELECT DATE(created_at), crypto_type, SUM(amount) FROM transactions 
+                       WHERE transaction_type = 'payment' AND created_at >= %s 
+                       GROUP BY DATE(created_at), crypto_type 
+                       ON DUPLICATE KEY UPDATE volume = VALUES(volume)""",
+                    (since,)
+                )
+            
+            logger.info(f"✅ Дневная статистика пересчитана с {since}")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка пересчета дневной статистики: {e}")
+            return False
+    
+    async def log_action(self, user_id: Optional[int], deal_id: Optional[str], action: str, details: str = None):
+        """Запись в журнал действий (вне транзакции)"""
+        await self._log_action(user_id, deal_id, action, details)
+    
+    async def _log_action(self, user_id: int, deal_id: str, action: str, details: str = None, cursor=None):
+        """Логирование действий пользователей
+        
+        Если передан cursor открытой транзакции, запись всегда выполняется
+        на нем: строка журнала фиксируется или откатывается вместе с
+        изменением, без захвата второго соединения. Запись вне транзакции
+        при запущенном AuditLogWriter только ставится в очередь и пишется
+        фоновой задачей пакетами.
+        """
+        deal_key = _deal_key(deal_id)
+        query = "INSERT INTO action_logs (user_id, deal_id, action, details) VALUES (%s, %s, %s, %s)"
+        
+        if cursor is not None:
+            await cursor.execute(query, (user_id, deal_key, action, details), name='log_action')
+            return
+        
+        if self.audit_writer is not None and self.audit_writer.running:
+            await self.audit_writer.log(user_id, deal_key, action, details)
+            return
+        
+        try:
+            async with self.query('log_action') as cursor:
+                await cursor.execute(query, (user_id, deal_key, action, details))
         except Exception as e:
             logger.error(f"Ошибка логирования действия: {e}")
     
+    async def _bump_summary(self, cursor, total_users: int = 0, active_deals: int = 0,
+                            completed_deals: int = 0, total_volume: float = 0):
+        """Инкремент глобальных счетчиков в текущей транзакции (в случайный слот)"""
+        await cursor.execute(
+            """INSERT INTO stats_summary (slot, total_users, active_deals, completed_deals, total_volume) 
+               VALUES (%s, %s, %s, %s, %s) 
+               ON DUPLICATE KEY UPDATE 
+                   total_users = total_users + VALUES(total_users), 
+                   active_deals = active_deals + VALUES(active_deals), 
+                   completed_deals = completed_deals + VALUES(completed_deals), 
+                   total_volume = total_volume + VALUES(total_volume)""",
+            (random.randrange(STATS_SETTINGS['summary_slots']),
+             total_users, active_deals, completed_deals, total_volume),
+            name='bump_summary'
+        )
+    
     async def get_admin_stats(self) -> Dict[str, Any]:
-        """Получение административной статистики"""
+        """Получение административной статистики (из stats_summary, O(1))"""
         try:
-            async with self.pool.acquire() as conn:
-                async with conn.cursor() as cursor:
-                    stats = {}
-                    
-                    # Общее количество пользователей
-                    await cursor.execute("SELECT COUNT(*) FROM users")
-                    stats['total_users'] = (await cursor.fetchone())[0]
-                    
-                    # Активные сделки
-                    await cursor.execute("SELECT COUNT(*) FROM deals WHERE status IN ('active', 'joined', 'paid')")
-                    stats['active_deals'] = (await cursor.fetchone())[0]
-                    
-                    # Завершенные сделки
-                    await cursor.execute("SELECT COUNT(*) FROM deals WHERE status = 'completed'")
-                    stats['completed_deals'] = (await cursor.fetchone())[0]
-                    
-                    # Общий объем
-                    await cursor.execute("SELECT SUM(amount) FROM deals WHERE status = 'completed'")
-                    result = await cursor.fetchone()
-                    stats['total_volume'] = float(result[0]) if result[0] else 0.0
-                    
-                    return stats
+            async with self.read('get_admin_stats') as cursor:
+                await cursor.execute(
+                    """SELECT SUM(total_users), SUM(active_deals), SUM(completed_deals), SUM(total_volume) 
+                       FROM stats_summary"""
+                )
+                return self._summary_to_stats(await cursor.fetchone())
         except Exception as e:
             logger.error(f"Ошибка получения административной статистики: {e}")
             return {}
     
+    @staticmethod
+    def _summary_to_stats(row) -> Dict[str, Any]:
+        total_users, active_deals, completed_deals, total_volume = row or (None, None, None, None)
+        return {
+            'total_users': int(total_users or 0),
+            'active_deals': int(active_deals or 0),
+            'completed_deals': int(completed_deals or 0),
+            'total_volume': float(total_volume or 0)
+        }
+    
+    async def _seed_stats_summary(self):
+        """Первичное заполнение счетчиков при пустой stats_summary"""
+        async with self.query('seed_stats_summary') as cursor:
+            await cursor.execute("SELECT COUNT(*) FROM stats_summary")
+            seeded = (await cursor.fetchone())[0] > 0
+        
+        if not seeded:
+            await self.reconcile_admin_stats(repair=True)
+    
+    async def reconcile_admin_stats(self, repair: bool = True) -> Dict[str, Any]:
+        """Сверка счетчиков stats_summary с агрегатами по таблицам
+        
+        Слоты блокируются на время пересчета, поэтому изменения, ожидающие
+        инкремента счетчика, применятся уже поверх исправленных значений.
+        Возвращает расхождение (drift) по каждому счетчику.
+        """
+        try:
+            async with self.transaction('reconcile_admin_stats') as cursor:
+                await cursor.execute(
+                    """SELECT SUM(total_users), SUM(active_deals), SUM(completed_deals), SUM(total_volume) 
+                       FROM stats_summary FOR UPDATE"""
+                )
+                materialized = self._summary_to_stats(await cursor.fetchone())
+                
+                await cursor.execute("SELECT COUNT(*) FROM users")
+                total_users = (await cursor.fetchone())[0]
+                await cursor.execute(
+                    """SELECT 
+                           SUM(status IN ('active', 'joined', 'paid')), 
+                           SUM(status = 'completed'), 
+                           SUM(IF(status = 'completed', amount, 0)) 
+                       FROM deals"""
+                )
+                actual = self._summary_to_stats((total_users, *(await cursor.fetchone())))
+                
+                drift = {key: actual[key] - materialized[key] for key in actual}
+                drifted = any(abs(value) > 0.005 for value in drift.values())
+                
+                if drifted:
+                    logger.warning(f"⚠️ Расхождение глобальных счетчиков: {drift}")
+                    if repair:
+                        await cursor.execute("DELETE FROM stats_summary")
+                        await cursor.execute(
+                            """INSERT INTO stats_summary 
+                               (slot, total_users, active_deals, completed_deals, total_volume) 
+                               VALUES (0, %s, %s, %s, %s)""",
+                            (actual['total_users'], actual['active_deals'],
+                             actual['completed_deals'], actual['total_volume'])
+                        )
+            
+            return {'drift': drift, 'consistent': not drifted}
+        except Exception as e:
+            logger.error(f"Ошибка сверки глобальных счетчиков: {e}")
+            return {}
+    
+    async def run_stats_reconciliation(self, interval: int = STATS_SETTINGS['reconcile_interval']):
+        """Периодическая сверка глобальных счетчиков (фоновая задача)"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.reconcile_admin_stats(repair=True)
+    
+    async def rotate_action_log_partitions(self) -> Dict[str, List[str]]:
+        """Создание будущих секций action_logs и удаление/архивирование просроченных"""
+        try:
+            return await self.action_log_partitions.rotate()
+        except Exception as e:
+            logger.error(f"Ошибка ротации секций журнала действий: {e}")
+            return {}
+    
+    async def run_action_log_retention(self, interval: int = AUDIT_RETENTION_SETTINGS['rotate_interval']):
+        """Периодическая ротация секций журнала действий (фоновая задача)"""
+        while True:
+            await self.rotate_action_log_partitions()
+            await asyncio.sleep(interval)
+    
+    async def get_action_logs(self, since: datetime, until: Optional[datetime] = None,
+                              user_id: Optional[int] = None, deal_id: Optional[str] = None,
+                              limit: int = 50) -> List[Dict[str, Any]]:
+        """Записи журнала действий за период, новые первыми
+        
+        Диапазон по created_at обязателен: по нему MySQL отбрасывает секции
+        вне периода и читает только нужные месяцы.
+        """
+        conditions = ["created_at >= %s", "created_at < %s"]
+        args: List[Any] = [since, until or datetime.now()]
+        if user_id is not None:
+            conditions.append("user_id = %s")
+            args.append(user_id)
+        if deal_id is not None:
+            conditions.append("deal_id = %s")
+            args.append(_deal_key(deal_id))
+        args.append(limit)
+        
+        try:
+            async with self.read('get_action_logs', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    f"""SELECT log_id, user_id, deal_id, action, details, created_at 
+                        FROM action_logs 
+                        WHERE {' AND '.join(conditions)} 
+                        ORDER BY created_at DESC, log_id DESC 
+                        LIMIT %s""",
+                    args
+                )
+                return [_with_code(row) for row in await cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения журнала действий: {e}")
+            return []
+    
+    async def block_user(self, user_id: int, admin_id: Optional[int] = None) -> bool:
+        """Деактивация пользователя и отмена всех его незавершенных сделок"""
+        try:
+            async with self.transaction('block_user') as cursor:
+                await cursor.execute(
+                    "UPDATE users SET is_active = FALSE WHERE user_id = %s",
+                    (user_id,)
+                )
+                
+                # Отменяем все активные сделки пользователя
+                await cursor.execute(
+                    "UPDATE deals SET status = 'cancelled' WHERE (creator_id = %s OR buyer_id = %s) AND status IN ('active', 'joined', 'paid')",
+                    (user_id, user_id)
+                )
+                if cursor.rowcount > 0:
+                    await self._bump_summary(cursor, active_deals=-cursor.rowcount)
+                
+                # Логируем действие
+                await self._log_action(admin_id, None, "admin_block_user", f"User {user_id} blocked by admin",
+                                       cursor=cursor)
+            
+            await self.user_cache.invalidate(user_id)
+            self.deal_locks.release_user(user_id)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка блокировки пользователя {user_id}: {e}")
+            return False
+    
+    async def get_active_user_ids_page(self, after_user_id: int, limit: int) -> List[int]:
+        """Страница ID активных пользователей по первичному ключу (keyset)"""
+        try:
+            async with self.query('get_active_user_ids_page') as cursor:
+                await cursor.execute(
+                    """SELECT user_id FROM users 
+                       WHERE user_id > %s AND is_active = TRUE 
+                       ORDER BY user_id 
+                       LIMIT %s""",
+                    (after_user_id, limit)
+                )
+                return [row[0] for row in await cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка получения пользователей для рассылки: {e}")
+            return []
+    
+    async def deactivate_users(self, user_ids: List[int]) -> bool:
+        """Пометка пользователей неактивными (заблокировали бота)"""
+        try:
+            async with self.query('deactivate_users') as cursor:
+                await cursor.execute(
+                    f"UPDATE users SET is_active = FALSE WHERE user_id IN ({', '.join(['%s'] * len(user_ids))})",
+                    user_ids
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка деактивации пользователей: {e}")
+            return False
+    
+    async def create_broadcast(self, broadcast_id: str, message_text: str) -> bool:
+        """Создание записи рассылки"""
+        try:
+            async with self.query('create_broadcast') as cursor:
+                await cursor.execute(
+                    "INSERT INTO broadcasts (broadcast_id, message_text) VALUES (%s, %s)",
+                    (broadcast_id, message_text)
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка создания рассылки: {e}")
+            return False
+    
+    async def get_broadcast(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
+        """Получение рассылки с чекпоинтом"""
+        try:
+            async with self.query('get_broadcast', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT * FROM broadcasts WHERE broadcast_id = %s",
+                    (broadcast_id,)
+                )
+                return await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Ошибка получения рассылки {broadcast_id}: {e}")
+            return None
+    
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        """Рассылки, прерванные до завершения"""
+        try:
+            async with self.query('get_unfinished_broadcasts', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    "SELECT * FROM broadcasts WHERE status = 'running' ORDER BY created_at"
+                )
+                return await cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Ошибка получения незавершенных рассылок: {e}")
+            return []
+    
+    async def save_broadcast_checkpoint(self, broadcast_id: str, last_user_id: int,
+                                        sent: int, failed: int, blocked: int) -> bool:
+        """Сохранение чекпоинта рассылки"""
+        try:
+            async with self.query('save_broadcast_checkpoint') as cursor:
+                await cursor.execute(
+                    """UPDATE broadcasts 
+                       SET last_user_id = %s, sent = %s, failed = %s, blocked = %s 
+                       WHERE broadcast_id = %s""",
+                    (last_user_id, sent, failed, blocked, broadcast_id)
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка сохранения чекпоинта рассылки {broadcast_id}: {e}")
+            return False
+    
+    async def finish_broadcast(self, broadcast_id: str) -> bool:
+        """Отметка рассылки завершенной"""
+        try:
+            async with self.query('finish_broadcast') as cursor:
+                await cursor.execute(
+                    "UPDATE broadcasts SET status = 'completed' WHERE broadcast_id = %s",
+                    (broadcast_id,)
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка завершения рассылки {broadcast_id}: {e}")
+            return False
+    
+    async def get_pending_notifications(self, limit: int) -> List[Dict[str, Any]]:
+        """Недоставленные уведомления в порядке записи"""
+        try:
+            async with self.query('get_pending_notifications', aiomysql.DictCursor) as cursor:
+                await cursor.execute(
+                    """SELECT notification_id, chat_id, deal_id, text, attempts, next_attempt_at 
+                       FROM notification_outbox 
+                       WHERE status = 'pending' 
+                       ORDER BY notification_id 
+                       LIMIT %s""",
+                    (limit,)
+                )
+                return [_with_code(row) for row in await cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Ошибка чтения outbox уведомлений: {e}")
+            return []
+    
+    async def delete_notification(self, notification_id: int) -> bool:
+        """Удаление доставленного уведомления"""
+        try:
+            async with self.query('delete_notification') as cursor:
+                await cursor.execute(
+                    "DELETE FROM notification_outbox WHERE notification_id = %s",
+                    (notification_id,)
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка удаления уведомления {notification_id}: {e}")
+            return False
+    
+    async def reschedule_notification(self, notification_id: int, attempts: int,
+                                      next_attempt_at: datetime, error: str) -> bool:
+        """Перенос следующей попытки доставки уведомления"""
+        try:
+            async with self.query('reschedule_notification') as cursor:
+                await cursor.execute(
+                    """UPDATE notification_outbox 
+                       SET attempts = %s, next_attempt_at = %s, last_error = %s 
+                       WHERE notification_id = %s""",
+                    (attempts, next_attempt_at, error[:255], notification_id)
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка переноса уведомления {notification_id}: {e}")
+            return False
+    
+    async def fail_notification(self, notification_id: int, attempts: int, error: str) -> bool:
+        """Отметка уведомления недоставляемым"""
+        try:
+            async with self.query('fail_notification') as cursor:
+                await cursor.execute(
+                    """UPDATE notification_outbox 
+                       SET status = 'failed', attempts = %s, last_error = %s 
+                       WHERE notification_id = %s""",
+                    (attempts, error[:255], notification_id)
+                )
+                return True
+        except Exception as e:
+            logger.error(f"Ошибка отметки уведомления {notification_id}: {e}")
+            return False
+    
+    def render_query_metrics(self) -> List[str]:
+        return self.query_metrics.render_prometheus()
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Счетчики кеша регистрации пользователей"""
+        return self.user_cache.get_stats()
+    
+    def get_query_stats(self) -> Dict[str, Any]:
+        """Метрики запросов: задержки по именам операций, ожидание пула, строки, ошибки"""
+        return self.query_metrics.get_stats()
+    
+    def get_deal_lock_stats(self) -> Dict[str, Any]:
+        """Счетчики кеша блокировки панели"""
+        return self.deal_locks.get_stats()
+    
+    def get_replica_stats(self) -> Dict[str, Any]:
+        """Состояние реплики: исправность, отставание, распределение чтений"""
+        return self.replica.get_stats()
+    
+    def get_audit_stats(self) -> Dict[str, Any]:
+        """Счетчики очереди журнала действий"""
+        return self.audit_writer.get_stats() if self.audit_writer else {}
+    
     async def close(self):
-        """Закрытие пула соединений"""
+        """Сброс журнала действий и закрытие пула соединений"""
+        if self.audit_writer is not None:
+            await self.audit_writer.close()
+        await self.user_cache.close()
+        await self.replica.close()
+        for task in list(self._explain_tasks):
+            task.cancel()
+        if self._keepalive_task is not None:
+            self._keepalive_task.cancel()
         if self.pool:
             self.pool.close()
             await self.pool.wait_closed()
@@ -0,0 +1,82 @@
+"""
+Идентификаторы сделок
+
+В БД deal_id хранится как BINARY(16) в формате UUIDv7: первые 48 бит -
+время создания в миллисекундах, поэтому новые сделки дописываются в конец
+кластерного индекса InnoDB, а не в случайные страницы. Наружу (ссылки,
+callback_data, сообщения, FSM) выдается публичный код - те же 16 байт
+в base62, 22 символа фиксированной длины. Алфавит упорядочен как ASCII,
+поэтому коды сортируются так же, как байты.
+
+Преобразование код <-> байты выполняется только в DatabaseManager.
+"""
+
+import os
+import time
+import uuid
+from typing import Optional
+
+_ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_INDEX = {char: i for i, char in enumerate(_ALPHABET)}
+
+# 62 ** 22 > 2 ** 128
+CODE_LENGTH = 22
+
+
+# Последние выданные миллисекунда и счетчик: в пределах одной миллисекунды
+# идентификаторы процесса возрастают (монотонный UUIDv7, RFC 9562)
+_last_ms = 0
+_last_counter = 0
+
+
+def new_deal_id() -> bytes:
+    """Новый идентификатор: UUIDv7 (время в мс + 74 бита счетчика со случайным началом)"""
+    global _last_ms, _last_counter
+    ms = int(time.time() * 1000)
+    if ms <= _last_ms:
+        ms = _last_ms
+        # Случайный шаг: соседние коды одной миллисекунды не угадываются перебором
+        counter = _last_counter + 1 + int.from_bytes(os.urandom(4), "big")
+    else:
+        # Старший бит счетчика свободен, чтобы в пределах миллисекунды было куда расти
+        counter = int.from_bytes(os.urandom(10), "big") >> 7
+    _last_ms, _last_counter = ms, counter
+
+    rand_a, rand_b = counter >> 62, counter & ((1 << 62) - 1)
+    value = ms << 80 | 0x7 << 76 | rand_a << 64 | 0x2 << 62 | rand_b
+    return value.to_bytes(16, "big")
+
+
+def encode_deal_code(deal_id: bytes) -> str:
+    """Публичный код сделки (22 символа base62) из 16 байт"""
+    value = int.from_bytes(deal_id, "big")
+    chars = []
+    for _ in range(CODE_LENGTH):
+        value, remainder = divmod(value, 62)
+        chars.append(_ALPHABET[remainder])
+    return "".join(reversed(chars))
+
+
+def decode_deal_code(code: str) -> Optional[bytes]:
+    """16 байт идентификатора из публичного кода (None, если код некорректен)
+
+    Принимает и UUID в текстовом виде - ссылки и кнопки, выданные до
+    перехода на коды, продолжают работать после миграции.
+    """
+    if len(code) == CODE_LENGTH:
+        value = 0
+        for char in code:
+            digit = _INDEX.get(char)
+            if digit is None:
+                return None
+            value = value * 62 + digit
+        return value.to_bytes(16, "big") if value < 1 << 128 else None
+    try:
+        return uuid.UUID(code).bytes
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def new_deal_code() -> str:
+    """Публичный код новой сделки"""
+    return encode_deal_code(new_deal_id())
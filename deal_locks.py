@@ -0,0 +1,104 @@
+import logging
+from typing import Optional, Dict, Any, Set, Tuple, Iterable
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('active', 'joined', 'paid')
+
+
+class ActiveDealLocks:
+    """Состояние блокировки панели пользователей, поддерживаемое в памяти
+
+    Хранит участников всех незавершенных сделок и обновляется при каждом
+    изменении статуса сделки, поэтому проверка блокировки не обращается к БД.
+
+    Состояние у каждого процесса свое: в режиме webhook изменения, сделанные
+    другим воркером (например, отмена сделки создателем из другой партиции),
+    видны здесь только после сверки с БД. Верхняя граница устаревания между
+    воркерами - WEBHOOK_SETTINGS['lock_resync_interval'] (30 с).
+    """
+
+    def __init__(self):
+        self.loaded = False
+        # deal_id -> (creator_id, buyer_id)
+        self._deals: Dict[str, Tuple[int, Optional[int]]] = {}
+        # user_id -> незавершенные сделки пользователя
+        self._users: Dict[int, Set[str]] = {}
+
+        # Счетчики для метрик
+        self.lookups = 0
+        self.mismatches = 0
+
+    def load(self, rows: Iterable[Tuple[str, int, Optional[int]]]):
+        """Заполнение состояния из строк (deal_id, creator_id, buyer_id)"""
+        self._deals.clear()
+        self._users.clear()
+        for deal_id, creator_id, buyer_id in rows:
+            self.add_deal(deal_id, creator_id, buyer_id)
+        self.loaded = True
+
+    def add_deal(self, deal_id: str, creator_id: int, buyer_id: Optional[int] = None):
+        """Сделка стала незавершенной (создана)"""
+        self._deals[deal_id] = (creator_id, buyer_id)
+        for user_id in (creator_id, buyer_id):
+            if user_id:
+                self._users.setdefault(user_id, set()).add(deal_id)
+
+    def set_buyer(self, deal_id: str, buyer_id: int, creator_id: Optional[int] = None):
+        """К незавершенной сделке присоединился покупатель
+
+        Сделка могла быть создана в другом воркере и здесь неизвестна -
+        тогда она добавляется по creator_id из снимка сделки.
+        """
+        known_creator, _ = self._deals.get(deal_id, (None, None))
+        creator_id = known_creator or creator_id
+        if creator_id is None:
+            return
+        self.add_deal(deal_id, creator_id, buyer_id)
+
+    def participants(self, deal_id: str) -> Tuple[int, ...]:
+        """Создатель и покупатель незавершенной сделки (пусто, если сделка неизвестна)"""
+        return tuple(user_id for user_id in self._deals.get(deal_id, ()) if user_id)
+
+    def release_deal(self, deal_id: str):
+        """Сделка завершена или отменена"""
+        creator_id, buyer_id = self._deals.pop(deal_id, (None, None))
+        for user_id in (creator_id, buyer_id):
+            deals = self._users.get(user_id)
+            if deals is not None:
+                deals.discard(deal_id)
+                if not deals:
+                    del self._users[user_id]
+
+    def release_user(self, user_id: int):
+        """Все незавершенные сделки пользователя отменены"""
+        for deal_id in list(self._users.get(user_id, ())):
+            self.release_deal(deal_id)
+
+    def is_locked(self, user_id: int) -> Optional[bool]:
+        """Участвует ли пользователь в незавершенной сделке (None - состояние не загружено)"""
+        if not self.loaded:
+            return None
+        self.lookups += 1
+        return user_id in self._users
+
+    def diff(self, rows: Iterable[Tuple[str, int, Optional[int]]]) -> Dict[str, Any]:
+        """Сравнение состояния с актуальными строками из БД"""
+        actual = {deal_id: (creator_id, buyer_id) for deal_id, creator_id, buyer_id in rows}
+        missing = sorted(set(actual) - set(self._deals))
+        stale = sorted(set(self._deals) - set(actual))
+        changed = sorted(
+            deal_id for deal_id in set(actual) & set(self._deals)
+            if actual[deal_id] != self._deals[deal_id]
+        )
+        return {'missing': missing, 'stale': stale, 'changed': changed}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики для метрик"""
+        return {
+            'loaded': self.loaded,
+            'active_deals': len(self._deals),
+            'locked_users': len(self._users),
+            'lookups': self.lookups,
+            'mismatches': self.mismatches
+        }
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Optional, Dict, Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey, DEFAULT_DESTINY
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import FSM_STORAGE_SETTINGS, REDIS_CONFIG, SECURITY_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+def build_storage_key(key: StorageKey, prefix: str = "fsm") -> str:
+    """Ключ хранилища с hash-тегом {chat:user} для шардирования в Redis Cluster"""
+    parts = [prefix, f"{{{key.chat_id}:{key.user_id}}}", str(key.bot_id)]
+    if key.thread_id:
+        parts.append(str(key.thread_id))
+    if key.destiny != DEFAULT_DESTINY:
+        parts.append(key.destiny)
+    return ":".join(parts)
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+class RedisFSMStorage(BaseStorage):
+    """FSM-хранилище в Redis: состояние и данные в одном hash, TTL на ключ
+
+    Срок сессии скользящий: любое чтение или запись продлевает его на ttl.
+    Каждая запись выполняется одним pipeline (HSET/HDEL + EXPIRE), чтение
+    продлевает TTL в том же pipeline. update_data, как и в MySQLFSMStorage,
+    атомарен: чтение и запись данных выполняются под WATCH/MULTI и
+    повторяются, если ключ изменили параллельно.
+    """
+
+    def __init__(self, redis_config: Dict[str, Any], ttl: int, prefix: str = "fsm"):
+        import redis.asyncio as aioredis
+
+        self.redis = aioredis.Redis(
+            host=redis_config['host'],
+            port=redis_config['port'],
+            db=redis_config['db'],
+            password=redis_config.get('password') or None
+        )
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self._write(key, 'state', _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        value = await self._read(key, 'state')
+        return value.decode() if value is not None else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        await self._write(key, 'data', json.dumps(data, default=str) if data else None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        value = await self._read(key, 'data')
+        return json.loads(value) if value else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        from redis.exceptions import WatchError
+
+        redis_key = build_storage_key(key, self.prefix)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(redis_key)
+                    value = await pipe.hget(redis_key, 'data')
+                    current_data = json.loads(value) if value else {}
+                    current_data.update(data)
+
+                    pipe.multi()
+                    if current_data:
+                        pipe.hset(redis_key, 'data', json.dumps(current_data, default=str))
+                    else:
+                        pipe.hdel(redis_key, 'data')
+                    pipe.expire(redis_key, self.ttl)
+                    await pipe.execute()
+                    return current_data.copy()
+                except WatchError:
+                    # Ключ изменили между чтением и записью - повторяем с новыми данными
+                    continue
+
+    async def close(self) -> None:
+        await self.redis.close()
+
+    async def _read(self, key: StorageKey, field: str) -> Optional[bytes]:
+        redis_key = build_storage_key(key, self.prefix)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.hget(redis_key, field)
+            pipe.expire(redis_key, self.ttl)
+            value, _ = await pipe.execute()
+        return value
+
+    async def _write(self, key: StorageKey, field: str, value: Optional[str]):
+        redis_key = build_storage_key(key, self.prefix)
+        async with self.redis.pipeline(transaction=False) as pipe:
+            if value is None:
+                pipe.hdel(redis_key, field)
+            else:
+                pipe.hset(redis_key, field, value)
+            pipe.expire(redis_key, self.ttl)
+            await pipe.execute()
+
+
+class MySQLFSMStorage(BaseStorage):
+    """FSM-хранилище в таблице fsm_storage с истечением по expires_at
+
+    Срок сессии скользящий, как в RedisFSMStorage: запись продлевает
+    expires_at на ttl, чтение - не чаще раза в touch_interval секунд
+    (обычное чтение - один SELECT, срок известен с точностью до
+    touch_interval). Каждая запись - один upsert; update_data выполняется
+    в транзакции с блокировкой строки, поэтому параллельные обновления
+    одного ключа не теряют друг друга. Просроченные строки удаляются
+    фоновой задачей.
+    """
+
+    def __init__(self, db, ttl: int, prefix: str = "fsm", purge_interval: int = 300,
+                 touch_interval: int = 60):
+        self.db = db
+        self.ttl = ttl
+        self.prefix = prefix
+        self.touch_interval = touch_interval
+        self.purge_interval = purge_interval
+        self._last_purge = time.monotonic()
+        self._purge_task: Optional[asyncio.Task] = None
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        async with self.db.query('fsm_set_state') as cursor:
+            await self._upsert(cursor, key, 'state', _state_name(state))
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._select(key)
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        async with self.db.query('fsm_set_data') as cursor:
+            await self._upsert(cursor, key, 'data', json.dumps(data, default=str) if data else None)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._select(key)
+        return json.loads(row[1]) if row and row[1] else {}
+
+    async def update_data(self, key: StorageKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        storage_key = build_storage_key(key, self.prefix)
+        async with self.db.transaction('fsm_update_data') as cursor:
+            # Строка создается или продлевается и остается заблокированной до COMMIT:
+            # параллельные update_data того же ключа выполняются по очереди
+            await cursor.execute(
+                """INSERT INTO fsm_storage (storage_key, expires_at)
+                   VALUES (%s, NOW() + INTERVAL %s SECOND)
+                   ON DUPLICATE KEY UPDATE
+                       state = IF(expires_at > NOW(), state, NULL),
+                       data = IF(expires_at > NOW(), data, NULL),
+                       expires_at = VALUES(expires_at)""",
+                (storage_key, self.ttl)
+            )
+            await cursor.execute("SELECT data FROM fsm_storage WHERE storage_key = %s FOR UPDATE", (storage_key,))
+            row = await cursor.fetchone()
+            current_data = json.loads(row[0]) if row and row[0] else {}
+            current_data.update(data)
+            await cursor.execute(
+                "UPDATE fsm_storage SET data = %s WHERE storage_key = %s",
+                (json.dumps(current_data, default=str), storage_key)
+            )
+        self._schedule_purge()
+        return current_data.copy()
+
+    async def purge_expired(self, batch_size: int = 1000) -> int:
+        """Удаление просроченных записей (по индексу idx_expires_at)"""
+        deleted = 0
+        while True:
+            async with self.db.query('fsm_purge_expired') as cursor:
+                await cursor.execute(
+                    "DELETE FROM fsm_storage WHERE expires_at < NOW() LIMIT %s",
+                    (batch_size,)
+                )
+                deleted += cursor.rowcount
+                if cursor.rowcount < batch_size:
+                    return deleted
+
+    async def close(self) -> None:
+        if self._purge_task is not None:
+            await self._purge_task
+
+    async def _select(self, key: StorageKey):
+        """Состояние и данные живой сессии с продлением ее срока
+        
+        Срок продлевается, только если с прошлого продления прошло больше
+        touch_interval: get_state и get_data одного обновления дают два SELECT
+        и не больше одного UPDATE.
+        """
+        storage_key = build_storage_key(key, self.prefix)
+        async with self.db.query('fsm_get') as cursor:
+            await cursor.execute(
+                """SELECT state, data, expires_at < NOW() + INTERVAL %s SECOND
+                   FROM fsm_storage WHERE storage_key = %s AND expires_at > NOW()""",
+                (self.ttl - self.touch_interval, storage_key)
+            )
+            row = await cursor.fetchone()
+            if row and row[2]:
+                await cursor.execute(
+                    """UPDATE fsm_storage SET expires_at = NOW() + INTERVAL %s SECOND
+                       WHERE storage_key = %s AND expires_at > NOW()""",
+                    (self.ttl, storage_key), name='fsm_touch'
+                )
+            return row
+
+    async def _upsert(self, cursor, key: StorageKey, column: str, value: Optional[str]):
+        # Просроченная строка при записи сбрасывается целиком
+        other = 'data' if column == 'state' else 'state'
+        await cursor.execute(
+            f"""INSERT INTO fsm_storage (storage_key, {column}, expires_at)
+                VALUES (%s, %s, NOW() + INTERVAL %s SECOND)
+                ON DUPLICATE KEY UPDATE
+                    {other} = IF(expires_at > NOW(), {other}, NULL),
+                    {column} = VALUES({column}),
+                    expires_at = VALUES(expires_at)""",
+            (build_storage_key(key, self.prefix), value, self.ttl)
+        )
+        self._schedule_purge()
+
+    def _schedule_purge(self):
+        now = time.monotonic()
+        if now - self._last_purge < self.purge_interval:
+            return
+        if self._purge_task is not None and not self._purge_task.done():
+            return
+
+        self._last_purge = now
+        self._purge_task = asyncio.create_task(self._purge_quietly())
+
+    async def _purge_quietly(self):
+        try:
+            deleted = await self.purge_expired()
+            if deleted:
+                logger.info(f"🧹 Удалено просроченных FSM-сессий: {deleted}")
+        except Exception as e:
+            logger.error(f"Ошибка очистки FSM-сессий: {e}")
+
+
+def create_fsm_storage(db) -> BaseStorage:
+    """Создание FSM-хранилища согласно FSM_STORAGE_SETTINGS['backend']"""
+    backend = FSM_STORAGE_SETTINGS['backend']
+    ttl = SECURITY_SETTINGS['session_timeout']
+
+    if backend == 'redis':
+        return RedisFSMStorage(REDIS_CONFIG, ttl=ttl, prefix=FSM_STORAGE_SETTINGS['key_prefix'])
+    if backend == 'mysql':
+        return MySQLFSMStorage(db, ttl=ttl, prefix=FSM_STORAGE_SETTINGS['key_prefix'],
+                               touch_interval=FSM_STORAGE_SETTINGS['touch_interval'])
+    if backend != 'memory':
+        raise ValueError(f"❌ Неизвестное FSM-хранилище: {backend}")
+    return MemoryStorage()
@@ -0,0 +1,67 @@
+"""
+Реестр inline-клавиатур
+
+Статические клавиатуры строятся один раз при импорте и разделяются всеми
+обработчиками (модели aiogram неизменяемы, поэтому общий объект безопасен).
+Динамические клавиатуры собираются шаблонами через model_construct - без
+InlineKeyboardBuilder и повторной валидации pydantic.
+"""
+
+from typing import List, Sequence, Tuple
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+ButtonSpec = Tuple[str, str]
+
+
+def _button(text: str, callback_data: str) -> InlineKeyboardButton:
+    return InlineKeyboardButton.model_construct(text=text, callback_data=callback_data)
+
+
+def _markup(rows: Sequence[Sequence[InlineKeyboardButton]]) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup.model_construct(inline_keyboard=[list(row) for row in rows])
+
+
+def _static(*rows: Sequence[ButtonSpec]) -> InlineKeyboardMarkup:
+    """Статическая клавиатура (строится с полной валидацией, один раз)"""
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data=data) for text, data in row]
+        for row in rows
+    ])
+
+
+# Главное меню с 4 командами
+MAIN_MENU = _static(
+    [("💼 Создать сделку", "create_deal"), ("👤 Профиль", "profile")],
+    [("📋 Мои сделки", "my_deals"), ("🆘 Поддержка", "support")],
+)
+
+# Главное меню администратора
+ADMIN_MENU = _static(
+    [("📊 Статистика", "admin_stats"), ("👥 Пользователи", "admin_users")],
+    [("💼 Активные сделки", "admin_active_deals"), ("📋 Все сделки", "admin_all_deals")],
+    [("💰 Завершить сделку", "admin_complete_deal"), ("❌ Отменить сделку", "admin_cancel_deal")],
+    [("📨 Рассылка", "admin_broadcast"), ("🔒 Заблокировать пользователя", "admin_block_user")],
+)
+
+# Кнопки "⬅️ Назад" в меню пользователя и администратора
+BACK_TO_MENU = _static([("⬅️ Назад", "back_to_menu")])
+ADMIN_BACK = _static([("⬅️ Назад", "admin_back")])
+
+
+def deal_cancel_keyboard(deal_id: str) -> InlineKeyboardMarkup:
+    """Клавиатура с кнопкой отмены сделки"""
+    return _markup([[_button("❌ Отменить сделку", f"cancel_deal_{deal_id}")]])
+
+
+def captcha_keyboard(buttons: Sequence[ButtonSpec], row_width: int = 3) -> InlineKeyboardMarkup:
+    """Клавиатура капчи: варианты (текст, callback_data) рядами по row_width"""
+    row = [_button(text, data) for text, data in buttons]
+    return _markup([row[i:i + row_width] for i in range(0, len(row), row_width)])
+
+
+def with_navigation(navigation: List[InlineKeyboardButton], base: InlineKeyboardMarkup) -> InlineKeyboardMarkup:
+    """Статическая клавиатура с рядом кнопок перехода по страницам над ней"""
+    if not navigation:
+        return base
+    return _markup([navigation, *base.inline_keyboard])
@@ -0,0 +1,362 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Optional, Dict, List, Any, Set, Tuple, Sequence
+
+from storage_backend import StorageBackend, ACTIVE_STATUSES, DealKey, Notification, keyset_page
+
+logger = logging.getLogger(__name__)
+
+_CENT = Decimal('0.01')
+
+
+def _money(amount) -> Decimal:
+    """Сумма как DECIMAL(15,2) в MySQL"""
+    return Decimal(str(amount)).quantize(_CENT)
+
+
+def _now() -> datetime:
+    """Время с точностью до секунды, как TIMESTAMP в MySQL"""
+    return datetime.now().replace(microsecond=0)
+
+
+class MemoryStorageBackend(StorageBackend):
+    """Хранилище в памяти процесса для тестов и замеров обработчиков
+
+    Сделки индексированы словарями по создателю, покупателю и статусу,
+    поэтому операции стоят O(1) или O(сделок пользователя) и не искажают
+    замер CPU-стоимости обработчиков. Переходы статусов и возвращаемые
+    значения те же, что у DatabaseManager. Методы не уступают управление
+    event loop посередине изменения, поэтому compare-and-set в join_deal
+    атомарен без блокировок. Данные не переживают перезапуск.
+    """
+
+    def __init__(self):
+        self.users: Dict[int, Dict[str, Any]] = {}
+        self.deals: Dict[str, Dict[str, Any]] = {}
+        self.transactions: List[Dict[str, Any]] = []
+        self.action_logs: List[Dict[str, Any]] = []
+        self.broadcasts: Dict[str, Dict[str, Any]] = {}
+        # notification_id -> строка outbox (словарь сохраняет порядок вставки)
+        self.outbox: Dict[int, Dict[str, Any]] = {}
+        self._next_notification_id = 1
+        # (дата, crypto_type) -> строка дневной сводки
+        self.daily_stats: Dict[Tuple[date, str], Dict[str, Any]] = {}
+        self.total_volume = Decimal('0.00')
+
+        # Индексы: пользователь / статус -> коды сделок
+        self._by_creator: Dict[int, Set[str]] = defaultdict(set)
+        self._by_buyer: Dict[int, Set[str]] = defaultdict(set)
+        self._by_status: Dict[str, Set[str]] = defaultdict(set)
+
+    async def initialize(self):
+        logger.info("✅ Хранилище в памяти инициализировано")
+
+    async def close(self):
+        pass
+
+    def _set_status(self, deal: Dict[str, Any], status: str):
+        self._by_status[deal['status']].discard(deal['deal_id'])
+        self._by_status[status].add(deal['deal_id'])
+        deal['status'] = status
+        deal['updated_at'] = _now()
+
+    def _bump_daily_stats(self, crypto_type: str = 'ALL', **increments):
+        key = (date.today(), crypto_type)
+        row = self.daily_stats.get(key)
+        if row is None:
+            row = self.daily_stats[key] = {
+                'stat_date': key[0], 'crypto_type': crypto_type, 'new_users': 0,
+                'new_deals': 0, 'completed_deals': 0, 'volume': Decimal('0.00')
+            }
+        for column, value in increments.items():
+            row[column] += value
+
+    def _enqueue_notifications(self, deal_id: str, notifications: Sequence[Notification]):
+        for chat_id, text in notifications:
+            notification_id = self._next_notification_id
+            self._next_notification_id += 1
+            self.outbox[notification_id] = {
+                'notification_id': notification_id, 'chat_id': chat_id, 'deal_id': deal_id, 'text': text,
+                'status': 'pending', 'attempts': 0, 'next_attempt_at': None, 'last_error': None,
+                'created_at': _now()
+            }
+        if notifications:
+            self._outbox_written()
+
+    def _user_deal_ids(self, user_id: int) -> Set[str]:
+        return self._by_creator.get(user_id, set()) | self._by_buyer.get(user_id, set())
+
+    # Пользователи
+
+    async def register_user(self, user_id: int, username: str, first_name: str) -> bool:
+        if user_id not in self.users:
+            self.users[user_id] = {
+                'user_id': user_id, 'username': username, 'first_name': first_name,
+                'registration_date': _now(), 'is_active': True,
+                'completed_deals': 0, 'total_volume': Decimal('0.00')
+            }
+            self._bump_daily_stats(new_users=1)
+        await self.log_action(user_id, None, "user_registration", f"Username: {username}")
+        return True
+
+    async def is_user_registered(self, user_id: int) -> bool:
+        return user_id in self.users
+
+    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        user = self.users.get(user_id)
+        if not user:
+            return {'completed_deals': 0, 'total_volume': 0.0, 'registration_date': 'N/A'}
+        return {
+            'completed_deals': user['completed_deals'],
+            'total_volume': float(user['total_volume']),
+            'registration_date': user['registration_date'].strftime('%d.%m.%Y')
+        }
+
+    async def block_user(self, user_id: int, admin_id: Optional[int] = None) -> bool:
+        user = self.users.get(user_id)
+        if user:
+            user['is_active'] = False
+        for deal_id in self._user_deal_ids(user_id):
+            deal = self.deals[deal_id]
+            if deal['status'] in ACTIVE_STATUSES:
+                self._set_status(deal, 'cancelled')
+        await self.log_action(admin_id, None, "admin_block_user", f"User {user_id} blocked by admin")
+        return True
+
+    # Сделки
+
+    async def create_deal(self, deal_id: str, creator_id: int, amount: float, condition: str, password: str) -> bool:
+        if deal_id in self.deals or creator_id not in self.users:
+            logger.error(f"Ошибка создания сделки {deal_id}: дубликат или неизвестный создатель")
+            return False
+        now = _now()
+        self.deals[deal_id] = {
+            'deal_id': deal_id, 'creator_id': creator_id, 'buyer_id': None,
+            'amount': _money(amount), 'condition': condition, 'password': password,
+            'status': 'active', 'created_at': now, 'updated_at': now
+        }
+        self._by_creator[creator_id].add(deal_id)
+        self._by_status['active'].add(deal_id)
+        self._bump_daily_stats(new_deals=1)
+        await self.log_action(creator_id, deal_id, "deal_created", f"Amount: {amount} USDT")
+        return True
+
+    async def get_deal(self, deal_id: str) -> Optional[Dict[str, Any]]:
+        deal = self.deals.get(deal_id)
+        return dict(deal) if deal else None
+
+    async def join_deal(self, deal_id: str, buyer_id: int, password: str = None,
+                        deal: Optional[Dict[str, Any]] = None,
+                        notifications: Sequence[Notification] = ()) -> Optional[Dict[str, Any]]:
+        row = self.deals.get(deal_id)
+        if (row is None or row['status'] != 'active' or row['buyer_id'] is not None
+                or row['creator_id'] == buyer_id or buyer_id not in self.users):
+            return None
+        if password is not None and row['password'] != password:
+            return None
+
+        row['buyer_id'] = buyer_id
+        self._by_buyer[buyer_id].add(deal_id)
+        self._set_status(row, 'joined')
+        self._enqueue_notifications(deal_id, notifications)
+        await self.log_action(buyer_id, deal_id, "deal_joined", "Buyer joined the deal")
+
+        joined = dict(deal or {})
+        joined.update(deal_id=deal_id, buyer_id=buyer_id, status='joined')
+        return joined
+
+    async def cancel_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        deal = self.deals.get(deal_id)
+        cancelled = deal is not None and deal['status'] in ACTIVE_STATUSES
+        if cancelled:
+            self._set_status(deal, 'cancelled')
+            self._enqueue_notifications(deal_id, notifications)
+            await self.log_action(None, deal_id, "deal_cancelled", "Deal cancelled by creator")
+        return cancelled
+
+    async def complete_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        deal = self.deals.get(deal_id)
+        if deal is None or deal['status'] not in ACTIVE_STATUSES:
+            return False
+
+        self._set_status(deal, 'completed')
+        for user_id in (deal['creator_id'], deal['buyer_id']):
+            user = self.users.get(user_id)
+            if user:
+                user['completed_deals'] += 1
+                user['total_volume'] += deal['amount']
+        self.total_volume += deal['amount']
+        self._bump_daily_stats(completed_deals=1, volume=deal['amount'])
+        self._enqueue_notifications(deal_id, notifications)
+        await self.log_action(None, deal_id, "deal_completed", f"Amount: {deal['amount']}")
+        return True
+
+    async def get_active_deal_by_creator(self, creator_id: int) -> Optional[Dict[str, Any]]:
+        for deal_id in self._by_creator.get(creator_id, ()):
+            deal = self.deals[deal_id]
+            if deal['status'] in ACTIVE_STATUSES:
+                return dict(deal)
+        return None
+
+    async def is_user_in_active_deal(self, user_id: int) -> bool:
+        return any(self.deals[deal_id]['status'] in ACTIVE_STATUSES for deal_id in self._user_deal_ids(user_id))
+
+    def _page(self, deal_ids, limit: int, after: Optional[DealKey], before: Optional[DealKey]) -> List[Dict[str, Any]]:
+        """limit + 1 сделок по ключу (created_at, deal_id) в порядке чтения, как в keyset-запросах MySQL"""
+        descending = before is None
+        key = after if descending else before
+        rows = sorted((self.deals[deal_id] for deal_id in deal_ids),
+                      key=lambda deal: (deal['created_at'], deal['deal_id']), reverse=descending)
+        if key is not None:
+            rows = [deal for deal in rows
+                    if ((deal['created_at'], deal['deal_id']) < key if descending
+                        else (deal['created_at'], deal['deal_id']) > key)]
+        return rows[:limit + 1]
+
+    def _behind(self, deal_ids, after: Optional[DealKey], before: Optional[DealKey]) -> bool:
+        """Есть ли сделки по другую сторону курсора, включая сам ключ"""
+        if before is not None:
+            return any((self.deals[deal_id]['created_at'], deal_id) <= before for deal_id in deal_ids)
+        if after is not None:
+            return any((self.deals[deal_id]['created_at'], deal_id) >= after for deal_id in deal_ids)
+        return False
+
+    async def get_user_deals(self, user_id: int, limit: int = 10,
+                             after: Optional[DealKey] = None,
+                             before: Optional[DealKey] = None) -> Optional[Dict[str, Any]]:
+        deal_ids = self._user_deal_ids(user_id)
+        rows = [
+            {column: deal[column] for column in ('deal_id', 'amount', 'status', 'created_at')}
+            for deal in self._page(deal_ids, limit, after, before)
+        ]
+        return keyset_page(rows, limit, after, before, self._behind(deal_ids, after, before))
+
+    async def get_active_deals(self, limit: int = 10,
+                               after: Optional[DealKey] = None,
+                               before: Optional[DealKey] = None) -> Optional[Dict[str, Any]]:
+        deal_ids = set().union(*(self._by_status.get(status, ()) for status in ACTIVE_STATUSES))
+        rows = []
+        for deal in self._page(deal_ids, limit, after, before):
+            creator, buyer = self.users.get(deal['creator_id']), self.users.get(deal['buyer_id'])
+            rows.append({
+                **{column: deal[column] for column in ('deal_id', 'creator_id', 'buyer_id', 'amount',
+                                                       'status', 'created_at')},
+                'creator_username': creator['username'] if creator else None,
+                'buyer_username': buyer['username'] if buyer else None
+            })
+        return keyset_page(rows, limit, after, before, self._behind(deal_ids, after, before))
+
+    async def add_transaction(self, deal_id: str, user_id: int, transaction_type: str,
+                              amount: float, crypto_type: str, tx_hash: str = None) -> bool:
+        if deal_id not in self.deals:
+            logger.error(f"Ошибка добавления транзакции: сделка {deal_id} не найдена")
+            return False
+        self.transactions.append({
+            'transaction_id': len(self.transactions) + 1, 'deal_id': deal_id, 'user_id': user_id,
+            'transaction_type': transaction_type, 'amount': _money(amount), 'crypto_type': crypto_type,
+            'tx_hash': tx_hash, 'status': 'pending', 'created_at': _now()
+        })
+        if transaction_type == 'payment':
+            self._bump_daily_stats(crypto_type, volume=_money(amount))
+        await self.log_action(user_id, deal_id, f"transaction_{transaction_type}",
+                              f"Amount: {amount}, Type: {crypto_type}")
+        return True
+
+    # Статистика и журнал
+
+    async def get_admin_stats(self) -> Dict[str, Any]:
+        return {
+            'total_users': len(self.users),
+            'active_deals': sum(len(self._by_status.get(status, ())) for status in ACTIVE_STATUSES),
+            'completed_deals': len(self._by_status.get('completed', ())),
+            'total_volume': float(self.total_volume)
+        }
+
+    async def get_daily_stats(self, days: int = 1) -> List[Dict[str, Any]]:
+        since = date.today() - timedelta(days=days)
+        return [dict(row) for key, row in sorted(self.daily_stats.items()) if key[0] > since]
+
+    async def log_action(self, user_id: Optional[int], deal_id: Optional[str], action: str, details: str = None):
+        self.action_logs.append({
+            'log_id': len(self.action_logs) + 1, 'user_id': user_id, 'deal_id': deal_id,
+            'action': action, 'details': details, 'created_at': _now()
+        })
+
+    async def get_action_logs(self, since: datetime, until: Optional[datetime] = None,
+                              user_id: Optional[int] = None, deal_id: Optional[str] = None,
+                              limit: int = 50) -> List[Dict[str, Any]]:
+        until = until or datetime.now()
+        rows = [
+            dict(row) for row in reversed(self.action_logs)
+            if since <= row['created_at'] < until
+            and (user_id is None or row['user_id'] == user_id)
+            and (deal_id is None or row['deal_id'] == deal_id)
+        ]
+        return rows[:limit]
+
+    # Рассылки
+
+    async def get_active_user_ids_page(self, after_user_id: int, limit: int) -> List[int]:
+        return sorted(user_id for user_id, user in self.users.items()
+                      if user_id > after_user_id and user['is_active'])[:limit]
+
+    async def deactivate_users(self, user_ids: List[int]) -> bool:
+        for user_id in user_ids:
+            if user_id in self.users:
+                self.users[user_id]['is_active'] = False
+        return True
+
+    async def create_broadcast(self, broadcast_id: str, message_text: str) -> bool:
+        if broadcast_id in self.broadcasts:
+            logger.error(f"Ошибка создания рассылки: {broadcast_id} уже существует")
+            return False
+        now = _now()
+        self.broadcasts[broadcast_id] = {
+            'broadcast_id': broadcast_id, 'message_text': message_text, 'status': 'running',
+            'last_user_id': 0, 'sent': 0, 'failed': 0, 'blocked': 0, 'created_at': now, 'updated_at': now
+        }
+        return True
+
+    async def get_broadcast(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
+        broadcast = self.broadcasts.get(broadcast_id)
+        return dict(broadcast) if broadcast else None
+
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        return sorted((dict(broadcast) for broadcast in self.broadcasts.values() if broadcast['status'] == 'running'),
+                      key=lambda broadcast: broadcast['created_at'])
+
+    async def save_broadcast_checkpoint(self, broadcast_id: str, last_user_id: int,
+                                        sent: int, failed: int, blocked: int) -> bool:
+        broadcast = self.broadcasts.get(broadcast_id)
+        if broadcast:
+            broadcast.update(last_user_id=last_user_id, sent=sent, failed=failed, blocked=blocked, updated_at=_now())
+        return True
+
+    async def finish_broadcast(self, broadcast_id: str) -> bool:
+        broadcast = self.broadcasts.get(broadcast_id)
+        if broadcast:
+            broadcast.update(status='completed', updated_at=_now())
+        return True
+
+    async def get_pending_notifications(self, limit: int) -> List[Dict[str, Any]]:
+        pending = (row for row in self.outbox.values() if row['status'] == 'pending')
+        return [dict(row) for row, _ in zip(pending, range(limit))]
+
+    async def delete_notification(self, notification_id: int) -> bool:
+        self.outbox.pop(notification_id, None)
+        return True
+
+    async def reschedule_notification(self, notification_id: int, attempts: int,
+                                      next_attempt_at: datetime, error: str) -> bool:
+        row = self.outbox.get(notification_id)
+        if row:
+            row.update(attempts=attempts, next_attempt_at=next_attempt_at, last_error=error[:255])
+        return True
+
+    async def fail_notification(self, notification_id: int, attempts: int, error: str) -> bool:
+        row = self.outbox.get(notification_id)
+        if row:
+            row.update(status='failed', attempts=attempts, last_error=error[:255])
+        return True
@@ -0,0 +1,68 @@
+import logging
+from typing import Optional, List
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+
+class MetricsServer:
+    """HTTP-эндпоинт /metrics в текстовом формате Prometheus
+
+    Отдает метрики запросов хранилища и числовые счетчики кешей
+    процесса. Метрики живут в памяти процесса, поэтому в webhook-режиме
+    свой эндпоинт поднимает каждый воркер.
+    """
+
+    def __init__(self, db, host: str, port: int):
+        self.db = db
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        app.router.add_get('/metrics.json', self._handle_metrics_json)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"📈 Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def render(self) -> str:
+        lines = self.db.render_query_metrics()
+        for group, stats in (('db_pool', self.db.get_pool_stats()),
+                             ('user_cache', self.db.get_cache_stats()),
+                             ('deal_locks', self.db.get_deal_lock_stats()),
+                             ('audit_log', self.db.get_audit_stats()),
+                             ('db_replica', self.db.get_replica_stats())):
+            lines.extend(_render_gauges(f"escrow_{group}", stats))
+        return "\n".join(lines) + "\n"
+
+    async def _handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.render(), content_type='text/plain', charset='utf-8')
+
+    async def _handle_metrics_json(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            'queries': self.db.get_query_stats(),
+            'pool': self.db.get_pool_stats(),
+            'user_cache': self.db.get_cache_stats(),
+            'deal_locks': self.db.get_deal_lock_stats(),
+            'audit_log': self.db.get_audit_stats(),
+            'replica': self.db.get_replica_stats()
+        })
+
+
+def _render_gauges(prefix: str, stats: dict) -> List[str]:
+    lines = []
+    for key, value in sorted((stats or {}).items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"# TYPE {prefix}_{key} gauge")
+            lines.append(f"{prefix}_{key} {value}")
+    return lines
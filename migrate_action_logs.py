@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Перевод action_logs на помесячные секции без остановки бота
+
+1. Создается секционированная таблица action_logs_new (BIGINT-ключ,
+   секции с первого месяца периода хранения).
+2. Таблицы атомарно меняются местами (RENAME TABLE): бот сразу пишет
+   в новую таблицу, старая остается как action_logs_old.
+3. Записи в пределах периода хранения переносятся из action_logs_old
+   пакетами по log_id, чтобы не держать длинных блокировок.
+
+Повторный запуск продолжает перенос (INSERT IGNORE по тем же log_id).
+"""
+
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from action_log_partitions import action_logs_ddl, oldest_retained_month
+from database_manager import DatabaseManager
+
+
+async def _table_exists(db: DatabaseManager, table: str) -> bool:
+    async with db.query('migrate_table_exists') as cursor:
+        await cursor.execute(
+            "SELECT 1 FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s",
+            (table,)
+        )
+        return await cursor.fetchone() is not None
+
+
+async def create_new_table(db: DatabaseManager) -> int:
+    """Секционированная action_logs_new; возвращает первый log_id, не подлежащий переносу"""
+    async with db.query('migrate_create_new') as cursor:
+        await cursor.execute("SELECT COALESCE(MAX(log_id), 0) + 1 FROM action_logs")
+        next_id, = await cursor.fetchone()
+        await cursor.execute(action_logs_ddl("action_logs_new", first_month=oldest_retained_month()))
+        # Новые записи не должны пересекаться по log_id с переносимыми
+        await cursor.execute(f"ALTER TABLE action_logs_new AUTO_INCREMENT = {int(next_id) + 10000}")
+    return next_id
+
+
+async def swap_tables(db: DatabaseManager):
+    """Создание секционированной таблицы и атомарная подмена старой"""
+    next_id = await create_new_table(db)
+    async with db.query('migrate_swap') as cursor:
+        await cursor.execute("RENAME TABLE action_logs TO action_logs_old, action_logs_new TO action_logs")
+    print(f"🔁 Таблицы переключены, перенос записей с log_id < {next_id}")
+
+
+async def backfill(db: DatabaseManager, batch_size: int, pause: float) -> int:
+    """Перенос записей периода хранения из action_logs_old пакетами
+
+    deal_id в текстовом виде (UUID, до перехода на BINARY(16)) преобразуется.
+    """
+    since = oldest_retained_month()
+    last_id = 0
+    copied = 0
+    while True:
+        async with db.query('migrate_backfill') as cursor:
+            await cursor.execute(
+                "SELECT MAX(log_id) FROM (SELECT log_id FROM action_logs_old WHERE log_id > %s "
+                "ORDER BY log_id LIMIT %s) batch",
+                (last_id, batch_size)
+            )
+            batch_end, = await cursor.fetchone()
+            if batch_end is None:
+                return copied
+            await cursor.execute(
+                """INSERT IGNORE INTO action_logs (log_id, user_id, deal_id, action, details, ip_address, created_at) 
+                   SELECT log_id, user_id, IF(CHAR_LENGTH(deal_id) = 36, UUID_TO_BIN(deal_id), deal_id), 
+                          action, details, ip_address, created_at 
+                   FROM action_logs_old 
+                   WHERE log_id > %s AND log_id <= %s AND created_at >= %s""",
+                (last_id, batch_end, since)
+            )
+            copied += cursor.rowcount
+        last_id = batch_end
+        print(f"  ... log_id до {last_id}, перенесено {copied}")
+        await asyncio.sleep(pause)
+
+
+async def migrate(batch_size: int, pause: float, drop_old: bool) -> bool:
+    db = DatabaseManager()
+    try:
+        await db.connect_pool()
+        if await db.action_log_partitions.list_partitions():
+            print("✅ action_logs уже секционирована")
+        else:
+            await swap_tables(db)
+
+        if await _table_exists(db, "action_logs_old"):
+            copied = await backfill(db, batch_size, pause)
+            print(f"✅ Перенесено записей: {copied}")
+            if drop_old:
+                async with db.query('migrate_drop_old') as cursor:
+                    await cursor.execute("DROP TABLE action_logs_old")
+                print("🗑️ action_logs_old удалена")
+        return True
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        return False
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перевод action_logs на помесячные секции")
+    parser.add_argument('--batch-size', type=int, default=5000, help="записей за один INSERT ... SELECT")
+    parser.add_argument('--pause', type=float, default=0.05, help="пауза между пакетами в секундах")
+    parser.add_argument('--drop-old', action='store_true', help="удалить action_logs_old после переноса")
+    args = parser.parse_args()
+
+    if not asyncio.run(migrate(args.batch_size, args.pause, args.drop_old)):
+        exit(1)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Перевод deal_id с VARCHAR(36) (текстовый UUID) на BINARY(16)
+
+Этап 1 (по умолчанию, бот продолжает работать на прежней версии):
+   создаются deals_new и transactions_new с deal_id BINARY(16) и
+   секционированная action_logs_new; триггеры на deals и transactions
+   зеркалируют изменения в новые таблицы, существующие строки копируются
+   пакетами по первичному ключу (UUID_TO_BIN).
+Этап 2 (--cutover, бот остановлен на время переключения):
+   проверяется полнота копии, добавляется внешний ключ transactions ->
+   deals, и все три таблицы меняются местами одним RENAME TABLE.
+   Старые таблицы остаются как deals_uuid, transactions_uuid и
+   action_logs_old. После этого запускается новая версия бота, а журнал
+   действий дописывается из action_logs_old в фоне.
+
+Старые ссылки и кнопки с UUID продолжают работать: UUID_TO_BIN дает те же
+16 байт, что и uuid.UUID(...).bytes в deal_ids.decode_deal_code.
+Требуется MySQL 8.0+.
+"""
+
+import argparse
+import asyncio
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database_manager import DatabaseManager
+from migrate_action_logs import backfill as backfill_action_logs, create_new_table as create_action_logs_new
+
+# Таблица -> (первичный ключ, колонки). deal_id во всех таблицах преобразуется UUID_TO_BIN
+_TABLES = {
+    'deals': ('deal_id', ['deal_id', 'creator_id', 'buyer_id', 'amount', '`condition`', 'password',
+                          'status', 'created_at', 'updated_at']),
+    'transactions': ('transaction_id', ['transaction_id', 'deal_id', 'user_id', 'transaction_type', 'amount',
+                                        'crypto_type', 'tx_hash', 'status', 'created_at']),
+}
+
+
+def _values(columns, row: str = "") -> str:
+    prefix = f"{row}." if row else ""
+    return ", ".join(
+        f"UUID_TO_BIN({prefix}deal_id)" if column == 'deal_id' else f"{prefix}{column}" for column in columns
+    )
+
+
+def _key_value(table: str, row: str) -> str:
+    key, _ = _TABLES[table]
+    return f"UUID_TO_BIN({row}.deal_id)" if key == 'deal_id' else f"{row}.{key}"
+
+
+async def _column_type(db: DatabaseManager, table: str, column: str):
+    async with db.query('migrate_column_type') as cursor:
+        await cursor.execute(
+            """SELECT data_type FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+            (table, column)
+        )
+        row = await cursor.fetchone()
+        return row[0].lower() if row else None
+
+
+async def prepare(db: DatabaseManager):
+    """Новые таблицы и триггеры, зеркалирующие в них изменения"""
+    async with db.query('migrate_prepare') as cursor:
+        await cursor.execute("CREATE TABLE IF NOT EXISTS deals_new LIKE deals")
+        await cursor.execute("ALTER TABLE deals_new MODIFY deal_id BINARY(16) NOT NULL")
+        await cursor.execute("CREATE TABLE IF NOT EXISTS transactions_new LIKE transactions")
+        await cursor.execute("ALTER TABLE transactions_new MODIFY deal_id BINARY(16) NOT NULL")
+
+        # LIKE не копирует внешние ключи. Ключи на users безопасны во время копирования,
+        # ключ transactions -> deals добавляется при переключении
+        await cursor.execute(
+            """SELECT table_name FROM information_schema.referential_constraints
+               WHERE constraint_schema = DATABASE() AND table_name IN ('deals_new', 'transactions_new')"""
+        )
+        with_keys = {row[0] for row in await cursor.fetchall()}
+        if 'deals_new' not in with_keys:
+            await cursor.execute(
+                """ALTER TABLE deals_new
+                   ADD FOREIGN KEY (creator_id) REFERENCES users(user_id),
+                   ADD FOREIGN KEY (buyer_id) REFERENCES users(user_id)"""
+            )
+        if 'transactions_new' not in with_keys:
+            await cursor.execute("ALTER TABLE transactions_new ADD FOREIGN KEY (user_id) REFERENCES users(user_id)")
+
+        for table, (_, columns) in _TABLES.items():
+            column_list = ", ".join(columns)
+            await cursor.execute(f"DROP TRIGGER IF EXISTS {table}_ids_ins")
+            await cursor.execute(f"DROP TRIGGER IF EXISTS {table}_ids_upd")
+            await cursor.execute(f"DROP TRIGGER IF EXISTS {table}_ids_del")
+            await cursor.execute(
+                f"""CREATE TRIGGER {table}_ids_ins AFTER INSERT ON {table} FOR EACH ROW
+                    REPLACE INTO {table}_new ({column_list}) VALUES ({_values(columns, 'NEW')})"""
+            )
+            await cursor.execute(
+                f"""CREATE TRIGGER {table}_ids_upd AFTER UPDATE ON {table} FOR EACH ROW
+                    REPLACE INTO {table}_new ({column_list}) VALUES ({_values(columns, 'NEW')})"""
+            )
+            await cursor.execute(
+                f"""CREATE TRIGGER {table}_ids_del AFTER DELETE ON {table} FOR EACH ROW
+                    DELETE FROM {table}_new WHERE {_TABLES[table][0]} = {_key_value(table, 'OLD')}"""
+            )
+    print("🔧 Созданы deals_new, transactions_new и триггеры")
+
+
+async def copy_table(db: DatabaseManager, table: str, batch_size: int, pause: float) -> int:
+    """Копирование существующих строк пакетами по первичному ключу
+
+    INSERT IGNORE не перезаписывает строки, которые триггер уже занес в
+    новую таблицу более свежими.
+    """
+    key, columns = _TABLES[table]
+    last_key = "" if key == 'deal_id' else 0
+    copied = 0
+    while True:
+        async with db.query('migrate_copy') as cursor:
+            await cursor.execute(
+                f"SELECT MAX({key}) FROM (SELECT {key} FROM {table} WHERE {key} > %s "
+                f"ORDER BY {key} LIMIT %s) batch",
+                (last_key, batch_size)
+            )
+            batch_end, = await cursor.fetchone()
+            if batch_end is None:
+                return copied
+            await cursor.execute(
+                f"""INSERT IGNORE INTO {table}_new ({', '.join(columns)})
+                    SELECT {_values(columns)} FROM {table}
+                    WHERE {key} > %s AND {key} <= %s""",
+                (last_key, batch_end)
+            )
+            copied += cursor.rowcount
+        last_key = batch_end
+        print(f"  ... {table}: до {last_key}, скопировано {copied}")
+        await asyncio.sleep(pause)
+
+
+async def cutover(db: DatabaseManager):
+    """Проверка копии и атомарное переключение таблиц (бот должен быть остановлен)"""
+    async with db.query('migrate_cutover') as cursor:
+        for table in _TABLES:
+            await cursor.execute(f"SELECT (SELECT COUNT(*) FROM {table}), (SELECT COUNT(*) FROM {table}_new)")
+            old_count, new_count = await cursor.fetchone()
+            if old_count != new_count:
+                raise RuntimeError(f"{table}: {old_count} строк, в {table}_new {new_count} - запустите этап 1 повторно")
+
+        for table in _TABLES:
+            for event in ('ins', 'upd', 'del'):
+                await cursor.execute(f"DROP TRIGGER IF EXISTS {table}_ids_{event}")
+
+        await cursor.execute("SET foreign_key_checks = 0")
+        await cursor.execute(
+            """ALTER TABLE transactions_new
+               ADD FOREIGN KEY (deal_id) REFERENCES deals_new(deal_id) ON DELETE CASCADE"""
+        )
+        await cursor.execute("SET foreign_key_checks = 1")
+
+        await cursor.execute("SELECT COALESCE(MAX(log_id), 0) + 10000 FROM action_logs")
+        next_log_id, = await cursor.fetchone()
+        await cursor.execute(f"ALTER TABLE action_logs_new AUTO_INCREMENT = {int(next_log_id)}")
+
+        await cursor.execute(
+            """RENAME TABLE deals TO deals_uuid, deals_new TO deals,
+                            transactions TO transactions_uuid, transactions_new TO transactions,
+                            action_logs TO action_logs_old, action_logs_new TO action_logs"""
+        )
+    print("🔁 Таблицы переключены: можно запускать новую версию бота")
+
+
+async def migrate(args) -> bool:
+    db = DatabaseManager()
+    try:
+        await db.connect_pool()
+        if await _column_type(db, 'deals', 'deal_id') == 'binary':
+            print("✅ deals.deal_id уже BINARY(16)")
+        elif not args.cutover:
+            if await _column_type(db, 'action_logs_old', 'log_id'):
+                raise RuntimeError("action_logs_old уже существует - завершите migrate_action_logs.py --drop-old")
+            await prepare(db)
+            await create_action_logs_new(db)
+            for table in _TABLES:
+                copied = await copy_table(db, table, args.batch_size, args.pause)
+                print(f"✅ {table}: скопировано {copied}")
+            print("➡️ Остановите бота и запустите migrate_deal_ids.py --cutover")
+            return True
+        else:
+            await cutover(db)
+
+        if await _column_type(db, 'action_logs_old', 'deal_id') is not None:
+            copied = await backfill_action_logs(db, args.batch_size, args.pause)
+            print(f"✅ Журнал действий перенесен: {copied}")
+        return True
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        return False
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Перевод deal_id на BINARY(16)")
+    parser.add_argument('--cutover', action='store_true', help="этап 2: переключение таблиц (бот остановлен)")
+    parser.add_argument('--batch-size', type=int, default=2000, help="строк за один INSERT ... SELECT")
+    parser.add_argument('--pause', type=float, default=0.05, help="пауза между пакетами в секундах")
+    args = parser.parse_args()
+
+    if not asyncio.run(migrate(args)):
+        exit(1)
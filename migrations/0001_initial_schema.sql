@@ -0,0 +1,92 @@
+-- Исходная схема. IF NOT EXISTS: на базах, созданных до перехода на миграции,
+-- файл ничего не меняет и только фиксирует версию.
+
+-- Таблица пользователей
+CREATE TABLE IF NOT EXISTS users (
+    user_id BIGINT PRIMARY KEY,
+    username VARCHAR(255),
+    first_name VARCHAR(255),
+    registration_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    is_active BOOLEAN DEFAULT TRUE,
+    completed_deals INT DEFAULT 0,
+    total_volume DECIMAL(15,2) DEFAULT 0.00
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Таблица сделок (condition - зарезервированное слово MySQL)
+CREATE TABLE IF NOT EXISTS deals (
+    deal_id BINARY(16) PRIMARY KEY,
+    creator_id BIGINT NOT NULL,
+    buyer_id BIGINT DEFAULT NULL,
+    amount DECIMAL(15,2) NOT NULL,
+    `condition` TEXT NOT NULL,
+    password VARCHAR(255) NOT NULL,
+    status ENUM('active', 'joined', 'paid', 'completed', 'cancelled') DEFAULT 'active',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (creator_id) REFERENCES users(user_id),
+    FOREIGN KEY (buyer_id) REFERENCES users(user_id),
+    INDEX idx_creator_status (creator_id, status),
+    INDEX idx_buyer_status (buyer_id, status),
+    INDEX idx_status (status)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Таблица транзакций
+CREATE TABLE IF NOT EXISTS transactions (
+    transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+    deal_id BINARY(16) NOT NULL,
+    user_id BIGINT NOT NULL,
+    transaction_type ENUM('payment', 'refund', 'release') NOT NULL,
+    amount DECIMAL(15,2) NOT NULL,
+    crypto_type ENUM('USDT_TRC20', 'TON') NOT NULL,
+    tx_hash VARCHAR(255),
+    status ENUM('pending', 'confirmed', 'failed') DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (deal_id) REFERENCES deals(deal_id) ON DELETE CASCADE,
+    FOREIGN KEY (user_id) REFERENCES users(user_id),
+    INDEX idx_deal_status (deal_id, status),
+    INDEX idx_user_type (user_id, transaction_type)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Дневная сводка статистики (crypto_type 'ALL' - общие показатели,
+-- остальные строки - объем платежей по типу криптовалюты)
+CREATE TABLE IF NOT EXISTS daily_stats (
+    stat_date DATE NOT NULL,
+    crypto_type VARCHAR(16) NOT NULL DEFAULT 'ALL',
+    new_users INT NOT NULL DEFAULT 0,
+    new_deals INT NOT NULL DEFAULT 0,
+    completed_deals INT NOT NULL DEFAULT 0,
+    volume DECIMAL(15,2) NOT NULL DEFAULT 0.00,
+    PRIMARY KEY (stat_date, crypto_type)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Глобальные счетчики; значение счетчика - сумма по всем слотам
+CREATE TABLE IF NOT EXISTS stats_summary (
+    slot TINYINT UNSIGNED PRIMARY KEY,
+    total_users BIGINT NOT NULL DEFAULT 0,
+    active_deals BIGINT NOT NULL DEFAULT 0,
+    completed_deals BIGINT NOT NULL DEFAULT 0,
+    total_volume DECIMAL(20,2) NOT NULL DEFAULT 0.00
+) ENGINE=InnoDB;
+
+-- Таблица рассылок (чекпоинты для возобновления)
+CREATE TABLE IF NOT EXISTS broadcasts (
+    broadcast_id VARCHAR(36) PRIMARY KEY,
+    message_text TEXT NOT NULL,
+    status ENUM('running', 'completed') DEFAULT 'running',
+    last_user_id BIGINT NOT NULL DEFAULT 0,
+    sent INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    blocked INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    INDEX idx_status (status)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Таблица состояний FSM (при FSM_STORAGE=mysql)
+CREATE TABLE IF NOT EXISTS fsm_storage (
+    storage_key VARCHAR(255) PRIMARY KEY,
+    state VARCHAR(255),
+    data TEXT,
+    expires_at TIMESTAMP NOT NULL,
+    INDEX idx_expires_at (expires_at)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
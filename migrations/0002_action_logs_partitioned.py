@@ -0,0 +1,7 @@
+"""Журнал действий с помесячными секциями (границы секций зависят от даты применения)"""
+
+from action_log_partitions import action_logs_ddl
+
+
+async def upgrade(migration):
+    await migration.execute(action_logs_ddl())
@@ -0,0 +1,7 @@
+"""Индексы keyset-пагинации списков сделок (строятся онлайн, без блокировки записи)"""
+
+
+async def upgrade(migration):
+    await migration.add_index('deals', 'idx_creator_created', 'creator_id, created_at, deal_id')
+    await migration.add_index('deals', 'idx_buyer_created', 'buyer_id, created_at, deal_id')
+    await migration.add_index('deals', 'idx_status_created', 'status, created_at, deal_id')
@@ -0,0 +1,15 @@
+-- Outbox уведомлений участникам сделок. Строки пишутся в транзакции изменения
+-- сделки и удаляются после доставки; status = 'failed' - доставка невозможна.
+-- next_attempt_at NULL - отправить сразу.
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    notification_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    chat_id BIGINT NOT NULL,
+    deal_id BINARY(16) DEFAULT NULL,
+    text TEXT NOT NULL,
+    status ENUM('pending', 'failed') NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NULL DEFAULT NULL,
+    last_error VARCHAR(255) DEFAULT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_status_id (status, notification_id)
+) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
@@ -1,23 +1,23 @@
 import asyncio
 import logging
-import random
-import qrcode
-import io
 import base64
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union, Tuple
 from datetime import datetime, timedelta
-import uuid
 
 from aiogram import Bot, Dispatcher, types, F
-from aiogram.filters import CommandStart, Command
+from aiogram.filters import CommandStart, Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.fsm.storage.memory import MemoryStorage
-from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
-from aiogram.utils.keyboard import InlineKeyboardBuilder
+from aiogram.types import InlineKeyboardMarkup, BufferedInputFile, InputMediaPhoto
 
-from database_manager import DatabaseManager
-from config import BOT_TOKEN, MYSQL_CONFIG
+from storage_backend import create_storage_backend
+from fsm_storage import create_fsm_storage
+from qr_cache import QRCodeCache
+from pagination import page_navigation_row, parse_page_callback
+import keyboards
+from deal_ids import new_deal_code
+from captcha import issue_captcha, verify_captcha, CALLBACK_PREFIX as CAPTCHA_CALLBACK_PREFIX
+from config import BOT_TOKEN, MYSQL_CONFIG, QR_CACHE_SETTINGS
 
 # Настройка логирования
 logging.basicConfig(
@@ -30,15 +30,7 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Инициализация бота
-bot = Bot(token=BOT_TOKEN)
-storage = MemoryStorage()
-dp = Dispatcher(storage=storage)
-
 # Состояния FSM
-class CaptchaStates(StatesGroup):
-    waiting_captcha = State()
-
 class DealStates(StatesGroup):
     waiting_amount = State()
     waiting_condition = State()
@@ -48,98 +40,132 @@ class JoinDealStates(StatesGroup):
     waiting_password = State()
 
 # Константы
-CAPTCHA_ANIMALS = ["🐱", "🐶", "🐺", "🦊", "🐻", "🐨", "🐯", "🦁", "🐸", "🐧"]
 TRC20_ADDRESS = "TREBy39rXoWMTfuZcobHNR49EKfnXPbbdE"
 TON_ADDRESS = "UQC337PVpq0748IOjdbQWJlVjDMIdkENC5iimBrexCikKyYo"
+CAPTION_LIMIT = 1024  # максимальная длина подписи к фото в Telegram
 
 class ModernEscrowBot:
     def __init__(self):
-        self.db = DatabaseManager()
-        
-    def generate_captcha_keyboard(self, correct_animal: str) -> InlineKeyboardMarkup:
-        """Генерирует клавиатуру капчи с 6 вариантами животных"""
-        animals = random.sample(CAPTCHA_ANIMALS, 5)
-        if correct_animal not in animals:
-            animals[random.randint(0, 4)] = correct_animal
-        
-        random.shuffle(animals)
+        self.db = create_storage_backend()
+        self.qr_cache = QRCodeCache(max_size=QR_CACHE_SETTINGS['max_size'])
         
-        builder = InlineKeyboardBuilder()
-        for i in range(0, len(animals), 3):
-            row = animals[i:i+3]
-            for animal in row:
-                builder.button(
-                    text=animal,
-                    callback_data=f"captcha_{animal}_{correct_animal}"
-                )
-        builder.adjust(3, 2, 1)
-        return builder.as_markup()
+    def generate_captcha(self, user_id: int) -> Tuple[str, InlineKeyboardMarkup]:
+        """Капча с 5 вариантами животных: правильный ответ и клавиатура с подписанными токенами"""
+        correct_animal, buttons = issue_captcha(user_id)
+        return correct_animal, keyboards.captcha_keyboard(buttons)
 
     def get_main_menu_keyboard(self) -> InlineKeyboardMarkup:
         """Главное меню с 4 командами"""
-        builder = InlineKeyboardBuilder()
-        builder.button(text="💼 Создать сделку", callback_data="create_deal")
-        builder.button(text="👤 Профиль", callback_data="profile")
-        builder.button(text="📋 Мои сделки", callback_data="my_deals")
-        builder.button(text="🆘 Поддержка", callback_data="support")
-        builder.adjust(2, 2)
-        return builder.as_markup()
+        return keyboards.MAIN_MENU
 
     def get_deal_cancel_keyboard(self, deal_id: str) -> InlineKeyboardMarkup:
         """Клавиатура с кнопкой отмены сделки"""
-        builder = InlineKeyboardBuilder()
-        builder.button(text="❌ Отменить сделку", callback_data=f"cancel_deal_{deal_id}")
-        return builder.as_markup()
+        return keyboards.deal_cancel_keyboard(deal_id)
 
-    def generate_qr_code(self, address: str, amount: float = None) -> BufferedInputFile:
-        """Генерирует QR код для адреса кошелька"""
-        qr_data = address
-        if amount:
-            qr_data = f"{address}?amount={amount}"
-            
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(qr_data)
-        qr.make(fit=True)
+    async def generate_qr_code(self, address: str, amount: float = None) -> Union[str, BufferedInputFile]:
+        """QR код для адреса кошелька: file_id, если уже загружался, иначе PNG из кеша"""
+        file_id = self.qr_cache.get_file_id(address, amount)
+        if file_id:
+            return file_id
         
-        img = qr.make_image(fill_color="black", back_color="white")
-        bio = io.BytesIO()
-        img.save(bio, 'PNG')
-        bio.seek(0)
-        
-        return BufferedInputFile(bio.read(), filename=f"qr_{address[:10]}.png")
+        png = await self.qr_cache.get_png(address, amount)
+        return BufferedInputFile(png, filename=f"qr_{address[:10]}.png")
 
-    async def send_payment_info(self, chat_id: int, amount: float):
-        """Отправляет информацию для оплаты с QR кодами"""
-        # TRC20 USDT
-        trc20_qr = self.generate_qr_code(TRC20_ADDRESS, amount)
-        await bot.send_photo(
-            chat_id=chat_id,
-            photo=trc20_qr,
-            caption=f"💳 <b>Оплата TRC20 USDT</b>\n\n"
-                   f"💰 Сумма: <code>{amount}</code> USDT\n"
-                   f"🏦 Адрес: <code>{TRC20_ADDRESS}</code>\n\n"
-                   f"⚠️ Внимание! Отправляйте точную сумму на указанный адрес",
-            parse_mode="HTML"
+    async def send_payment_info(self, chat_id: int, amount: float, header: str = None):
+        """Отправляет информацию для оплаты одним альбомом с QR кодами
+        
+        header добавляется в подпись первого фото, если помещается в лимит
+        подписи Telegram, иначе отправляется отдельным сообщением.
+        """
+        trc20_caption = (
+            f"💳 <b>Оплата TRC20 USDT</b>\n\n"
+            f"💰 Сумма: <code>{amount}</code> USDT\n"
+            f"🏦 Адрес: <code>{TRC20_ADDRESS}</code>\n\n"
+            f"⚠️ Внимание! Отправляйте точную сумму на указанный адрес"
+        )
+        ton_caption = (
+            f"💎 <b>Оплата TON</b>\n\n"
+            f"💰 Сумма: <code>{amount}</code> TON\n"
+            f"🏦 Адрес: <code>{TON_ADDRESS}</code>\n\n"
+            f"⚠️ Внимание! Отправляйте точную сумму на указанный адрес"
         )
         
-        # TON
-        ton_qr = self.generate_qr_code(TON_ADDRESS, amount)
-        await bot.send_photo(
-            chat_id=chat_id,
-            photo=ton_qr,
-            caption=f"💎 <b>Оплата TON</b>\n\n"
-                   f"💰 Сумма: <code>{amount}</code> TON\n"
-                   f"🏦 Адрес: <code>{TON_ADDRESS}</code>\n\n"
-                   f"⚠️ Внимание! Отправляйте точную сумму на указанный адрес",
-            parse_mode="HTML"
+        if header:
+            if len(header) + len(trc20_caption) + 2 <= CAPTION_LIMIT:
+                trc20_caption = f"{header}\n\n{trc20_caption}"
+            else:
+                await bot.send_message(chat_id, header, parse_mode="HTML")
+        
+        # Оба QR строятся параллельно (или берутся из кеша)
+        trc20_photo, ton_photo = await asyncio.gather(
+            self.generate_qr_code(TRC20_ADDRESS, amount),
+            self.generate_qr_code(TON_ADDRESS, amount)
         )
+        
+        sent = await bot.send_media_group(chat_id=chat_id, media=[
+            InputMediaPhoto(media=trc20_photo, caption=trc20_caption, parse_mode="HTML"),
+            InputMediaPhoto(media=ton_photo, caption=ton_caption, parse_mode="HTML")
+        ])
+        
+        # Запоминаем file_id загруженных QR для следующих отправок
+        for address, photo, message in zip((TRC20_ADDRESS, TON_ADDRESS), (trc20_photo, ton_photo), sent):
+            if isinstance(photo, BufferedInputFile) and message.photo:
+                self.qr_cache.remember_file_id(address, amount, message.photo[-1].file_id)
 
 # Инициализация бота
 escrow_bot = ModernEscrowBot()
+bot = Bot(token=BOT_TOKEN)
+storage = create_fsm_storage(escrow_bot.db)
+dp = Dispatcher(storage=storage)
+
+# Присоединение к сделке по ссылке (/start join_<код>). Регистрируется раньше
+# start_command: обработчик CommandStart() без условий перехватил бы и эти ссылки
+@dp.message(CommandStart(deep_link=True, magic=F.args.startswith("join_")))
+async def handle_join_deal(message: types.Message, command: CommandObject, state: FSMContext):
+    """Обработка присоединения к сделке через ссылку"""
+    deal_id = command.args[len("join_"):]
+    user_id = message.from_user.id
+    
+    # Новый пользователь сначала проходит капчу, затем открывает ссылку повторно
+    if not await escrow_bot.db.is_user_registered(user_id):
+        await start_command(message)
+        return
+    
+    # Проверяем существование сделки
+    deal = await escrow_bot.db.get_deal(deal_id)
+    if not deal:
+        await message.answer("❌ Сделка не найдена или уже завершена!")
+        return
+    
+    # Проверяем, что пользователь не создатель
+    if deal['creator_id'] == user_id:
+        await message.answer("❌ Вы не можете присоединиться к собственной сделке!")
+        return
+    
+    # Проверяем, что сделка активна
+    if deal['status'] != 'active':
+        await message.answer("❌ Эта сделка уже недоступна!")
+        return
+    
+    # Сохраняем неизменяемые поля сделки, чтобы не перечитывать ее при вводе пароля
+    await state.update_data(deal_id=deal['deal_id'], deal={
+        'creator_id': deal['creator_id'],
+        'amount': str(deal['amount']),
+        'condition': deal['condition']
+    })
+    await state.set_state(JoinDealStates.waiting_password)
+    
+    await message.answer(
+        f"🔐 <b>Присоединение к сделке</b>\n\n"
+        f"💰 Сумма: {deal['amount']} USDT\n"
+        f"📝 Условие: {deal['condition']}\n\n"
+        f"Введите пароль для присоединения:",
+        parse_mode="HTML"
+    )
 
 @dp.message(CommandStart())
-async def start_command(message: types.Message, state: FSMContext):
-    """Обработка команды /start с капчей"""
+async def start_command(message: types.Message):
+    """Обработка команды /start с капчей (без записи в FSM)"""
     user_id = message.from_user.id
     
     # Проверяем, зарегистрирован ли пользователь
@@ -152,35 +178,33 @@ async def start_command(message: types.Message, state: FSMContext):
         )
         return
     
-    # Генерируем капчу
-    correct_animal = random.choice(CAPTCHA_ANIMALS)
-    await state.update_data(correct_animal=correct_animal)
-    await state.set_state(CaptchaStates.waiting_captcha)
+    # Генерируем капчу: ответ проверяется по подписи токена, состояние не хранится
+    correct_animal, keyboard = escrow_bot.generate_captcha(user_id)
     
     await message.answer(
         f"🤖 <b>Добро пожаловать в Modern Escrow Bot!</b>\n\n"
         f"🔐 Для продолжения пройдите верификацию:\n"
         f"Выберите животное: <b>{correct_animal}</b>",
-        reply_markup=escrow_bot.generate_captcha_keyboard(correct_animal),
+        reply_markup=keyboard,
         parse_mode="HTML"
     )
 
-@dp.callback_query(F.data.startswith("captcha_"))
-async def handle_captcha(callback: types.CallbackQuery, state: FSMContext):
+@dp.callback_query(F.data.startswith(CAPTCHA_CALLBACK_PREFIX))
+@dp.callback_query(F.data.startswith("captcha_"))  # кнопки капч, выданных до перехода на токены
+async def handle_captcha(callback: types.CallbackQuery):
     """Обработка капчи"""
-    data = callback.data.split("_")
-    selected_animal = data[1]
-    correct_animal = data[2]
+    user_id = callback.from_user.id
+    result = verify_captcha(user_id, callback.data)
     
-    if selected_animal == correct_animal:
+    if result is None:
+        await callback.answer("⌛ Капча устарела. Отправьте /start, чтобы получить новую.", show_alert=True)
+    elif result:
         # Капча пройдена успешно
-        user_id = callback.from_user.id
         username = callback.from_user.username or "NoUsername"
         first_name = callback.from_user.first_name or "User"
         
         # Регистрируем пользователя
         await escrow_bot.db.register_user(user_id, username, first_name)
-        await state.clear()
         
         await callback.message.edit_text(
             "✅ <b>Верификация пройдена успешно!</b>\n\n"
@@ -261,7 +285,7 @@ async def process_deal_password(message: types.Message, state: FSMContext):
     condition = data['condition']
     
     # Создаем сделку в БД
-    deal_id = str(uuid.uuid4())
+    deal_id = new_deal_code()
     user_id = message.from_user.id
     
     success = await escrow_bot.db.create_deal(
@@ -313,15 +337,14 @@ async def show_profile(callback: types.CallbackQuery):
         f"💰 Общий объем: {user_stats['total_volume']} USDT\n"
         f"📅 Дата регистрации: {user_stats['registration_date']}\n\n"
         f"⬅️ Назад в меню",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_menu")]
-        ]),
+        reply_markup=keyboards.BACK_TO_MENU,
         parse_mode="HTML"
     )
 
 @dp.callback_query(F.data == "my_deals")
+@dp.callback_query(F.data.startswith("md:"))
 async def show_my_deals(callback: types.CallbackQuery):
-    """Показ сделок пользователя"""
+    """Показ сделок пользователя (постранично, кнопки "md:<n|p>:<курсор>")"""
     user_id = callback.from_user.id
     
     # Проверяем блокировку
@@ -329,7 +352,13 @@ async def show_my_deals(callback: types.CallbackQuery):
         await callback.answer("❌ Панель заблокирована до завершения сделки!", show_alert=True)
         return
     
-    deals = await escrow_bot.db.get_user_deals(user_id)
+    position = parse_page_callback(callback.data) if callback.data.startswith("md:") else {}
+    page = await escrow_bot.db.get_user_deals(user_id, **position)
+    if page is None:
+        await callback.answer("❌ Ошибка получения сделок. Попробуйте позже.", show_alert=True)
+        return
+    
+    deals = page['deals']
     
     if not deals:
         text = "📋 <b>Ваши сделки</b>\n\nУ вас пока нет сделок."
@@ -341,9 +370,7 @@ async def show_my_deals(callback: types.CallbackQuery):
     
     await callback.message.edit_text(
         text,
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_menu")]
-        ]),
+        reply_markup=keyboards.with_navigation(page_navigation_row("md", page), keyboards.BACK_TO_MENU),
         parse_mode="HTML"
     )
 
@@ -364,9 +391,7 @@ async def show_support(callback: types.CallbackQuery):
         "• Email: support@escrowbot.com\n\n"
         "⏰ Время работы: 24/7\n"
         "⚡ Среднее время ответа: 15 минут",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="back_to_menu")]
-        ]),
+        reply_markup=keyboards.BACK_TO_MENU,
         parse_mode="HTML"
     )
 
@@ -404,43 +429,6 @@ async def cancel_deal(callback: types.CallbackQuery):
     else:
         await callback.answer("❌ Ошибка отмены сделки!", show_alert=True)
 
-# Обработка команды для присоединения к сделке
-@dp.message(Command("start"))
-async def handle_join_deal(message: types.Message, state: FSMContext):
-    """Обработка присоединения к сделке через ссылку"""
-    if not message.text.startswith("/start join_"):
-        return
-    
-    deal_id = message.text.replace("/start join_", "")
-    user_id = message.from_user.id
-    
-    # Проверяем существование сделки
-    deal = await escrow_bot.db.get_deal(deal_id)
-    if not deal:
-        await message.answer("❌ Сделка не найдена или уже завершена!")
-        return
-    
-    # Проверяем, что пользователь не создатель
-    if deal['creator_id'] == user_id:
-        await message.answer("❌ Вы не можете присоединиться к собственной сделке!")
-        return
-    
-    # Проверяем, что сделка активна
-    if deal['status'] != 'active':
-        await message.answer("❌ Эта сделка уже недоступна!")
-        return
-    
-    await state.update_data(deal_id=deal_id)
-    await state.set_state(JoinDealStates.waiting_password)
-    
-    await message.answer(
-        f"🔐 <b>Присоединение к сделке</b>\n\n"
-        f"💰 Сумма: {deal['amount']} USDT\n"
-        f"📝 Условие: {deal['condition']}\n\n"
-        f"Введите пароль для присоединения:",
-        parse_mode="HTML"
-    )
-
 @dp.message(JoinDealStates.waiting_password)
 async def process_join_password(message: types.Message, state: FSMContext):
     """Обработка пароля для присоединения"""
@@ -449,40 +437,43 @@ async def process_join_password(message: types.Message, state: FSMContext):
     password = message.text.strip()
     user_id = message.from_user.id
     
-    # Проверяем пароль
-    deal = await escrow_bot.db.get_deal(deal_id)
-    if not deal or deal['password'] != password:
-        await message.answer("❌ Неверный пароль!")
+    # Снимок сделки из первого шага (для сессий без снимка читаем из БД)
+    snapshot = data.get('deal') or await escrow_bot.db.get_deal(deal_id)
+    if not snapshot:
+        await message.answer("❌ Неверный пароль или сделка уже недоступна!")
         return
     
-    # Присоединяем к сделке
-    success = await escrow_bot.db.join_deal(deal_id, user_id)
-    if success:
+    # Уведомление создателю пишется в outbox вместе с присоединением и
+    # доставляется фоновым отправщиком (NotificationRelay)
+    creator_notification = (
+        f"🔔 <b>К вашей сделке присоединился покупатель!</b>\n\n"
+        f"💰 Сумма: {snapshot['amount']} USDT\n"
+        f"👤 Покупатель: @{message.from_user.username or 'NoUsername'}\n\n"
+        f"⏳ Ожидаем оплату..."
+    )
+    
+    # Проверка пароля и присоединение одним условным UPDATE
+    deal = await escrow_bot.db.join_deal(
+        deal_id, user_id, password=password, deal=snapshot,
+        notifications=[(snapshot['creator_id'], creator_notification)]
+    )
+    if deal:
         await state.clear()
         
-        # Отправляем информацию для оплаты
-        await message.answer(
-            f"✅ <b>Вы успешно присоединились к сделке!</b>\n\n"
-            f"💰 Сумма к оплате: <b>{deal['amount']} USDT</b>\n"
-            f"📝 Условие: {deal['condition']}\n\n"
-            f"💳 <b>Информация для оплаты:</b>",
-            parse_mode="HTML"
-        )
-        
-        # Отправляем QR коды и адреса
-        await escrow_bot.send_payment_info(message.chat.id, deal['amount'])
-        
-        # Уведомляем создателя
-        await bot.send_message(
-            deal['creator_id'],
-            f"🔔 <b>К вашей сделке присоединился покупатель!</b>\n\n"
-            f"💰 Сумма: {deal['amount']} USDT\n"
-            f"👤 Покупатель: @{message.from_user.username or 'NoUsername'}\n\n"
-            f"⏳ Ожидаем оплату...",
-            parse_mode="HTML"
-        )
+        # Информация для оплаты покупателю (одним альбомом с QR кодами)
+        try:
+            await escrow_bot.send_payment_info(
+                message.chat.id,
+                deal['amount'],
+                header=f"✅ <b>Вы успешно присоединились к сделке!</b>\n\n"
+                       f"💰 Сумма к оплате: <b>{deal['amount']} USDT</b>\n"
+                       f"📝 Условие: {deal['condition']}\n\n"
+                       f"💳 <b>Информация для оплаты:</b>"
+            )
+        except Exception as e:
+            logger.error(f"Ошибка отправки информации для оплаты по сделке {deal_id}: {e}")
     else:
-        await message.answer("❌ Ошибка присоединения к сделке!")
+        await message.answer("❌ Неверный пароль или сделка уже недоступна!")
 
 @dp.message(Command("admin"))
 async def admin_command(message: types.Message):
@@ -498,9 +489,6 @@ async def admin_command(message: types.Message):
     else:
         await message.answer("❌ У вас нет прав доступа к административной панели!")
 
-# Инициализация экземпляра бота для использования в других модулей
-escrow_bot = ModernEscrowBot()
-
 def register_handlers():
     """Регистрация всех обработчиков бота"""
     # Обработчики уже зарегистрированы через декораторы выше
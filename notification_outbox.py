@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import random
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, Deque, Set
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest
+
+from config import OUTBOX_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class NotificationRelay:
+    """Доставка уведомлений из outbox (notification_outbox)
+
+    Уведомления пишутся хранилищем в транзакции изменения сделки, поэтому
+    не теряются при сбое отправки или перезапуске бота. Отправщик читает
+    недоставленные строки в порядке записи и раскладывает их по очередям
+    чатов; пул воркеров берет чаты из общей очереди готовых. Чат в каждый
+    момент обслуживает один воркер, а следующее сообщение чата отправляется
+    только после доставки (или окончательного отказа) предыдущего - порядок
+    внутри чата сохраняется, разные чаты отправляются параллельно.
+
+    Временные ошибки повторяются с экспоненциальной задержкой со случайной
+    добавкой (jitter), RetryAfter - через указанное Telegram время.
+    Доставка "хотя бы один раз": при остановке между отправкой и удалением
+    строки сообщение будет отправлено повторно. Отправщик должен работать
+    в одном процессе (в режиме webhook - в воркере 0).
+    """
+
+    def __init__(self, db, bot: Bot,
+                 workers: int = OUTBOX_SETTINGS['workers'],
+                 batch_size: int = OUTBOX_SETTINGS['batch_size'],
+                 poll_interval: float = OUTBOX_SETTINGS['poll_interval'],
+                 max_attempts: int = OUTBOX_SETTINGS['max_attempts'],
+                 base_delay: float = OUTBOX_SETTINGS['base_delay'],
+                 max_delay: float = OUTBOX_SETTINGS['max_delay']):
+        self.db = db
+        self.bot = bot
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        # chat_id -> уведомления чата в порядке записи (чат в работе или ждет повтора)
+        self._chats: Dict[int, Deque[Dict[str, Any]]] = {}
+        self._known: Set[int] = set()
+        # Доставленные строки, которые не удалось удалить из outbox (удаление повторяется при опросе)
+        self._undeleted: Set[int] = set()
+        self._ready: "asyncio.Queue[int]" = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self.restarts = 0
+
+    def wake(self):
+        """Немедленный опрос outbox (вызывается хранилищем после записи)"""
+        self._wakeup.set()
+
+    async def run(self):
+        """Фоновая задача: опрос outbox и пул воркеров доставки"""
+        self.db.outbox_listener = self.wake
+        workers = [asyncio.create_task(self._supervise(index), name=f"outbox-worker-{index}")
+                   for index in range(self.workers)]
+        try:
+            while True:
+                self._wakeup.clear()
+                await self._poll()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.db.outbox_listener = None
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            logger.info(f"📬 Отправщик уведомлений остановлен: доставлено {self.sent}, "
+                        f"повторов {self.retried}, отказов {self.failed}, в очереди {len(self._known)}, "
+                        f"перезапусков воркеров {self.restarts}")
+
+    async def _poll(self):
+        """Новые строки outbox - в очереди их чатов"""
+        for notification_id in list(self._undeleted):
+            if await self.db.delete_notification(notification_id):
+                self._undeleted.discard(notification_id)
+
+        # Строки в работе тоже возвращаются запросом, поэтому лимит увеличен на их число
+        rows = await self.db.get_pending_notifications(self.batch_size + len(self._known) + len(self._undeleted))
+        for row in rows:
+            if row['notification_id'] in self._known or row['notification_id'] in self._undeleted:
+                continue
+            self._known.add(row['notification_id'])
+
+            queue = self._chats.get(row['chat_id'])
+            if queue is not None:
+                queue.append(row)
+                continue
+
+            self._chats[row['chat_id']] = deque([row])
+            delay = 0.0
+            if row['next_attempt_at'] is not None:
+                delay = (row['next_attempt_at'] - datetime.now()).total_seconds()
+            self._schedule(row['chat_id'], delay)
+
+    def _schedule(self, chat_id: int, delay: float):
+        if delay > 0:
+            asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+        else:
+            self._ready.put_nowait(chat_id)
+
+    async def _supervise(self, index: int):
+        """Перезапуск воркера после непредвиденной ошибки (пул не теряет воркеров)"""
+        while True:
+            try:
+                await self._worker()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.restarts += 1
+                logger.error(f"❌ Воркер уведомлений {index} упал, перезапуск: {e}")
+                await asyncio.sleep(self.base_delay)
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            try:
+                await self._drain_chat(chat_id)
+            except Exception:
+                # Чат не должен остаться "в работе" навсегда - повторим его позже
+                if chat_id in self._chats:
+                    self._schedule(chat_id, self.base_delay)
+                raise
+
+    async def _drain_chat(self, chat_id: int):
+        queue = self._chats[chat_id]
+        while queue:
+            row = queue[0]
+            retry_delay = await self._deliver(row)
+            if retry_delay is not None:
+                # Следующие сообщения чата ждут повтора этого
+                self._schedule(chat_id, retry_delay)
+                return
+            queue.popleft()
+            self._known.discard(row['notification_id'])
+        del self._chats[chat_id]
+
+    async def _deliver(self, row: Dict[str, Any]) -> Optional[float]:
+        """Одна попытка отправки; задержка до повтора или None, если строка обработана"""
+        notification_id = row['notification_id']
+        try:
+            await self.bot.send_message(chat_id=row['chat_id'], text=row['text'], parse_mode="HTML")
+        except TelegramRetryAfter as e:
+            # Flood control - не ошибка доставки, попытка не засчитывается
+            return await self._retry(row, row['attempts'], e, delay=e.retry_after)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован, чат не найден или текст некорректен - повтор не поможет
+            logger.warning(f"⚠️ Уведомление {notification_id} в чат {row['chat_id']} не доставлено: {e}")
+            await self.db.fail_notification(notification_id, row['attempts'] + 1, str(e))
+            self.failed += 1
+            return None
+        except Exception as e:
+            return await self._retry(row, row['attempts'] + 1, e)
+
+        self.sent += 1
+        if not await self.db.delete_notification(notification_id):
+            # Пока процесс жив, строка не отправляется повторно, а удаление повторяется при опросе;
+            # если процесс остановится раньше, сообщение после перезапуска уйдет еще раз
+            logger.error(f"❌ Уведомление {notification_id} доставлено, но не удалено из outbox")
+            self._undeleted.add(notification_id)
+        return None
+
+    async def _retry(self, row: Dict[str, Any], attempts: int, error: Exception,
+                     delay: Optional[float] = None) -> Optional[float]:
+        notification_id = row['notification_id']
+        if attempts >= self.max_attempts:
+            logger.error(f"❌ Уведомление {notification_id} в чат {row['chat_id']} не доставлено "
+                         f"за {attempts} попыток: {error}")
+            await self.db.fail_notification(notification_id, attempts, str(error))
+            self.failed += 1
+            return None
+
+        if delay is None:
+            delay = self.backoff(attempts)
+        row['attempts'] = attempts
+        await self.db.reschedule_notification(
+            notification_id, attempts, datetime.now() + timedelta(seconds=delay), str(error)
+        )
+        self.retried += 1
+        return delay
+
+    def backoff(self, attempts: int) -> float:
+        """Экспоненциальная задержка с jitter: половина фиксирована, половина случайна"""
+        ceiling = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
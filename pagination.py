@@ -0,0 +1,79 @@
+import base64
+import calendar
+import struct
+from datetime import datetime, timedelta
+from typing import Optional, Tuple, List, Dict, Any
+
+from aiogram.types import InlineKeyboardButton
+
+from deal_ids import encode_deal_code, decode_deal_code
+
+# Максимальная длина callback_data в Telegram
+CALLBACK_DATA_LIMIT = 64
+
+# created_at хранится в курсоре как секунды от этой даты (naive, как отдает aiomysql)
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode_cursor(created_at: datetime, deal_id: str) -> str:
+    """Непрозрачный курсор позиции в списке сделок (27 символов base64url)
+
+    Курсор - это ключ сортировки (created_at, deal_id) последней показанной
+    строки: 4 байта секунд и 16 байт идентификатора сделки.
+    """
+    packed = struct.pack(">I", calendar.timegm(created_at.timetuple())) + decode_deal_code(deal_id)
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Optional[Tuple[datetime, str]]:
+    """Ключ сортировки из курсора (None, если курсор поврежден)"""
+    try:
+        packed = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        seconds, = struct.unpack(">I", packed[:4])
+        if len(packed) != 20:
+            return None
+        return _EPOCH + timedelta(seconds=seconds), encode_deal_code(packed[4:])
+    except (ValueError, struct.error):
+        return None
+
+
+def page_callback(prefix: str, direction: str, cursor: str) -> str:
+    """callback_data кнопки перехода по страницам: <prefix>:<n|p>:<курсор>"""
+    data = f"{prefix}:{direction}:{cursor}"
+    if len(data.encode()) > CALLBACK_DATA_LIMIT:
+        raise ValueError(f"callback_data длиннее {CALLBACK_DATA_LIMIT} байт: {data}")
+    return data
+
+
+def parse_page_callback(data: str) -> Dict[str, Tuple[datetime, str]]:
+    """Аргументы after / before для DatabaseManager из callback_data кнопки перехода
+
+    Поврежденный курсор дает пустой словарь - то есть первую страницу.
+    """
+    _, direction, cursor = data.split(":", 2)
+    key = decode_cursor(cursor)
+    if key is None:
+        return {}
+    return {'before': key} if direction == "p" else {'after': key}
+
+
+def page_navigation_row(prefix: str, page: Dict[str, Any]) -> List[InlineKeyboardButton]:
+    """Кнопки "назад/вперед" для страницы сделок из DatabaseManager
+
+    Курсор "назад" - первая строка страницы, "вперед" - последняя.
+    """
+    deals = page['deals']
+    row = []
+    if deals and page['has_prev']:
+        first = deals[0]
+        row.append(InlineKeyboardButton(
+            text="◀️ Новее",
+            callback_data=page_callback(prefix, "p", encode_cursor(first['created_at'], first['deal_id']))
+        ))
+    if deals and page['has_next']:
+        last = deals[-1]
+        row.append(InlineKeyboardButton(
+            text="Старее ▶️",
+            callback_data=page_callback(prefix, "n", encode_cursor(last['created_at'], last['deal_id']))
+        ))
+    return row
@@ -0,0 +1,118 @@
+import asyncio
+import io
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+QRKey = Tuple[str, str]
+
+
+def qr_payload(address: str, amount=None) -> str:
+    """Данные QR-кода: адрес и, если указана, сумма"""
+    if amount:
+        return f"{address}?amount={amount}"
+    return address
+
+
+def render_qr_png(data: str) -> bytes:
+    """Построение PNG QR-кода (CPU-работа, выполняется вне event loop)"""
+    import qrcode
+
+    qr = qrcode.QRCode(version=1, box_size=10, border=5)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    img = qr.make_image(fill_color="black", back_color="white")
+    bio = io.BytesIO()
+    img.save(bio, 'PNG')
+    return bio.getvalue()
+
+
+class QRCodeCache:
+    """LRU-кеш PNG QR-кодов по (адрес, сумма) и file_id уже загруженных фото
+
+    Построение PNG выполняется в executor, чтобы не блокировать event loop.
+    После первой загрузки в Telegram запоминается file_id, и повторные
+    отправки того же QR обходятся без загрузки файла.
+    """
+
+    def __init__(self, max_size: int = 512, max_file_ids: int = 4096):
+        self.max_size = max_size
+        self.max_file_ids = max_file_ids
+        self._images: "OrderedDict[QRKey, bytes]" = OrderedDict()
+        self._file_ids: "OrderedDict[QRKey, str]" = OrderedDict()
+        # Одновременные запросы одного QR ждут одно построение
+        self._pending: Dict[QRKey, asyncio.Future] = {}
+
+        # Счетчики для метрик
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.file_id_hits = 0
+        self.uploads = 0
+
+    @staticmethod
+    def make_key(address: str, amount=None) -> QRKey:
+        return (address, str(amount) if amount else "")
+
+    async def get_png(self, address: str, amount=None) -> bytes:
+        """PNG QR-кода из кеша или построенный в executor"""
+        key = self.make_key(address, amount)
+
+        png = self._images.get(key)
+        if png is not None:
+            self._images.move_to_end(key)
+            self.hits += 1
+            return png
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(None, render_qr_png, qr_payload(address, amount))
+        self._pending[key] = future
+        try:
+            png = await future
+        finally:
+            self._pending.pop(key, None)
+
+        self._images[key] = png
+        while len(self._images) > self.max_size:
+            self._images.popitem(last=False)
+            self.evictions += 1
+        return png
+
+    def get_file_id(self, address: str, amount=None) -> Optional[str]:
+        """file_id ранее загруженного QR-кода"""
+        key = self.make_key(address, amount)
+        file_id = self._file_ids.get(key)
+        if file_id is not None:
+            self._file_ids.move_to_end(key)
+            self.file_id_hits += 1
+        return file_id
+
+    def remember_file_id(self, address: str, amount, file_id: str):
+        """Запоминание file_id после первой загрузки"""
+        key = self.make_key(address, amount)
+        self._file_ids[key] = file_id
+        self.uploads += 1
+        while len(self._file_ids) > self.max_file_ids:
+            self._file_ids.popitem(last=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики кеша для метрик"""
+        return {
+            'size': len(self._images),
+            'max_size': self.max_size,
+            'file_ids': len(self._file_ids),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'file_id_hits': self.file_id_hits,
+            'uploads': self.uploads
+        }
@@ -0,0 +1,189 @@
+import bisect
+import logging
+import time
+from typing import Optional, Dict, Any, List, Callable
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки, в секундах
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами (совместима с форматом Prometheus)"""
+
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, p: float) -> float:
+        """Оценка перцентиля сверху - граница корзины, в которую он попал"""
+        if not self.count:
+            return 0.0
+        rank = self.count * p
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(0.5) * 1000,
+            'p95_ms': self.percentile(0.95) * 1000,
+            'p99_ms': self.percentile(0.99) * 1000,
+            'max_ms': round(self.max * 1000, 3)
+        }
+
+
+class StatementStats:
+    """Счетчики одного именованного запроса"""
+
+    __slots__ = ('latency', 'pool_wait', 'rows', 'errors', 'slow')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.pool_wait = Histogram()
+        self.rows = 0
+        self.errors = 0
+        self.slow = 0
+
+
+class QueryMetrics:
+    """Метрики запросов DatabaseManager по именам операций
+
+    Имя задается при открытии курсора (DatabaseManager.query / transaction)
+    или явно в execute(..., name=...) для вспомогательных запросов.
+    """
+
+    def __init__(self, slow_query_seconds: float):
+        self.slow_query_seconds = slow_query_seconds
+        self.statements: Dict[str, StatementStats] = {}
+        self.pool_wait = Histogram()
+
+    def _get(self, name: str) -> StatementStats:
+        stats = self.statements.get(name)
+        if stats is None:
+            stats = self.statements[name] = StatementStats()
+        return stats
+
+    def observe_query(self, name: str, seconds: float, rows: int, error: bool = False) -> bool:
+        """Учет выполненного запроса; возвращает True, если запрос медленный"""
+        stats = self._get(name)
+        stats.latency.observe(seconds)
+        if error:
+            stats.errors += 1
+        elif rows > 0:
+            stats.rows += rows
+
+        slow = seconds >= self.slow_query_seconds
+        if slow:
+            stats.slow += 1
+        return slow
+
+    def observe_pool_wait(self, name: str, seconds: float):
+        self._get(name).pool_wait.observe(seconds)
+        self.pool_wait.observe(seconds)
+
+    def observe_error(self, name: str):
+        """Ошибка вне execute (например, при получении соединения из пула)"""
+        self._get(name).errors += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Сводка для админ-панели и логов"""
+        return {
+            'pool_wait': self.pool_wait.summary(),
+            'statements': {
+                name: {
+                    **stats.latency.summary(),
+                    'pool_wait_p99_ms': stats.pool_wait.percentile(0.99) * 1000,
+                    'rows': stats.rows,
+                    'errors': stats.errors,
+                    'slow': stats.slow
+                }
+                for name, stats in sorted(self.statements.items())
+            }
+        }
+
+    def render_prometheus(self) -> List[str]:
+        """Строки в текстовом формате Prometheus"""
+        lines = []
+        _render_histogram(lines, 'escrow_db_pool_wait_seconds', self.pool_wait, '')
+        for metric, kind in (('escrow_db_query_seconds', 'histogram'),
+                             ('escrow_db_query_pool_wait_seconds', 'histogram'),
+                             ('escrow_db_query_rows_total', 'counter'),
+                             ('escrow_db_query_errors_total', 'counter'),
+                             ('escrow_db_query_slow_total', 'counter')):
+            lines.append(f"# TYPE {metric} {kind}")
+            for name, stats in sorted(self.statements.items()):
+                labels = f'statement="{name}"'
+                if metric == 'escrow_db_query_seconds':
+                    _render_histogram(lines, metric, stats.latency, labels, with_type=False)
+                elif metric == 'escrow_db_query_pool_wait_seconds':
+                    _render_histogram(lines, metric, stats.pool_wait, labels, with_type=False)
+                else:
+                    value = {'escrow_db_query_rows_total': stats.rows,
+                             'escrow_db_query_errors_total': stats.errors,
+                             'escrow_db_query_slow_total': stats.slow}[metric]
+                    lines.append(f"{metric}{{{labels}}} {value}")
+        return lines
+
+
+def _render_histogram(lines: List[str], metric: str, histogram: Histogram, labels: str, with_type: bool = True):
+    if with_type:
+        lines.append(f"# TYPE {metric} histogram")
+    prefix = f"{labels}," if labels else ""
+    cumulative = 0
+    for bound, bucket_count in zip(LATENCY_BUCKETS, histogram.counts):
+        cumulative += bucket_count
+        lines.append(f'{metric}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{prefix}le="+Inf"}} {histogram.count}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{metric}_sum{suffix} {histogram.total:.6f}")
+    lines.append(f"{metric}_count{suffix} {histogram.count}")
+
+
+class InstrumentedCursor:
+    """Обертка курсора aiomysql: замер каждого execute под именем операции
+
+    Остальные атрибуты (fetchone, fetchall, rowcount, lastrowid...)
+    проксируются к исходному курсору.
+    """
+
+    def __init__(self, cursor, name: str, metrics: QueryMetrics,
+                 on_slow: Optional[Callable[[str, str, Any, float], None]] = None):
+        self._cursor = cursor
+        self._name = name
+        self._metrics = metrics
+        self._on_slow = on_slow
+
+    def __getattr__(self, item):
+        return getattr(self._cursor, item)
+
+    async def execute(self, query: str, args=None, *, name: Optional[str] = None):
+        name = name or self._name
+        started = time.perf_counter()
+        try:
+            result = await self._cursor.execute(query, args)
+        except Exception:
+            self._metrics.observe_query(name, time.perf_counter() - started, 0, error=True)
+            raise
+
+        elapsed = time.perf_counter() - started
+        if self._metrics.observe_query(name, elapsed, self._cursor.rowcount) and self._on_slow:
+            self._on_slow(name, query, args, elapsed)
+        return result
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Пересчет дневной сводки статистики (daily_stats) по исходным таблицам
+
+Используется для первичного заполнения сводки и для исправления
+расхождений. Без аргументов пересчитывает всю историю.
+"""
+
+import argparse
+import asyncio
+from datetime import date
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from database_manager import DatabaseManager
+
+
+async def rebuild(since: date = None) -> bool:
+    db = DatabaseManager()
+    try:
+        await db.initialize()
+        print(f"🔄 Пересчет дневной статистики{f' с {since}' if since else ''}...")
+        success = await db.rebuild_daily_stats(since)
+        print("✅ Готово" if success else "❌ Ошибка пересчета, подробности в логе")
+        return success
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Пересчет таблицы daily_stats")
+    parser.add_argument('--since', type=date.fromisoformat, default=None,
+                        help="дата начала пересчета в формате YYYY-MM-DD")
+    args = parser.parse_args()
+
+    if not asyncio.run(rebuild(args.since)):
+        exit(1)
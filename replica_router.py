@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from typing import Optional, Dict, Any
+
+import aiomysql
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaRouter:
+    """Маршрутизация чтений на реплику MySQL
+
+    Реплика используется только для методов, допускающих небольшое
+    отставание. Чтения пользователя после его изменений ("прочитать свою
+    запись") закрепляются за основным сервером на pin_seconds. Реплика
+    исключается из маршрутизации, если ее отставание больше max_lag,
+    репликация остановлена, сервер не настроен как реплика или недоступен,
+    и возвращается после успешной проверки.
+    """
+
+    def __init__(self, primary_config: Dict[str, Any], replica_config: Dict[str, Any]):
+        self.primary_config = primary_config
+        self.config = replica_config
+        self.pool = None
+        self.healthy = False
+        self.lag: Optional[float] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        # user_id -> момент окончания закрепления за основным сервером
+        self._pinned: Dict[int, float] = {}
+
+        # Счетчики для метрик
+        self.replica_reads = 0
+        self.primary_reads = 0
+        self.pinned_reads = 0
+        self.failovers = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.config.get('host'))
+
+    async def connect(self):
+        """Пул соединений реплики и фоновая проверка отставания (если реплика настроена)"""
+        if not self.enabled:
+            return
+        try:
+            await self._create_pool()
+            await self.check()
+            if self.healthy:
+                logger.info(f"✅ Реплика БД подключена: {self.config['host']} (отставание {self.lag} с)")
+            else:
+                logger.warning(f"⚠️ Реплика БД {self.config['host']} не прошла проверку, чтения идут на основной сервер")
+        except Exception as e:
+            logger.warning(f"⚠️ Реплика БД недоступна, чтения идут на основной сервер: {e}")
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def _create_pool(self):
+        self.pool = await aiomysql.create_pool(
+            host=self.config['host'],
+            port=self.config['port'],
+            user=self.config['user'] or self.primary_config['user'],
+            password=self.config['password'] or self.primary_config['password'],
+            db=self.primary_config['database'],
+            charset='utf8mb4',
+            autocommit=True,
+            minsize=1,
+            maxsize=self.config['maxsize']
+        )
+
+    def pin(self, *user_ids: Optional[int]):
+        """Закрепить чтения пользователей за основным сервером после изменения их данных"""
+        until = time.monotonic() + self.config['pin_seconds']
+        for user_id in user_ids:
+            if user_id:
+                self._pinned[user_id] = until
+
+    def choose(self, user_id: Optional[int] = None):
+        """Пул для чтения: пул реплики или None (читать с основного сервера)"""
+        if self.pool is None or not self.healthy:
+            self.primary_reads += 1
+            return None
+        if user_id is not None:
+            until = self._pinned.get(user_id)
+            if until is not None:
+                if until > time.monotonic():
+                    self.pinned_reads += 1
+                    return None
+                del self._pinned[user_id]
+        self.replica_reads += 1
+        return self.pool
+
+    def mark_down(self, error: BaseException):
+        """Исключить реплику до следующей успешной проверки"""
+        if self.healthy:
+            self.failovers += 1
+            logger.warning(f"⚠️ Реплика БД исключена, чтения переключены на основной сервер: {error}")
+        self.healthy = False
+
+    async def check(self):
+        """Проверка доступности и отставания реплики (SHOW REPLICA STATUS)"""
+        try:
+            status = await asyncio.wait_for(self._fetch_status(), timeout=max(1.0, self.config['check_interval']))
+        except Exception as e:
+            self.lag = None
+            self.mark_down(e)
+            return
+
+        if status is None:
+            # Сервер не настроен как реплика или репликация сброшена - данные могут быть сколь угодно старыми
+            self.lag = None
+            self.mark_down(RuntimeError("сервер не реплицирует (SHOW REPLICA STATUS пуст)"))
+            return
+
+        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        self.lag = None if lag is None else float(lag)
+
+        if self.lag is None:
+            self.mark_down(RuntimeError("репликация остановлена (Seconds_Behind_Source = NULL)"))
+        elif self.lag > self.config['max_lag']:
+            self.mark_down(RuntimeError(f"отставание {self.lag:.0f} с больше {self.config['max_lag']} с"))
+        elif not self.healthy:
+            self.healthy = True
+            logger.info(f"✅ Чтения снова идут на реплику (отставание {self.lag:.0f} с)")
+
+    async def _fetch_status(self) -> Optional[Dict[str, Any]]:
+        async with self.pool.acquire() as conn:
+            async with conn.cursor(aiomysql.DictCursor) as cursor:
+                try:
+                    await cursor.execute("SHOW REPLICA STATUS")
+                except aiomysql.ProgrammingError:
+                    # MySQL до 8.0.22
+                    await cursor.execute("SHOW SLAVE STATUS")
+                return await cursor.fetchone()
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(self.config['check_interval'])
+            try:
+                if self.pool is None:
+                    await self._create_pool()
+                await self.check()
+            except Exception as e:
+                self.mark_down(e)
+            now = time.monotonic()
+            self._pinned = {user_id: until for user_id, until in self._pinned.items() if until > now}
+
+    def get_stats(self) -> Dict[str, Any]:
+        if not self.enabled:
+            return {}
+        return {
+            'healthy': int(self.healthy),
+            'lag_seconds': self.lag,
+            'replica_reads': self.replica_reads,
+            'primary_reads': self.primary_reads,
+            'pinned_reads': self.pinned_reads,
+            'pinned_users': len(self._pinned),
+            'failovers': self.failovers,
+            'pool_size': self.pool.size if self.pool else 0,
+            'pool_in_use': self.pool.size - self.pool.freesize if self.pool else 0
+        }
+
+    async def close(self):
+        if self._monitor_task is not None:
+            self._monitor_task.cancel()
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
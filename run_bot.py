@@ -4,27 +4,51 @@ Modern Escrow Bot 2025
 Современный эскроу-бот для Telegram с поддержкой MySQL и QR-кодов
 """
 
+import time
+
+# Отсчет холодного старта для --startup-profile
+_PROCESS_STARTED = time.perf_counter()
+
+import argparse
 import asyncio
 import logging
+import signal
 import sys
 import os
+from importlib.util import find_spec
 from pathlib import Path
 
 # Добавляем текущую директорию в Python path
 sys.path.insert(0, str(Path(__file__).parent))
 
 from dotenv import load_dotenv
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
-# Импортируем наши модули
-from config import BOT_TOKEN, validate_config
-from modern_escrow_bot import escrow_bot, dp, bot
-from admin_panel import AdminPanel
-
-# Загружаем переменные окружения
+# Загружаем переменные окружения до импорта config: он читает их при импорте
 load_dotenv()
 
+# Импортируем наши модули. Обработчики бота (aiogram - основная часть
+# времени импорта), админ-панель и серверы загружаются в load_app()
+# и при первом использовании
+from config import BOT_TOKEN, WEBHOOK_SETTINGS, METRICS_SETTINGS, NOTIFICATION_SETTINGS, validate_config
+from startup_profile import StartupProfile, format_import_breakdown
+
+# Объекты бота (заполняет load_app)
+escrow_bot = None
+dp = None
+bot = None
+
+# Webhook-сервер (только в режиме webhook)
+webhook_server = None
+
+# Эндпоинт /metrics (в режиме polling; в webhook-режиме его поднимают воркеры)
+metrics_server = None
+
+# Фоновые задачи, запущенные при старте
+background_tasks = set()
+
+# Замер фаз запуска
+profile = StartupProfile(started=_PROCESS_STARTED)
+
 # Настройка улучшенного логирования
 def setup_logging():
     """Настройка системы логирования"""
@@ -51,40 +75,110 @@ def setup_logging():
     logging.getLogger('aiogram').setLevel(logging.WARNING)
     logging.getLogger('aiomysql').setLevel(logging.WARNING)
 
-async def on_startup():
-    """Действия при запуске бота"""
+def load_app():
+    """Загрузка бота
+    
+    В режиме polling импортируются обработчики (с админ-панелью), в режиме
+    webhook основному процессу нужен только клиент Bot API: обновления
+    обрабатывают воркеры, каждый со своими обработчиками и БД.
+    """
+    global escrow_bot, dp, bot
+    
+    with profile.phase("импорт aiogram"):
+        from aiogram import Bot
+    
+    if WEBHOOK_SETTINGS['mode'] == 'webhook':
+        bot = Bot(token=BOT_TOKEN)
+        return
+    
+    with profile.phase("импорт обработчиков"):
+        from modern_escrow_bot import setup_bot
+    with profile.phase("регистрация обработчиков"):
+        escrow_bot, dp, bot = setup_bot()
+
+async def init_database(background: bool = True):
+    """БД и фоновые задачи режима polling
+    
+    Без background фоновые задачи не запускаются: рассылки, outbox и
+    обслуживание БД не трогаются (запуск с --startup-profile).
+    """
+    global metrics_server
+    logger = logging.getLogger(__name__)
+    
+    await escrow_bot.db.initialize()
+    logger.info("✅ База данных инициализирована")
+    
+    if background:
+        start_background_tasks()
+    
+    if METRICS_SETTINGS['enabled']:
+        from metrics_server import MetricsServer
+        metrics_server = MetricsServer(escrow_bot.db, METRICS_SETTINGS['host'], METRICS_SETTINGS['port'])
+        await metrics_server.start()
+
+def start_background_tasks():
+    """Фоновые задачи режима polling: рассылки, обслуживание БД, outbox"""
+    from admin_panel import AdminPanel
+    
+    # Продолжаем рассылки, прерванные предыдущей остановкой
+    background_tasks.add(asyncio.create_task(AdminPanel(escrow_bot.db, bot).resume_broadcasts()))
+    
+    # Периодическая сверка материализованных счетчиков статистики
+    background_tasks.add(asyncio.create_task(escrow_bot.db.run_stats_reconciliation()))
+    
+    # Ротация помесячных секций журнала действий и политика хранения
+    background_tasks.add(asyncio.create_task(escrow_bot.db.run_action_log_retention()))
+    
+    # Доставка уведомлений участникам сделок из outbox
+    from notification_outbox import NotificationRelay
+    background_tasks.add(asyncio.create_task(NotificationRelay(escrow_bot.db, bot).run()))
+
+async def notify_admin_started(bot_info):
+    """Уведомление админу о запуске (не задерживает начало приема обновлений)"""
+    logger = logging.getLogger(__name__)
+    admin_id = NOTIFICATION_SETTINGS.get('admin_chat_id')
+    if not admin_id:
+        return
+    
+    try:
+        await bot.send_message(
+            chat_id=admin_id,
+            text="🚀 <b>Modern Escrow Bot 2025 запущен!</b>\n\n"
+                 f"🤖 Бот: @{bot_info.username}\n"
+                 f"📅 Время запуска: {asyncio.get_event_loop().time()}\n"
+                 f"✅ Все системы работают нормально",
+            parse_mode="HTML"
+        )
+        logger.info("✅ Уведомление админу отправлено")
+    except Exception as e:
+        logger.warning(f"⚠️ Не удалось отправить уведомление админу: {e}")
+
+async def on_startup(notify: bool = True, background: bool = True):
+    """Действия при запуске бота
+    
+    Независимые шаги (БД и get_me) выполняются параллельно. Без background
+    не запускаются фоновые задачи, отправляющие сообщения пользователям.
+    """
     logger = logging.getLogger(__name__)
     
     try:
         # Проверяем конфигурацию
-        validate_config()
+        with profile.phase("проверка конфигурации"):
+            validate_config()
         logger.info("✅ Конфигурация проверена")
         
-        # Инициализируем базу данных
-        await escrow_bot.db.initialize()
-        logger.info("✅ База данных инициализирована")
+        load_app()
         
-        # Получаем информацию о боте
-        bot_info = await bot.get_me()
+        steps = [profile.timed("get_me", bot.get_me())]
+        # В режиме webhook с БД работают процессы-воркеры
+        if WEBHOOK_SETTINGS['mode'] != 'webhook':
+            steps.append(profile.timed("инициализация БД", init_database(background)))
+        bot_info, *_ = await asyncio.gather(*steps)
         logger.info(f"🤖 Бот запущен: @{bot_info.username} ({bot_info.full_name})")
         
         # Проверяем, что бот может отправлять сообщения админу
-        from config import NOTIFICATION_SETTINGS
-        admin_id = NOTIFICATION_SETTINGS.get('admin_chat_id')
-        
-        if admin_id:
-            try:
-                await bot.send_message(
-                    chat_id=admin_id,
-                    text="🚀 <b>Modern Escrow Bot 2025 запущен!</b>\n\n"
-                         f"🤖 Бот: @{bot_info.username}\n"
-                         f"📅 Время запуска: {asyncio.get_event_loop().time()}\n"
-                         f"✅ Все системы работают нормально",
-                    parse_mode="HTML"
-                )
-                logger.info("✅ Уведомление админу отправлено")
-            except Exception as e:
-                logger.warning(f"⚠️ Не удалось отправить уведомление админу: {e}")
+        if notify:
+            background_tasks.add(asyncio.create_task(notify_admin_started(bot_info)))
         
         logger.info("🎉 Бот успешно запущен и готов к работе!")
         
@@ -92,20 +186,35 @@ async def on_startup():
         logger.error(f"❌ Ошибка при запуске бота: {e}")
         raise
 
-async def on_shutdown():
+async def on_shutdown(notify: bool = True):
     """Действия при остановке бота"""
     logger = logging.getLogger(__name__)
     
     try:
-        # Закрываем соединение с БД
-        await escrow_bot.db.close()
-        logger.info("🔒 Соединение с базой данных закрыто")
+        # Дожидаемся обработки принятых обновлений воркерами
+        if webhook_server is not None:
+            await webhook_server.drain()
+        
+        # Останавливаем фоновые задачи (рассылка продолжится с чекпоинта)
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        
+        if metrics_server is not None:
+            await metrics_server.stop()
+        
+        # Закрываем соединение с БД (в режиме webhook она есть только у воркеров)
+        if escrow_bot is not None:
+            await escrow_bot.db.close()
+            logger.info("🔒 Соединение с базой данных закрыто")
+        
+        if bot is None:
+            return
         
         # Уведомляем админа об остановке
-        from config import NOTIFICATION_SETTINGS
         admin_id = NOTIFICATION_SETTINGS.get('admin_chat_id')
         
-        if admin_id:
+        if notify and admin_id:
             try:
                 await bot.send_message(
                     chat_id=admin_id,
@@ -126,27 +235,61 @@ async def on_shutdown():
     except Exception as e:
         logger.error(f"❌ Ошибка при остановке бота: {e}")
 
-def check_requirements():
-    """Проверка наличия необходимых зависимостей"""
-    required_packages = [
-        'aiogram', 'aiomysql', 'qrcode', 'Pillow', 'python-dotenv'
-    ]
+async def run_webhook():
+    """Запуск приема обновлений через webhook с пулом воркеров"""
+    global webhook_server
+    logger = logging.getLogger(__name__)
     
-    missing_packages = []
+    if not WEBHOOK_SETTINGS['url']:
+        raise ValueError("❌ Для режима webhook необходимо установить WEBHOOK_URL")
     
-    for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
-            missing_packages.append(package)
+    from webhook_server import WebhookServer
+    
+    webhook_server = WebhookServer()
+    await webhook_server.start()
+    
+    await bot.set_webhook(
+        url=WEBHOOK_SETTINGS['url'],
+        secret_token=WEBHOOK_SETTINGS['secret_token'] or None
+    )
+    logger.info(f"🔗 Webhook установлен: {WEBHOOK_SETTINGS['url']}")
+    
+    # Работаем до SIGTERM/SIGINT; дренаж воркеров выполняет on_shutdown
+    # (в Windows обработчиков сигналов в event loop нет - остается KeyboardInterrupt)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    signals = (signal.SIGTERM, signal.SIGINT) if sys.platform != 'win32' else ()
+    for sig in signals:
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+        logger.info("⏹️ Получен сигнал остановки")
+    finally:
+        for sig in signals:
+            loop.remove_signal_handler(sig)
+
+def check_requirements():
+    """Проверка наличия необходимых зависимостей (без импорта: он дорогой и нужен позже)"""
+    # Пакет pip -> имя модуля
+    required_packages = {
+        'aiogram': 'aiogram', 'aiomysql': 'aiomysql', 'qrcode': 'qrcode', 'Pillow': 'PIL', 'python-dotenv': 'dotenv'
+    }
+    
+    missing_packages = [package for package, module in required_packages.items() if find_spec(module) is None]
     
     if missing_packages:
         print(f"❌ Отсутствуют необходимые пакеты: {', '.join(missing_packages)}")
         print("Установите их командой: pip install -r modern_requirements.txt")
         sys.exit(1)
 
-async def main():
-    """Главная функция запуска бота"""
+async def main(startup_profile: bool = False, startup_target: float = None) -> bool:
+    """Главная функция запуска бота
+    
+    С startup_profile бот выполняет запуск без уведомлений админу и без
+    фоновых задач (рассылки и outbox не отправляют сообщений), печатает
+    время фаз и импорта по пакетам и останавливается, не принимая обновления.
+    Возвращает False, если запуск дольше startup_target (мс).
+    """
     # Настраиваем логирование
     setup_logging()
     logger = logging.getLogger(__name__)
@@ -160,20 +303,30 @@ async def main():
     
     try:
         # Выполняем действия при запуске
-        await on_startup()
+        await on_startup(notify=not startup_profile, background=not startup_profile)
         
-        # Запускаем polling
-        logger.info("🔄 Запуск polling...")
-        await dp.start_polling(bot, skip_updates=True)
+        if startup_profile:
+            print(profile.report(startup_target))
+            print(format_import_breakdown('modern_escrow_bot' if dp is not None else 'aiogram'))
+            return startup_target is None or profile.elapsed() * 1000 <= startup_target
+        
+        if WEBHOOK_SETTINGS['mode'] == 'webhook':
+            await run_webhook()
+        else:
+            # Запускаем polling
+            logger.info(f"🔄 Запуск polling (старт занял {profile.elapsed() * 1000:.0f} мс)...")
+            await dp.start_polling(bot, skip_updates=True)
+        return True
         
     except KeyboardInterrupt:
         logger.info("⏹️ Получен сигнал остановки")
+        return True
     except Exception as e:
         logger.error(f"💥 Критическая ошибка: {e}")
         raise
     finally:
         # Выполняем действия при остановке
-        await on_shutdown()
+        await on_shutdown(notify=not startup_profile)
 
 if __name__ == "__main__":
     # Проверяем версию Python
@@ -181,15 +334,23 @@ if __name__ == "__main__":
         print("❌ Требуется Python 3.8 или выше")
         sys.exit(1)
     
+    parser = argparse.ArgumentParser(description="Modern Escrow Bot 2025")
+    parser.add_argument('--startup-profile', action='store_true',
+                        help="выполнить запуск, вывести время фаз и импорта и завершиться")
+    parser.add_argument('--startup-target', type=float, default=None,
+                        help="цель времени запуска в мс (с --startup-profile: код 1, если превышена)")
+    args = parser.parse_args()
+    
     # Запускаем бота
     try:
         if sys.platform == 'win32':
             # Для Windows используем ProactorEventLoop
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
         
-        asyncio.run(main())
+        if not asyncio.run(main(args.startup_profile, args.startup_target)):
+            sys.exit(1)
     except KeyboardInterrupt:
         print("\n👋 Бот остановлен пользователем")
     except Exception as e:
         print(f"\n💥 Критическая ошибка: {e}")
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Версионные миграции схемы БД
+
+Миграции лежат в каталоге migrations/ и применяются по порядку номера:
+    0001_initial_schema.sql   - SQL, операторы разделяются ";" в конце строки
+    0002_action_logs.py       - Python, async def upgrade(migration)
+Примененные версии с контрольными суммами файлов хранятся в таблице
+schema_migrations. DDL в MySQL не транзакционен, поэтому операторы миграций
+пишутся идемпотентными (IF NOT EXISTS, migration.add_index): прерванную
+миграцию можно просто запустить повторно.
+
+При старте бота DatabaseManager делает одну проверку версии и не выполняет
+DDL, если схема актуальна. Запуск вручную:
+    python schema_migrations.py            - применить недостающие миграции
+    python schema_migrations.py --status   - показать состояние
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import List, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Имя файла миграции: <номер>_<описание>.sql|.py
+_FILE_NAME = re.compile(r"^(\d+)_(\w+)\.(sql|py)$")
+
+# Блокировка MySQL, под которой миграции применяет только один процесс (например, один из воркеров)
+_LOCK_NAME = "escrow_schema_migrations"
+_LOCK_TIMEOUT = 600
+
+_VERSIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum CHAR(64) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        duration_ms INT NOT NULL DEFAULT 0
+    ) ENGINE=InnoDB CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+
+class MigrationError(Exception):
+    """Ошибка применения миграции или расхождение контрольных сумм"""
+
+
+@dataclass
+class MigrationFile:
+    version: int
+    name: str
+    path: str
+    checksum: str
+
+    @property
+    def kind(self) -> str:
+        return os.path.splitext(self.path)[1][1:]
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[MigrationFile]:
+    """Файлы миграций по возрастанию версии"""
+    migrations = []
+    for file_name in sorted(os.listdir(directory)):
+        match = _FILE_NAME.match(file_name)
+        if not match:
+            continue
+        path = os.path.join(directory, file_name)
+        with open(path, 'rb') as f:
+            checksum = hashlib.sha256(f.read()).hexdigest()
+        migrations.append(MigrationFile(int(match.group(1)), match.group(2), path, checksum))
+
+    versions = [migration.version for migration in migrations]
+    if len(versions) != len(set(versions)):
+        raise MigrationError(f"Повторяющиеся номера миграций в {directory}")
+    return sorted(migrations, key=lambda migration: migration.version)
+
+
+def split_sql(text: str) -> List[str]:
+    """Операторы SQL-файла: разделитель - ";" в конце строки, строки "--" - комментарии"""
+    statements, current = [], []
+    for line in text.splitlines():
+        if line.strip().startswith("--"):
+            continue
+        current.append(line)
+        if line.rstrip().endswith(";"):
+            statement = "\n".join(current).strip().rstrip(";").strip()
+            if statement:
+                statements.append(statement)
+            current = []
+    tail = "\n".join(current).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+class Migration:
+    """Контекст Python-миграции: выполнение SQL и онлайн-операции над схемой"""
+
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    async def execute(self, sql: str, args=None):
+        await self.cursor.execute(sql, args, name='migration')
+
+    async def index_exists(self, table: str, index: str) -> bool:
+        await self.cursor.execute(
+            """SELECT 1 FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1""",
+            (table, index),
+            name='migration_index_exists'
+        )
+        return await self.cursor.fetchone() is not None
+
+    async def column_exists(self, table: str, column: str) -> bool:
+        await self.cursor.execute(
+            """SELECT 1 FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s""",
+            (table, column),
+            name='migration_column_exists'
+        )
+        return await self.cursor.fetchone() is not None
+
+    async def add_index(self, table: str, index: str, columns: str):
+        """Онлайн-построение индекса (INPLACE, без блокировки записи), если его еще нет"""
+        if await self.index_exists(table, index):
+            return
+        logger.info(f"🔧 Создание индекса {index} на {table}")
+        await self.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns}), ALGORITHM=INPLACE, LOCK=NONE")
+
+
+class SchemaMigrator:
+    """Применение миграций через DatabaseManager (его пул и метрики запросов)"""
+
+    def __init__(self, db, directory: str = MIGRATIONS_DIR):
+        self.db = db
+        self.directory = directory
+        self._migrations: Optional[List[MigrationFile]] = None
+
+    @property
+    def migrations(self) -> List[MigrationFile]:
+        if self._migrations is None:
+            self._migrations = discover(self.directory)
+        return self._migrations
+
+    async def applied(self, cursor) -> Dict[int, str]:
+        """Примененные версии и их контрольные суммы (пусто, если таблицы версий еще нет)"""
+        try:
+            await cursor.execute("SELECT version, checksum FROM schema_migrations", name='schema_version')
+        except Exception as e:
+            # 1146 - таблица не существует: база до перехода на миграции или пустая
+            if getattr(e, 'args', (None,))[0] != 1146:
+                raise
+            return {}
+        return {version: checksum for version, checksum in await cursor.fetchall()}
+
+    def pending(self, applied: Dict[int, str]) -> List[MigrationFile]:
+        """Непримененные миграции; измененный после применения файл - ошибка"""
+        for migration in self.migrations:
+            checksum = applied.get(migration.version)
+            if checksum is not None and checksum != migration.checksum:
+                raise MigrationError(
+                    f"Миграция {migration.version}_{migration.name} изменена после применения "
+                    f"(контрольная сумма не совпадает) - добавьте новую миграцию вместо правки старой"
+                )
+        return [migration for migration in self.migrations if migration.version not in applied]
+
+    async def upgrade(self) -> List[MigrationFile]:
+        """Проверка версии одним запросом и применение недостающих миграций"""
+        async with self.db.query('schema_version') as cursor:
+            pending = self.pending(await self.applied(cursor))
+        if not pending:
+            return []
+
+        async with self.db.query('schema_migrate') as cursor:
+            await cursor.execute("SELECT GET_LOCK(%s, %s)", (_LOCK_NAME, _LOCK_TIMEOUT), name='schema_lock')
+            locked, = await cursor.fetchone()
+            if locked != 1:
+                raise MigrationError("Не удалось получить блокировку миграций")
+            try:
+                await cursor.execute(_VERSIONS_TABLE, name='schema_versions_table')
+                # Пока ждали блокировку, миграции мог применить другой процесс
+                pending = self.pending(await self.applied(cursor))
+                for migration in pending:
+                    await self._apply(cursor, migration)
+            finally:
+                await cursor.execute("SELECT RELEASE_LOCK(%s)", (_LOCK_NAME,), name='schema_lock')
+                await cursor.fetchone()
+        return pending
+
+    async def _apply(self, cursor, migration: MigrationFile):
+        logger.info(f"🔧 Миграция {migration.version}_{migration.name}")
+        started = time.perf_counter()
+        if migration.kind == "sql":
+            with open(migration.path, encoding="utf-8") as f:
+                for statement in split_sql(f.read()):
+                    await cursor.execute(statement, name='migration')
+        else:
+            spec = importlib.util.spec_from_file_location(f"migration_{migration.version}", migration.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            await module.upgrade(Migration(cursor))
+
+        duration_ms = int((time.perf_counter() - started) * 1000)
+        await cursor.execute(
+            "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+            (migration.version, migration.name, migration.checksum, duration_ms),
+            name='schema_record'
+        )
+        logger.info(f"✅ Миграция {migration.version}_{migration.name} применена за {duration_ms} мс")
+
+    async def status(self) -> List[Dict[str, object]]:
+        async with self.db.query('schema_status') as cursor:
+            applied = await self.applied(cursor)
+        return [
+            {
+                'version': migration.version,
+                'name': migration.name,
+                'applied': migration.version in applied,
+                'checksum_ok': applied.get(migration.version, migration.checksum) == migration.checksum
+            }
+            for migration in self.migrations
+        ]
+
+
+async def main(show_status: bool) -> bool:
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    from database_manager import DatabaseManager
+
+    db = DatabaseManager()
+    try:
+        await db.connect_pool()
+        migrator = SchemaMigrator(db)
+        if show_status:
+            for row in await migrator.status():
+                mark = "✅" if row['applied'] else "⏳"
+                warning = "" if row['checksum_ok'] else "  ❌ файл изменен после применения"
+                print(f"{mark} {row['version']:04d}_{row['name']}{warning}")
+            return True
+
+        applied = await migrator.upgrade()
+        print(f"✅ Применено миграций: {len(applied)}" if applied else "✅ Схема актуальна")
+        return True
+    except Exception as e:
+        print(f"❌ Ошибка миграции: {e}")
+        return False
+    finally:
+        await db.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    parser = argparse.ArgumentParser(description="Миграции схемы БД")
+    parser.add_argument('--status', action='store_true', help="показать примененные и ожидающие миграции")
+    args = parser.parse_args()
+
+    if not asyncio.run(main(args.status)):
+        exit(1)
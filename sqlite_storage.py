@@ -0,0 +1,609 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date
+from decimal import Decimal
+from typing import Optional, Dict, List, Any, Sequence
+
+from config import METRICS_SETTINGS
+from query_metrics import QueryMetrics
+from storage_backend import StorageBackend, DealKey, Notification, keyset_page
+
+logger = logging.getLogger(__name__)
+
+_CENT = Decimal('0.01')
+
+# Типы колонок: суммы возвращаются как Decimal, даты - как datetime/date (как из aiomysql)
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=' '))
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_converter("DECIMAL", lambda value: Decimal(value.decode()).quantize(_CENT))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+
+_ACTIVE = "('active', 'joined', 'paid')"
+
+_SCHEMA = f"""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        first_name TEXT,
+        registration_date TIMESTAMP NOT NULL,
+        is_active INTEGER NOT NULL DEFAULT 1,
+        completed_deals INTEGER NOT NULL DEFAULT 0,
+        total_volume DECIMAL NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS deals (
+        deal_id TEXT PRIMARY KEY,
+        creator_id INTEGER NOT NULL REFERENCES users(user_id),
+        buyer_id INTEGER REFERENCES users(user_id),
+        amount DECIMAL NOT NULL,
+        "condition" TEXT NOT NULL,
+        password TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'active'
+            CHECK (status IN ('active', 'joined', 'paid', 'completed', 'cancelled')),
+        created_at TIMESTAMP NOT NULL,
+        updated_at TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_creator_status ON deals (creator_id, status);
+    CREATE INDEX IF NOT EXISTS idx_buyer_status ON deals (buyer_id, status);
+    CREATE INDEX IF NOT EXISTS idx_creator_created ON deals (creator_id, created_at, deal_id);
+    CREATE INDEX IF NOT EXISTS idx_buyer_created ON deals (buyer_id, created_at, deal_id);
+    CREATE INDEX IF NOT EXISTS idx_status_created ON deals (status, created_at, deal_id);
+
+    CREATE TABLE IF NOT EXISTS transactions (
+        transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        deal_id TEXT NOT NULL REFERENCES deals(deal_id) ON DELETE CASCADE,
+        user_id INTEGER NOT NULL REFERENCES users(user_id),
+        transaction_type TEXT NOT NULL,
+        amount DECIMAL NOT NULL,
+        crypto_type TEXT NOT NULL,
+        tx_hash TEXT,
+        status TEXT NOT NULL DEFAULT 'pending',
+        created_at TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_deal_status ON transactions (deal_id, status);
+
+    CREATE TABLE IF NOT EXISTS action_logs (
+        log_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        deal_id TEXT,
+        action TEXT NOT NULL,
+        details TEXT,
+        created_at TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_logs_created ON action_logs (created_at);
+    CREATE INDEX IF NOT EXISTS idx_logs_user_created ON action_logs (user_id, created_at);
+
+    CREATE TABLE IF NOT EXISTS daily_stats (
+        stat_date DATE NOT NULL,
+        crypto_type TEXT NOT NULL DEFAULT 'ALL',
+        new_users INTEGER NOT NULL DEFAULT 0,
+        new_deals INTEGER NOT NULL DEFAULT 0,
+        completed_deals INTEGER NOT NULL DEFAULT 0,
+        volume DECIMAL NOT NULL DEFAULT 0,
+        PRIMARY KEY (stat_date, crypto_type)
+    );
+
+    CREATE TABLE IF NOT EXISTS stats_summary (
+        slot INTEGER PRIMARY KEY CHECK (slot = 0),
+        total_users INTEGER NOT NULL DEFAULT 0,
+        active_deals INTEGER NOT NULL DEFAULT 0,
+        completed_deals INTEGER NOT NULL DEFAULT 0,
+        total_volume DECIMAL NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO stats_summary (slot) VALUES (0);
+
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        broadcast_id TEXT PRIMARY KEY,
+        message_text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'running',
+        last_user_id INTEGER NOT NULL DEFAULT 0,
+        sent INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        blocked INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP NOT NULL,
+        updated_at TIMESTAMP NOT NULL
+    );
+
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER NOT NULL,
+        deal_id TEXT,
+        text TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'failed')),
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP,
+        last_error TEXT,
+        created_at TIMESTAMP NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_status_id ON notification_outbox (status, notification_id);
+"""
+
+
+def _now() -> datetime:
+    """Время с точностью до секунды, как TIMESTAMP в MySQL"""
+    return datetime.now().replace(microsecond=0)
+
+
+def _money(amount) -> Decimal:
+    return Decimal(str(amount)).quantize(_CENT)
+
+
+class SQLiteStorageBackend(StorageBackend):
+    """Хранилище в файле SQLite для развертывания на одном узле
+
+    Схема и переходы статусов повторяют MySQL-версию. Все запросы
+    выполняются в одном отдельном потоке на одном соединении: вызовы
+    упорядочены, event loop не блокируется, а каждая операция - одна
+    транзакция SQLite (WAL). Задержки операций попадают в QueryMetrics
+    под теми же именами, что у DatabaseManager.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn: Optional[sqlite3.Connection] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self.query_metrics = QueryMetrics(slow_query_seconds=METRICS_SETTINGS['slow_query_ms'] / 1000)
+
+    async def _run(self, name: str, func, *args, default=None):
+        """func(conn, *args) в потоке SQLite одной транзакцией; при ошибке - default"""
+        started = time.perf_counter()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, self._in_transaction, func, args)
+        except Exception as e:
+            self.query_metrics.observe_query(name, time.perf_counter() - started, 0, error=True)
+            logger.error(f"Ошибка SQLite в {name}: {e}")
+            return default
+        self.query_metrics.observe_query(name, time.perf_counter() - started, 0)
+        return result
+
+    def _in_transaction(self, func, args):
+        with self.conn:
+            return func(self.conn, *args)
+
+    def _connect(self):
+        self.conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.executescript(_SCHEMA)
+
+    async def initialize(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._connect)
+            logger.info(f"✅ SQLite инициализирована: {self.path}")
+        except Exception as e:
+            logger.error(f"❌ Ошибка инициализации SQLite: {e}")
+            raise
+
+    async def close(self):
+        if self.conn is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.conn.close)
+            self.conn = None
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _log(conn, user_id, deal_id, action: str, details: str = None):
+        conn.execute(
+            "INSERT INTO action_logs (user_id, deal_id, action, details, created_at) VALUES (?, ?, ?, ?, ?)",
+            (user_id, deal_id, action, details, _now())
+        )
+
+    @staticmethod
+    def _enqueue_notifications(conn, deal_id: str, notifications: Sequence[Notification]):
+        now = _now()
+        conn.executemany(
+            "INSERT INTO notification_outbox (chat_id, deal_id, text, created_at) VALUES (?, ?, ?, ?)",
+            [(chat_id, deal_id, text, now) for chat_id, text in notifications]
+        )
+
+    @staticmethod
+    def _bump_daily_stats(conn, crypto_type: str = 'ALL', new_users: int = 0, new_deals: int = 0,
+                          completed_deals: int = 0, volume=0):
+        conn.execute(
+            """INSERT INTO daily_stats (stat_date, crypto_type, new_users, new_deals, completed_deals, volume)
+               VALUES (?, ?, ?, ?, ?, ?)
+               ON CONFLICT (stat_date, crypto_type) DO UPDATE SET
+                   new_users = new_users + excluded.new_users,
+                   new_deals = new_deals + excluded.new_deals,
+                   completed_deals = completed_deals + excluded.completed_deals,
+                   volume = volume + excluded.volume""",
+            (date.today(), crypto_type, new_users, new_deals, completed_deals, _money(volume))
+        )
+
+    @staticmethod
+    def _bump_summary(conn, total_users: int = 0, active_deals: int = 0, completed_deals: int = 0, total_volume=0):
+        conn.execute(
+            """UPDATE stats_summary SET total_users = total_users + ?, active_deals = active_deals + ?,
+                   completed_deals = completed_deals + ?, total_volume = total_volume + ?
+               WHERE slot = 0""",
+            (total_users, active_deals, completed_deals, _money(total_volume))
+        )
+
+    # Пользователи
+
+    async def register_user(self, user_id: int, username: str, first_name: str) -> bool:
+        def register(conn):
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, username, first_name, registration_date) VALUES (?, ?, ?, ?)",
+                (user_id, username, first_name, _now())
+            )
+            if cursor.rowcount > 0:
+                self._bump_daily_stats(conn, new_users=1)
+                self._bump_summary(conn, total_users=1)
+            self._log(conn, user_id, None, "user_registration", f"Username: {username}")
+            return True
+        return await self._run('register_user', register, default=False)
+
+    async def is_user_registered(self, user_id: int) -> bool:
+        def registered(conn):
+            return conn.execute("SELECT 1 FROM users WHERE user_id = ?", (user_id,)).fetchone() is not None
+        return await self._run('is_user_registered', registered, default=False)
+
+    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        def stats(conn):
+            row = conn.execute(
+                "SELECT completed_deals, total_volume, registration_date FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            return {
+                'completed_deals': row['completed_deals'],
+                'total_volume': float(row['total_volume']),
+                'registration_date': row['registration_date'].strftime('%d.%m.%Y')
+            }
+        result = await self._run('get_user_stats', stats)
+        return result or {'completed_deals': 0, 'total_volume': 0.0, 'registration_date': 'N/A'}
+
+    async def block_user(self, user_id: int, admin_id: Optional[int] = None) -> bool:
+        def block(conn):
+            conn.execute("UPDATE users SET is_active = 0 WHERE user_id = ?", (user_id,))
+            cursor = conn.execute(
+                f"""UPDATE deals SET status = 'cancelled', updated_at = ?
+                    WHERE (creator_id = ? OR buyer_id = ?) AND status IN {_ACTIVE}""",
+                (_now(), user_id, user_id)
+            )
+            if cursor.rowcount > 0:
+                self._bump_summary(conn, active_deals=-cursor.rowcount)
+            self._log(conn, admin_id, None, "admin_block_user", f"User {user_id} blocked by admin")
+            return True
+        return await self._run('block_user', block, default=False)
+
+    # Сделки
+
+    async def create_deal(self, deal_id: str, creator_id: int, amount: float, condition: str, password: str) -> bool:
+        def create(conn):
+            now = _now()
+            conn.execute(
+                """INSERT INTO deals (deal_id, creator_id, amount, "condition", password, created_at, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (deal_id, creator_id, _money(amount), condition, password, now, now)
+            )
+            self._bump_daily_stats(conn, new_deals=1)
+            self._bump_summary(conn, active_deals=1)
+            self._log(conn, creator_id, deal_id, "deal_created", f"Amount: {amount} USDT")
+            return True
+        return await self._run('create_deal', create, default=False)
+
+    async def get_deal(self, deal_id: str) -> Optional[Dict[str, Any]]:
+        def get(conn):
+            row = conn.execute("SELECT * FROM deals WHERE deal_id = ?", (deal_id,)).fetchone()
+            return dict(row) if row else None
+        return await self._run('get_deal', get)
+
+    async def join_deal(self, deal_id: str, buyer_id: int, password: str = None,
+                        deal: Optional[Dict[str, Any]] = None,
+                        notifications: Sequence[Notification] = ()) -> Optional[Dict[str, Any]]:
+        def join(conn):
+            query = """UPDATE deals SET buyer_id = ?, status = 'joined', updated_at = ?
+                       WHERE deal_id = ? AND status = 'active' AND buyer_id IS NULL AND creator_id <> ?"""
+            params = [buyer_id, _now(), deal_id, buyer_id]
+            if password is not None:
+                query += " AND password = ?"
+                params.append(password)
+            if conn.execute(query, params).rowcount != 1:
+                return None
+            self._log(conn, buyer_id, deal_id, "deal_joined", "Buyer joined the deal")
+            self._enqueue_notifications(conn, deal_id, notifications)
+
+            joined = dict(deal or {})
+            joined.update(deal_id=deal_id, buyer_id=buyer_id, status='joined')
+            return joined
+        joined = await self._run('join_deal', join)
+        if joined and notifications:
+            self._outbox_written()
+        return joined
+
+    async def cancel_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        def cancel(conn):
+            cancelled = conn.execute(
+                f"UPDATE deals SET status = 'cancelled', updated_at = ? WHERE deal_id = ? AND status IN {_ACTIVE}",
+                (_now(), deal_id)
+            ).rowcount > 0
+            if cancelled:
+                self._bump_summary(conn, active_deals=-1)
+                self._enqueue_notifications(conn, deal_id, notifications)
+                self._log(conn, None, deal_id, "deal_cancelled", "Deal cancelled by creator")
+            return cancelled
+        cancelled = await self._run('cancel_deal', cancel, default=False)
+        if cancelled and notifications:
+            self._outbox_written()
+        return cancelled
+
+    async def complete_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        def complete(conn):
+            row = conn.execute(
+                "SELECT creator_id, buyer_id, amount, status FROM deals WHERE deal_id = ?", (deal_id,)
+            ).fetchone()
+            if row is None or row['status'] not in ('active', 'joined', 'paid'):
+                return False
+
+            conn.execute("UPDATE deals SET status = 'completed', updated_at = ? WHERE deal_id = ?", (_now(), deal_id))
+            conn.execute(
+                """UPDATE users SET completed_deals = completed_deals + 1, total_volume = total_volume + ?
+                   WHERE user_id IN (?, ?)""",
+                (row['amount'], row['creator_id'], row['buyer_id'])
+            )
+            self._bump_daily_stats(conn, completed_deals=1, volume=row['amount'])
+            self._bump_summary(conn, active_deals=-1, completed_deals=1, total_volume=row['amount'])
+            self._log(conn, None, deal_id, "deal_completed", f"Amount: {row['amount']}")
+            self._enqueue_notifications(conn, deal_id, notifications)
+            return True
+        completed = await self._run('complete_deal', complete, default=False)
+        if completed and notifications:
+            self._outbox_written()
+        return completed
+
+    async def get_active_deal_by_creator(self, creator_id: int) -> Optional[Dict[str, Any]]:
+        def get(conn):
+            row = conn.execute(
+                f"SELECT * FROM deals WHERE creator_id = ? AND status IN {_ACTIVE} LIMIT 1", (creator_id,)
+            ).fetchone()
+            return dict(row) if row else None
+        return await self._run('get_active_deal_by_creator', get)
+
+    async def is_user_in_active_deal(self, user_id: int) -> bool:
+        def in_deal(conn):
+            row = conn.execute(
+                f"""SELECT EXISTS(SELECT 1 FROM deals WHERE creator_id = ? AND status IN {_ACTIVE})
+                        OR EXISTS(SELECT 1 FROM deals WHERE buyer_id = ? AND status IN {_ACTIVE})""",
+                (user_id, user_id)
+            ).fetchone()
+            return bool(row[0])
+        return await self._run('query_user_in_active_deal', in_deal, default=False)
+
+    @staticmethod
+    def _keyset(after: Optional[DealKey], before: Optional[DealKey]):
+        """Порядок чтения и условие "строго после ключа" (сравнение кортежей SQLite идет по индексу)"""
+        if before is not None:
+            return "ASC", " AND (created_at, deal_id) > (?, ?)", tuple(before)
+        if after is not None:
+            return "DESC", " AND (created_at, deal_id) < (?, ?)", tuple(after)
+        return "DESC", "", ()
+
+    @staticmethod
+    def _keyset_behind(after: Optional[DealKey], before: Optional[DealKey]):
+        """Условие "по другую сторону курсора, включая сам ключ" (None без курсора)"""
+        if before is not None:
+            return " AND (created_at, deal_id) <= (?, ?)", tuple(before)
+        if after is not None:
+            return " AND (created_at, deal_id) >= (?, ?)", tuple(after)
+        return None
+
+    async def get_user_deals(self, user_id: int, limit: int = 10,
+                             after: Optional[DealKey] = None,
+                             before: Optional[DealKey] = None) -> Optional[Dict[str, Any]]:
+        order, keyset, keyset_args = self._keyset(after, before)
+        behind = self._keyset_behind(after, before)
+        branch = (f"""SELECT * FROM (SELECT deal_id, amount, status, created_at FROM deals
+                      WHERE {{column}} = ?{keyset} ORDER BY created_at {order}, deal_id {order} LIMIT ?)""")
+
+        def page(conn):
+            rows = conn.execute(
+                f"""{branch.format(column='creator_id')} UNION ALL {branch.format(column='buyer_id')}
+                    ORDER BY created_at {order}, deal_id {order} LIMIT ?""",
+                (user_id, *keyset_args, limit + 1, user_id, *keyset_args, limit + 1, limit + 1)
+            ).fetchall()
+            has_behind = behind is not None and bool(conn.execute(
+                f"""SELECT EXISTS(SELECT 1 FROM deals WHERE creator_id = ?{behind[0]})
+                        OR EXISTS(SELECT 1 FROM deals WHERE buyer_id = ?{behind[0]})""",
+                (user_id, *behind[1], user_id, *behind[1])
+            ).fetchone()[0])
+            return keyset_page([dict(row) for row in rows], limit, after, before, has_behind)
+        return await self._run('get_user_deals', page)
+
+    async def get_active_deals(self, limit: int = 10,
+                               after: Optional[DealKey] = None,
+                               before: Optional[DealKey] = None) -> Optional[Dict[str, Any]]:
+        order, keyset, keyset_args = self._keyset(after, before)
+        behind = self._keyset_behind(after, before)
+
+        def page(conn):
+            rows = conn.execute(
+                f"""SELECT d.deal_id, d.creator_id, d.buyer_id, d.amount, d.status, d.created_at,
+                           u1.username AS creator_username, u2.username AS buyer_username
+                    FROM (SELECT * FROM deals WHERE status IN {_ACTIVE}{keyset}
+                          ORDER BY created_at {order}, deal_id {order} LIMIT ?) d
+                    LEFT JOIN users u1 ON d.creator_id = u1.user_id
+                    LEFT JOIN users u2 ON d.buyer_id = u2.user_id
+                    ORDER BY d.created_at {order}, d.deal_id {order}""",
+                (*keyset_args, limit + 1)
+            ).fetchall()
+            has_behind = behind is not None and bool(conn.execute(
+                f"SELECT EXISTS(SELECT 1 FROM deals WHERE status IN {_ACTIVE}{behind[0]})", behind[1]
+            ).fetchone()[0])
+            return keyset_page([dict(row) for row in rows], limit, after, before, has_behind)
+        return await self._run('get_active_deals', page)
+
+    async def add_transaction(self, deal_id: str, user_id: int, transaction_type: str,
+                              amount: float, crypto_type: str, tx_hash: str = None) -> bool:
+        def add(conn):
+            conn.execute(
+                """INSERT INTO transactions (deal_id, user_id, transaction_type, amount, crypto_type, tx_hash, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (deal_id, user_id, transaction_type, _money(amount), crypto_type, tx_hash, _now())
+            )
+            if transaction_type == 'payment':
+                self._bump_daily_stats(conn, crypto_type=crypto_type, volume=amount)
+            self._log(conn, user_id, deal_id, f"transaction_{transaction_type}",
+                      f"Amount: {amount}, Type: {crypto_type}")
+            return True
+        return await self._run('add_transaction', add, default=False)
+
+    # Статистика и журнал
+
+    async def get_admin_stats(self) -> Dict[str, Any]:
+        def stats(conn):
+            row = conn.execute(
+                "SELECT total_users, active_deals, completed_deals, total_volume FROM stats_summary WHERE slot = 0"
+            ).fetchone()
+            return {
+                'total_users': row['total_users'],
+                'active_deals': row['active_deals'],
+                'completed_deals': row['completed_deals'],
+                'total_volume': float(row['total_volume'])
+            }
+        return await self._run('get_admin_stats', stats, default={})
+
+    async def get_daily_stats(self, days: int = 1) -> List[Dict[str, Any]]:
+        def stats(conn):
+            rows = conn.execute(
+                """SELECT stat_date, crypto_type, new_users, new_deals, completed_deals, volume
+                   FROM daily_stats WHERE stat_date > date('now', 'localtime', ?) ORDER BY stat_date""",
+                (f"-{int(days)} days",)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        return await self._run('get_daily_stats', stats, default=[])
+
+    async def log_action(self, user_id: Optional[int], deal_id: Optional[str], action: str, details: str = None):
+        await self._run('log_action', self._log, user_id, deal_id, action, details)
+
+    async def get_action_logs(self, since: datetime, until: Optional[datetime] = None,
+                              user_id: Optional[int] = None, deal_id: Optional[str] = None,
+                              limit: int = 50) -> List[Dict[str, Any]]:
+        conditions = ["created_at >= ?", "created_at < ?"]
+        args: List[Any] = [since, until or datetime.now()]
+        if user_id is not None:
+            conditions.append("user_id = ?")
+            args.append(user_id)
+        if deal_id is not None:
+            conditions.append("deal_id = ?")
+            args.append(deal_id)
+        args.append(limit)
+
+        def logs(conn):
+            rows = conn.execute(
+                f"""SELECT log_id, user_id, deal_id, action, details, created_at FROM action_logs
+                    WHERE {' AND '.join(conditions)} ORDER BY created_at DESC, log_id DESC LIMIT ?""",
+                args
+            ).fetchall()
+            return [dict(row) for row in rows]
+        return await self._run('get_action_logs', logs, default=[])
+
+    # Рассылки
+
+    async def get_active_user_ids_page(self, after_user_id: int, limit: int) -> List[int]:
+        def page(conn):
+            rows = conn.execute(
+                "SELECT user_id FROM users WHERE user_id > ? AND is_active = 1 ORDER BY user_id LIMIT ?",
+                (after_user_id, limit)
+            ).fetchall()
+            return [row[0] for row in rows]
+        return await self._run('get_active_user_ids_page', page, default=[])
+
+    async def deactivate_users(self, user_ids: List[int]) -> bool:
+        def deactivate(conn):
+            conn.execute(f"UPDATE users SET is_active = 0 WHERE user_id IN ({', '.join(['?'] * len(user_ids))})",
+                         user_ids)
+            return True
+        return await self._run('deactivate_users', deactivate, default=False)
+
+    async def create_broadcast(self, broadcast_id: str, message_text: str) -> bool:
+        def create(conn):
+            now = _now()
+            conn.execute(
+                "INSERT INTO broadcasts (broadcast_id, message_text, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                (broadcast_id, message_text, now, now)
+            )
+            return True
+        return await self._run('create_broadcast', create, default=False)
+
+    async def get_broadcast(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
+        def get(conn):
+            row = conn.execute("SELECT * FROM broadcasts WHERE broadcast_id = ?", (broadcast_id,)).fetchone()
+            return dict(row) if row else None
+        return await self._run('get_broadcast', get)
+
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        def unfinished(conn):
+            rows = conn.execute("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY created_at").fetchall()
+            return [dict(row) for row in rows]
+        return await self._run('get_unfinished_broadcasts', unfinished, default=[])
+
+    async def save_broadcast_checkpoint(self, broadcast_id: str, last_user_id: int,
+                                        sent: int, failed: int, blocked: int) -> bool:
+        def save(conn):
+            conn.execute(
+                """UPDATE broadcasts SET last_user_id = ?, sent = ?, failed = ?, blocked = ?, updated_at = ?
+                   WHERE broadcast_id = ?""",
+                (last_user_id, sent, failed, blocked, _now(), broadcast_id)
+            )
+            return True
+        return await self._run('save_broadcast_checkpoint', save, default=False)
+
+    async def finish_broadcast(self, broadcast_id: str) -> bool:
+        def finish(conn):
+            conn.execute("UPDATE broadcasts SET status = 'completed', updated_at = ? WHERE broadcast_id = ?",
+                         (_now(), broadcast_id))
+            return True
+        return await self._run('finish_broadcast', finish, default=False)
+
+    # Outbox уведомлений
+
+    async def get_pending_notifications(self, limit: int) -> List[Dict[str, Any]]:
+        def pending(conn):
+            rows = conn.execute(
+                """SELECT notification_id, chat_id, deal_id, text, attempts, next_attempt_at
+                   FROM notification_outbox WHERE status = 'pending' ORDER BY notification_id LIMIT ?""",
+                (limit,)
+            ).fetchall()
+            return [dict(row) for row in rows]
+        return await self._run('get_pending_notifications', pending, default=[])
+
+    async def delete_notification(self, notification_id: int) -> bool:
+        def delete(conn):
+            conn.execute("DELETE FROM notification_outbox WHERE notification_id = ?", (notification_id,))
+            return True
+        return await self._run('delete_notification', delete, default=False)
+
+    async def reschedule_notification(self, notification_id: int, attempts: int,
+                                      next_attempt_at: datetime, error: str) -> bool:
+        def reschedule(conn):
+            conn.execute(
+                "UPDATE notification_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE notification_id = ?",
+                (attempts, next_attempt_at, error[:255], notification_id)
+            )
+            return True
+        return await self._run('reschedule_notification', reschedule, default=False)
+
+    async def fail_notification(self, notification_id: int, attempts: int, error: str) -> bool:
+        def fail(conn):
+            conn.execute(
+                "UPDATE notification_outbox SET status = 'failed', attempts = ?, last_error = ? WHERE notification_id = ?",
+                (attempts, error[:255], notification_id)
+            )
+            return True
+        return await self._run('fail_notification', fail, default=False)
+
+    # Метрики
+
+    def render_query_metrics(self) -> List[str]:
+        return self.query_metrics.render_prometheus()
+
+    def get_query_stats(self) -> Dict[str, Any]:
+        return self.query_metrics.get_stats()
@@ -42,17 +42,16 @@ def check_env_file():
 
 def check_dependencies():
     """Проверка зависимостей"""
-    try:
-        import aiogram
-        import aiomysql
-        import qrcode
-        import PIL
-        print("✅ Все зависимости установлены")
-        return True
-    except ImportError as e:
-        print(f"❌ Отсутствует зависимость: {e}")
+    # Наличие модулей проверяется без импорта: бот загрузит их сам
+    from importlib.util import find_spec
+    
+    missing = [module for module in ('aiogram', 'aiomysql', 'qrcode', 'PIL') if find_spec(module) is None]
+    if missing:
+        print(f"❌ Отсутствует зависимость: {', '.join(missing)}")
         print("Выполните: pip install -r modern_requirements.txt")
         return False
+    print("✅ Все зависимости установлены")
+    return True
 
 async def test_database():
     """Тестирование базы данных"""
@@ -0,0 +1,86 @@
+"""
+Профиль холодного старта бота (run_bot.py --startup-profile)
+
+Фазы запуска замеряются по perf_counter от старта процесса; фазы,
+выполняющиеся параллельно, показываются со смещением начала. Разбивка
+времени импорта по пакетам строится запуском интерпретатора с
+-X importtime в отдельном процессе, чтобы в нем не было уже
+загруженных модулей.
+"""
+
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+class StartupProfile:
+    """Замер фаз запуска; при enabled=False только считает общее время"""
+
+    def __init__(self, enabled: bool = False, started: Optional[float] = None):
+        self.enabled = enabled
+        self.started = started if started is not None else time.perf_counter()
+        # (фаза, начало от старта процесса, длительность) в секундах
+        self.phases: List[Tuple[str, float, float]] = []
+
+    @contextmanager
+    def phase(self, name: str):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, begin - self.started, time.perf_counter() - begin))
+
+    async def timed(self, name: str, coro):
+        """Результат корутины с замером ее длительности как фазы"""
+        with self.phase(name):
+            return await coro
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def report(self, target_ms: Optional[float] = None) -> str:
+        total_ms = self.elapsed() * 1000
+        lines = ["⏱️ Фазы запуска:", f"{'Фаза':<36}{'начало, мс':>12}{'время, мс':>12}"]
+        for name, begin, duration in sorted(self.phases, key=lambda phase: phase[1]):
+            lines.append(f"{name:<36}{begin * 1000:>12.0f}{duration * 1000:>12.0f}")
+        lines.append(f"{'Готов к приему обновлений':<36}{'':>12}{total_ms:>12.0f}")
+        if target_ms is not None:
+            mark = "✅" if total_ms <= target_ms else "❌"
+            lines.append(f"{mark} Цель: {target_ms:.0f} мс")
+        return "\n".join(lines)
+
+
+def import_breakdown(module: str, top: int = 15) -> List[Tuple[str, float]]:
+    """Время импорта module по пакетам верхнего уровня (мс, по убыванию)
+
+    Суммируется собственное время модулей (без вложенных импортов), поэтому
+    сумма по пакетам равна полному времени импорта.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    totals: Dict[str, float] = defaultdict(float)
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|")
+            totals[name.strip().split(".")[0]] += int(self_us) / 1000
+        except ValueError:
+            # Строка заголовка "self [us] | cumulative | imported package"
+            continue
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def format_import_breakdown(module: str, top: int = 15) -> str:
+    rows = import_breakdown(module, top)
+    lines = [f"📦 Импорт {module} по пакетам:", f"{'Пакет':<36}{'время, мс':>12}"]
+    for package, ms in rows:
+        lines.append(f"{package:<36}{ms:>12.1f}")
+    return "\n".join(lines)
+
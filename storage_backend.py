@@ -0,0 +1,261 @@
+"""
+Интерфейс хранилища бота
+
+Обработчики, админ-панель и рассылка работают с хранилищем только через
+методы StorageBackend. Реализации:
+    DatabaseManager      (database_manager.py) - MySQL, основная
+    SQLiteStorageBackend (sqlite_storage.py)   - один узел без MySQL
+    MemoryStorageBackend (memory_storage.py)   - в памяти процесса, для
+        тестов и замеров CPU-стоимости обработчиков без задержек БД
+Выбор - STORAGE_SETTINGS['backend'].
+
+Идентификаторы сделок во всех методах - публичные коды (deal_ids.py).
+Сделка проходит статусы active -> joined -> completed | cancelled;
+незавершенными считаются ACTIVE_STATUSES.
+
+Уведомления участникам, переданные в join_deal, cancel_deal и complete_deal
+(notifications), записываются в outbox в той же транзакции, что и смена
+статуса; доставляет их NotificationRelay (notification_outbox.py).
+"""
+
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Optional, Dict, List, Any, Tuple, Sequence, Callable
+
+from config import STORAGE_SETTINGS
+
+ACTIVE_STATUSES = ('active', 'joined', 'paid')
+
+# Ключ keyset-пагинации сделок: (created_at, код сделки)
+DealKey = Tuple[datetime, str]
+
+# Уведомление в outbox: (chat_id, текст в HTML)
+Notification = Tuple[int, str]
+
+
+def keyset_page(rows: List[Dict[str, Any]], limit: int, after, before, behind: bool = False) -> Dict[str, Any]:
+    """Страница из limit + 1 прочитанных строк: сами строки и наличие соседних страниц
+
+    Страница дальше в направлении чтения есть, если прочитана лишняя строка;
+    страница в обратную сторону - если есть строка по другую сторону курсора
+    (behind, включая строку самого курсора). Оба флага проверяются по данным,
+    в том числе при чтении назад.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before is not None:
+        rows.reverse()
+        return {'deals': rows, 'has_prev': has_more, 'has_next': behind}
+    return {'deals': rows, 'has_prev': behind, 'has_next': has_more}
+
+
+class StorageBackend(ABC):
+    """Операции хранилища, которые используют обработчики бота
+
+    Методы не бросают исключений: ошибки логируются, возвращается значение
+    по умолчанию (False, None или пустой результат).
+    """
+
+    # Вызывается после фиксации записей outbox (отправщик в этом процессе просыпается сразу)
+    outbox_listener: Optional[Callable[[], None]] = None
+
+    def _outbox_written(self):
+        if self.outbox_listener is not None:
+            self.outbox_listener()
+
+    @abstractmethod
+    async def initialize(self):
+        """Подключение и подготовка схемы"""
+
+    @abstractmethod
+    async def close(self):
+        """Сброс буферов и закрытие соединений"""
+
+    # Пользователи
+
+    @abstractmethod
+    async def register_user(self, user_id: int, username: str, first_name: str) -> bool:
+        """Регистрация пользователя (повторная регистрация ничего не меняет)"""
+
+    @abstractmethod
+    async def is_user_registered(self, user_id: int) -> bool:
+        """Проверка регистрации пользователя"""
+
+    @abstractmethod
+    async def get_user_stats(self, user_id: int) -> Dict[str, Any]:
+        """completed_deals, total_volume и registration_date (дд.мм.гггг) пользователя"""
+
+    @abstractmethod
+    async def block_user(self, user_id: int, admin_id: Optional[int] = None) -> bool:
+        """Деактивация пользователя и отмена его незавершенных сделок"""
+
+    # Сделки
+
+    @abstractmethod
+    async def create_deal(self, deal_id: str, creator_id: int, amount: float, condition: str, password: str) -> bool:
+        """Создание сделки в статусе active"""
+
+    @abstractmethod
+    async def get_deal(self, deal_id: str) -> Optional[Dict[str, Any]]:
+        """Строка сделки со всеми полями"""
+
+    @abstractmethod
+    async def join_deal(self, deal_id: str, buyer_id: int, password: str = None,
+                        deal: Optional[Dict[str, Any]] = None,
+                        notifications: Sequence[Notification] = ()) -> Optional[Dict[str, Any]]:
+        """Атомарный переход active -> joined (выигрывает первый покупатель)
+
+        Возвращает снимок deal с buyer_id и новым статусом или None.
+        """
+
+    @abstractmethod
+    async def cancel_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        """Отмена незавершенной сделки"""
+
+    @abstractmethod
+    async def complete_deal(self, deal_id: str, notifications: Sequence[Notification] = ()) -> bool:
+        """Завершение незавершенной сделки с учетом в статистике участников"""
+
+    @abstractmethod
+    async def get_active_deal_by_creator(self, creator_id: int) -> Optional[Dict[str, Any]]:
+        """Незавершенная сделка пользователя как создателя"""
+
+    @abstractmethod
+    async def is_user_in_active_deal(self, user_id: int) -> bool:
+        """Участвует ли пользователь (создателем или покупателем) в незавершенной сделке"""
+
+    @abstractmethod
+    async def get_user_deals(self, user_id: int, limit: int = 10,
+                             after: Optional[DealKey] = None,
+                             before: Optional[DealKey] = None) -> Optional[Dict[str, Any]]:
+        """Страница сделок пользователя, новые сначала (см. keyset_page; None при ошибке)"""
+
+    @abstractmethod
+    async def get_active_deals(self, limit: int = 10,
+                               after: Optional[DealKey] = None,
+                               before: Optional[DealKey] = None) -> Optional[Dict[str, Any]]:
+        """Страница незавершенных сделок с именами участников (None при ошибке)"""
+
+    @abstractmethod
+    async def add_transaction(self, deal_id: str, user_id: int, transaction_type: str,
+                              amount: float, crypto_type: str, tx_hash: str = None) -> bool:
+        """Запись транзакции по сделке"""
+
+    # Статистика и журнал
+
+    @abstractmethod
+    async def get_admin_stats(self) -> Dict[str, Any]:
+        """total_users, active_deals, completed_deals, total_volume"""
+
+    @abstractmethod
+    async def get_daily_stats(self, days: int = 1) -> List[Dict[str, Any]]:
+        """Строки дневной сводки за последние days дней (включая сегодня)"""
+
+    @abstractmethod
+    async def log_action(self, user_id: Optional[int], deal_id: Optional[str], action: str, details: str = None):
+        """Запись в журнал действий"""
+
+    @abstractmethod
+    async def get_action_logs(self, since: datetime, until: Optional[datetime] = None,
+                              user_id: Optional[int] = None, deal_id: Optional[str] = None,
+                              limit: int = 50) -> List[Dict[str, Any]]:
+        """Записи журнала действий за период, новые первыми"""
+
+    # Рассылки
+
+    @abstractmethod
+    async def get_active_user_ids_page(self, after_user_id: int, limit: int) -> List[int]:
+        """Страница ID активных пользователей по возрастанию"""
+
+    @abstractmethod
+    async def deactivate_users(self, user_ids: List[int]) -> bool:
+        """Пометка пользователей неактивными (заблокировали бота)"""
+
+    @abstractmethod
+    async def create_broadcast(self, broadcast_id: str, message_text: str) -> bool:
+        """Создание записи рассылки"""
+
+    @abstractmethod
+    async def get_broadcast(self, broadcast_id: str) -> Optional[Dict[str, Any]]:
+        """Рассылка с чекпоинтом"""
+
+    @abstractmethod
+    async def get_unfinished_broadcasts(self) -> List[Dict[str, Any]]:
+        """Рассылки, прерванные до завершения"""
+
+    @abstractmethod
+    async def save_broadcast_checkpoint(self, broadcast_id: str, last_user_id: int,
+                                        sent: int, failed: int, blocked: int) -> bool:
+        """Сохранение чекпоинта рассылки"""
+
+    @abstractmethod
+    async def finish_broadcast(self, broadcast_id: str) -> bool:
+        """Отметка рассылки завершенной"""
+
+    # Outbox уведомлений
+
+    @abstractmethod
+    async def get_pending_notifications(self, limit: int) -> List[Dict[str, Any]]:
+        """Недоставленные уведомления по возрастанию notification_id (порядок записи)"""
+
+    @abstractmethod
+    async def delete_notification(self, notification_id: int) -> bool:
+        """Удаление доставленного уведомления"""
+
+    @abstractmethod
+    async def reschedule_notification(self, notification_id: int, attempts: int,
+                                      next_attempt_at: datetime, error: str) -> bool:
+        """Перенос следующей попытки доставки"""
+
+    @abstractmethod
+    async def fail_notification(self, notification_id: int, attempts: int, error: str) -> bool:
+        """Отметка уведомления недоставляемым (строка остается для разбора)"""
+
+    # Обслуживание и метрики: по умолчанию нечего сверять и нечего показывать
+
+    async def verify_active_deal_locks(self, repair: bool = True) -> Dict[str, Any]:
+        return {'consistent': True}
+
+    async def run_stats_reconciliation(self, interval: int = None):
+        """Периодическая сверка счетчиков (фоновая задача)"""
+
+    async def run_action_log_retention(self, interval: int = None):
+        """Периодическая очистка журнала действий (фоновая задача)"""
+
+    def render_query_metrics(self) -> List[str]:
+        """Метрики запросов в текстовом формате Prometheus"""
+        return []
+
+    def get_query_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def get_deal_lock_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def get_replica_stats(self) -> Dict[str, Any]:
+        return {}
+
+    def get_audit_stats(self) -> Dict[str, Any]:
+        return {}
+
+
+def create_storage_backend() -> StorageBackend:
+    """Создание хранилища согласно STORAGE_SETTINGS['backend']"""
+    backend = STORAGE_SETTINGS['backend']
+
+    if backend == 'mysql':
+        from database_manager import DatabaseManager
+        return DatabaseManager()
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteStorageBackend
+        return SQLiteStorageBackend(STORAGE_SETTINGS['sqlite_path'])
+    if backend == 'memory':
+        from memory_storage import MemoryStorageBackend
+        return MemoryStorageBackend()
+    raise ValueError(f"❌ Неизвестное хранилище: {backend}")
@@ -1,97 +1,107 @@
 #!/usr/bin/env python3
 """
-Скрипт для тестирования подключения к базе данных
+Скрипт проверки хранилища: полный сценарий сделки через StorageBackend
+
+По умолчанию проверяется хранилище в памяти; --backend sqlite проверяет
+SQLite во временном файле, --backend mysql - базу из .env (тестовые
+пользователи и сделка остаются в ней с отметкой в журнале действий).
 """
 
+import argparse
+import asyncio
 import os
+import tempfile
+
 from dotenv import load_dotenv
-from database import Database
-
-def test_database_connection():
-    """Тестирует подключение к базе данных"""
-    print("🔧 Тестирование подключения к базе данных...")
-    
-    # Загружаем переменные окружения
-    load_dotenv()
-    
-    # Проверяем наличие необходимых переменных
-    required_vars = ['DB_HOST', 'DB_USER', 'DB_PASSWORD', 'DB_NAME']
-    missing_vars = []
-    
-    for var in required_vars:
-        if not os.getenv(var):
-            missing_vars.append(var)
-    
-    if missing_vars:
-        print(f"❌ Отсутствуют переменные окружения: {', '.join(missing_vars)}")
-        return False
-    
-    # Создаем экземпляр базы данных
-    db = Database()
-    
-    # Тестируем подключение
-    if db.connect():
-        print("✅ Подключение к базе данных успешно!")
-        
-        # Тестируем создание таблиц
-        if db.create_tables():
-            print("✅ Таблицы созданы/проверены успешно!")
-            
-            # Тестируем базовые операции
-            test_user_id = 123456789
-            
-            # Добавляем тестового пользователя
-            if db.add_user(test_user_id, "test_user", "Test User"):
-                print("✅ Тестовый пользователь добавлен!")
-                
-                # Проверяем верификацию
-                if db.verify_user(test_user_id):
-                    print("✅ Верификация пользователя работает!")
-                    
-                    # Проверяем статус верификации
-                    if db.is_user_verified(test_user_id):
-                        print("✅ Проверка статуса верификации работает!")
-                        
-                        print("\n🎉 Все тесты пройдены успешно!")
-                        print("💡 База данных готова к работе!")
-                        
-                        # Удаляем тестовые данные
-                        cursor = db.connection.cursor()
-                        cursor.execute("DELETE FROM users WHERE id = %s", (test_user_id,))
-                        cursor.close()
-                        print("🧹 Тестовые данные очищены.")
-                        
-                        db.close()
-                        return True
-            
-        print("❌ Ошибка при тестировании операций с базой данных")
-    else:
-        print("❌ Не удалось подключиться к базе данных")
-        print("💡 Проверьте настройки в файле .env")
-    
-    db.close()
-    return False
-
-def show_database_info():
-    """Показывает информацию о настройках базы данных"""
-    print("\n📊 Информация о настройках базы данных:")
-    print(f"🌐 Хост: {os.getenv('DB_HOST', 'Не задано')}")
-    print(f"👤 Пользователь: {os.getenv('DB_USER', 'Не задано')}")
-    print(f"🗄️ База данных: {os.getenv('DB_NAME', 'Не задано')}")
-    print(f"🔐 Пароль: {'***' if os.getenv('DB_PASSWORD') else 'Не задано'}")
+
+load_dotenv()
+
+from deal_ids import new_deal_code
+
+CREATOR_ID = 900000001
+BUYER_ID = 900000002
+OTHER_BUYER_ID = 900000003
+
+
+def create_backend(backend: str, path: str):
+    if backend == 'memory':
+        from memory_storage import MemoryStorageBackend
+        return MemoryStorageBackend()
+    if backend == 'sqlite':
+        from sqlite_storage import SQLiteStorageBackend
+        return SQLiteStorageBackend(path)
+    from database_manager import DatabaseManager
+    return DatabaseManager()
+
+
+async def check_backend(db) -> bool:
+    """Сценарий регистрация -> сделка -> присоединение -> завершение; False при первой ошибке"""
+    checks = []
+
+    def check(title: str, ok: bool):
+        print(f"{'✅' if ok else '❌'} {title}")
+        checks.append(ok)
+        return ok
+
+    for user_id in (CREATOR_ID, BUYER_ID, OTHER_BUYER_ID):
+        await db.register_user(user_id, f"test_{user_id}", "Test User")
+    check("Пользователи зарегистрированы", await db.is_user_registered(CREATOR_ID))
+    before = await db.get_admin_stats()
+
+    deal_id = new_deal_code()
+    check("Сделка создана", await db.create_deal(deal_id, CREATOR_ID, 12.5, "Проверочная сделка", "secret"))
+    deal = await db.get_deal(deal_id)
+    check("Сделка читается в статусе active", bool(deal) and deal['status'] == 'active')
+    check("Создатель в активной сделке", await db.is_user_in_active_deal(CREATOR_ID))
+
+    check("Неверный пароль отклонен", await db.join_deal(deal_id, BUYER_ID, "wrong", deal) is None)
+    check("Создатель не может присоединиться", await db.join_deal(deal_id, CREATOR_ID, "secret", deal) is None)
+    joined = await db.join_deal(deal_id, BUYER_ID, "secret", deal)
+    check("Покупатель присоединился", bool(joined) and joined['status'] == 'joined')
+    check("Второй покупатель не может присоединиться",
+          await db.join_deal(deal_id, OTHER_BUYER_ID, "secret", deal) is None)
+
+    page = await db.get_user_deals(BUYER_ID, limit=5)
+    check("Сделка в списке покупателя", any(row['deal_id'] == deal_id for row in page['deals']))
+    active = await db.get_active_deals(limit=5)
+    check("Сделка в списке активных", bool(active) and any(row['deal_id'] == deal_id for row in active['deals']))
+
+    check("Платеж записан", await db.add_transaction(deal_id, BUYER_ID, 'payment', 12.5, 'USDT_TRC20'))
+    check("Сделка завершена", await db.complete_deal(deal_id))
+    check("Повторное завершение отклонено", not await db.complete_deal(deal_id))
+    check("Завершенную сделку нельзя отменить", not await db.cancel_deal(deal_id))
+    check("Покупатель свободен", not await db.is_user_in_active_deal(BUYER_ID))
+
+    after = await db.get_admin_stats()
+    check("Счетчик завершенных сделок увеличился",
+          after.get('completed_deals', 0) == before.get('completed_deals', 0) + 1)
+    stats = await db.get_user_stats(BUYER_ID)
+    check("Статистика покупателя обновлена", stats['completed_deals'] >= 1)
+
+    return all(checks)
+
+
+async def main(backend: str) -> bool:
+    print(f"🔧 Проверка хранилища: {backend}")
+    with tempfile.TemporaryDirectory() as directory:
+        db = create_backend(backend, os.path.join(directory, "escrow_test.sqlite3"))
+        try:
+            await db.initialize()
+            return await check_backend(db)
+        except Exception as e:
+            print(f"❌ Ошибка: {e}")
+            return False
+        finally:
+            await db.close()
+
 
 if __name__ == "__main__":
-    print("🎄 OZER GARANT BOT - Тест базы данных 🎄")
-    print("=" * 50)
-    
-    show_database_info()
-    print("\n" + "=" * 50)
-    
-    success = test_database_connection()
-    
-    if success:
-        print("\n🚀 Готово к запуску бота!")
+    parser = argparse.ArgumentParser(description="Проверка хранилища бота")
+    parser.add_argument('--backend', choices=('memory', 'sqlite', 'mysql'), default='memory')
+    args = parser.parse_args()
+
+    if asyncio.run(main(args.backend)):
+        print("\n🎉 Все проверки пройдены!")
         exit(0)
-    else:
-        print("\n🔧 Необходимо исправить проблемы перед запуском.")
-        exit(1)
\ No newline at end of file
+    print("\n🔧 Необходимо исправить проблемы.")
+    exit(1)
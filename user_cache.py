@@ -0,0 +1,136 @@
+import time
+import logging
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class UserRegistrationCache:
+    """Read-through кеш регистрации пользователей (LRU + TTL, опционально Redis)"""
+
+    def __init__(self, max_size: int = 50000, ttl: int = 600, negative_ttl: int = 30,
+                 redis_config: Optional[Dict[str, Any]] = None, redis_ttl: int = 3600,
+                 key_prefix: str = "escrow:user_registered:"):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.redis_config = redis_config
+        self.redis_ttl = redis_ttl
+        self.key_prefix = key_prefix
+        self.redis = None
+
+        # user_id -> (зарегистрирован, момент истечения)
+        self._entries: "OrderedDict[int, Tuple[bool, float]]" = OrderedDict()
+
+        # Счетчики для метрик
+        self.hits = 0
+        self.misses = 0
+        self.redis_hits = 0
+        self.redis_errors = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def connect(self):
+        """Подключение уровня Redis (если включен)"""
+        if not self.redis_config:
+            return
+
+        try:
+            import redis.asyncio as aioredis
+
+            self.redis = aioredis.Redis(
+                host=self.redis_config['host'],
+                port=self.redis_config['port'],
+                db=self.redis_config['db'],
+                password=self.redis_config.get('password') or None
+            )
+            await self.redis.ping()
+            logger.info("✅ Redis-уровень кеша пользователей подключен")
+        except Exception as e:
+            logger.warning(f"⚠️ Redis недоступен, используется только локальный кеш: {e}")
+            self.redis = None
+
+    async def get(self, user_id: int) -> Optional[bool]:
+        """Получение статуса регистрации из кеша (None - промах)"""
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            registered, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return registered
+
+            del self._entries[user_id]
+            self.expirations += 1
+
+        if self.redis is not None:
+            try:
+                value = await self.redis.get(self._redis_key(user_id))
+                if value is not None:
+                    self.redis_hits += 1
+                    self._store_local(user_id, True)
+                    return True
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"⚠️ Ошибка чтения кеша Redis для {user_id}: {e}")
+
+        self.misses += 1
+        return None
+
+    async def set(self, user_id: int, registered: bool):
+        """Сохранение статуса регистрации"""
+        self._store_local(user_id, registered)
+
+        # В Redis храним только положительные ответы, чтобы не размножать промахи
+        if self.redis is not None and registered:
+            try:
+                await self.redis.set(self._redis_key(user_id), 1, ex=self.redis_ttl)
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"⚠️ Ошибка записи кеша Redis для {user_id}: {e}")
+
+    async def invalidate(self, user_id: int):
+        """Удаление пользователя из всех уровней кеша"""
+        self._entries.pop(user_id, None)
+
+        if self.redis is not None:
+            try:
+                await self.redis.delete(self._redis_key(user_id))
+            except Exception as e:
+                self.redis_errors += 1
+                logger.warning(f"⚠️ Ошибка инвалидации кеша Redis для {user_id}: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Счетчики кеша для метрик"""
+        lookups = self.hits + self.redis_hits + self.misses
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'redis_hits': self.redis_hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'redis_errors': self.redis_errors,
+            'redis_enabled': self.redis is not None,
+            'hit_ratio': (self.hits + self.redis_hits) / lookups if lookups else 0.0
+        }
+
+    async def close(self):
+        """Закрытие соединения с Redis"""
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+
+    def _store_local(self, user_id: int, registered: bool):
+        ttl = self.ttl if registered else self.negative_ttl
+        self._entries[user_id] = (registered, time.monotonic() + ttl)
+        self._entries.move_to_end(user_id)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _redis_key(self, user_id: int) -> str:
+        return f"{self.key_prefix}{user_id}"
@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import sys
+from typing import Optional, Dict, Any, List
+
+from aiohttp import web
+
+from config import WEBHOOK_SETTINGS, METRICS_SETTINGS
+from metrics_server import MetricsServer
+from notification_outbox import NotificationRelay
+
+logger = logging.getLogger(__name__)
+
+# Период проверки сигнала остановки, пока воркер ждет очередь
+_QUEUE_POLL_INTERVAL = 0.5
+_IDLE = object()
+
+# Поля Update, из которых берется отправитель для партиционирования
+_USER_EVENT_FIELDS = (
+    'message', 'edited_message', 'callback_query', 'inline_query', 'chosen_inline_result',
+    'shipping_query', 'pre_checkout_query', 'poll_answer', 'my_chat_member',
+    'chat_member', 'chat_join_request', 'channel_post', 'edited_channel_post'
+)
+
+
+def extract_user_id(update: Dict[str, Any]) -> int:
+    """ID пользователя (или чата), к которому относится обновление"""
+    for field in _USER_EVENT_FIELDS:
+        event = update.get(field)
+        if not event:
+            continue
+        user = event.get('from') or event.get('user')
+        if user:
+            return user['id']
+        chat = event.get('chat')
+        if chat:
+            return chat['id']
+    return update.get('update_id', 0)
+
+
+class WebhookServer:
+    """Прием webhook-обновлений и раздача их по процессам-воркерам
+
+    Обновления партиционируются по ID пользователя, поэтому все события
+    одного пользователя обрабатывает один воркер в порядке поступления.
+    """
+
+    def __init__(self, workers: int = WEBHOOK_SETTINGS['workers'],
+                 queue_size: int = WEBHOOK_SETTINGS['worker_queue_size']):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.draining = False
+        self.runner: Optional[web.AppRunner] = None
+        self._context = multiprocessing.get_context('spawn')
+        self._queues: List[multiprocessing.Queue] = []
+        self._processes: List[multiprocessing.Process] = []
+
+        # Счетчики для метрик
+        self.accepted = 0
+        self.rejected = 0
+
+    async def start(self):
+        """Запуск воркеров и HTTP-сервера"""
+        for index in range(self.workers):
+            worker_queue = self._context.Queue(maxsize=self.queue_size)
+            process = self._context.Process(
+                target=worker_main, args=(index, worker_queue), name=f"escrow-worker-{index}", daemon=False
+            )
+            process.start()
+            self._queues.append(worker_queue)
+            self._processes.append(process)
+
+        app = web.Application()
+        app.router.add_post(WEBHOOK_SETTINGS['path'], self.handle_update)
+        app.router.add_get('/health', self.handle_health)
+
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, WEBHOOK_SETTINGS['host'], WEBHOOK_SETTINGS['port'])
+        await site.start()
+        logger.info(
+            f"🌐 Webhook-сервер слушает {WEBHOOK_SETTINGS['host']}:{WEBHOOK_SETTINGS['port']}"
+            f"{WEBHOOK_SETTINGS['path']} ({self.workers} воркеров)"
+        )
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        """Прием обновления от Telegram"""
+        secret_token = WEBHOOK_SETTINGS['secret_token']
+        if secret_token and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != secret_token:
+            return web.Response(status=401)
+
+        # Во время остановки просим Telegram повторить доставку позже
+        if self.draining:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        # Некорректное тело не исправится повтором: отвечаем 200, и Telegram его отбрасывает
+        try:
+            update = await request.json()
+        except ValueError:
+            update = None
+        if not isinstance(update, dict):
+            self.rejected += 1
+            logger.warning("⚠️ Отброшено некорректное webhook-обновление")
+            return web.Response()
+
+        user_id = extract_user_id(update)
+
+        try:
+            self._queues[user_id % self.workers].put_nowait((user_id, update))
+        except queue.Full:
+            self.rejected += 1
+            return web.Response(status=503)
+
+        self.accepted += 1
+        return web.Response()
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        alive = sum(process.is_alive() for process in self._processes)
+        return web.json_response({
+            'workers': self.workers,
+            'alive': alive,
+            'draining': self.draining,
+            'accepted': self.accepted,
+            'rejected': self.rejected
+        }, status=200 if alive == self.workers and not self.draining else 503)
+
+    async def drain(self, timeout: float = WEBHOOK_SETTINGS['drain_timeout']):
+        """Плавная остановка: прекращаем прием и ждем обработки очередей воркерами"""
+        if self.draining:
+            return
+        self.draining = True
+        logger.info("⏳ Остановка приема обновлений, ожидание воркеров...")
+
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(None, _send_stop, worker_queue, timeout) for worker_queue in self._queues
+        ))
+        await asyncio.gather(*(
+            loop.run_in_executor(None, process.join, timeout) for process in self._processes
+        ))
+
+        for process in self._processes:
+            if process.is_alive():
+                logger.warning(f"⚠️ Воркер {process.name} не завершился за {timeout} с, принудительная остановка")
+                process.terminate()
+
+        if self.runner is not None:
+            await self.runner.cleanup()
+        logger.info("✅ Все воркеры остановлены")
+
+
+def _send_stop(worker_queue: multiprocessing.Queue, timeout: float):
+    """Сигнал остановки в очередь воркера (не блокирует дольше timeout)"""
+    try:
+        worker_queue.put(None, timeout=timeout)
+    except queue.Full:
+        logger.warning("⚠️ Очередь воркера переполнена, сигнал остановки не доставлен")
+
+
+class UserOrderedExecutor:
+    """Конкурентная обработка обновлений с сохранением порядка внутри пользователя
+
+    Число принятых и еще не обработанных обновлений ограничено max_concurrency:
+    перед взятием следующего обновления из очереди воркер ждет свободный слот
+    (acquire), слот освобождается по завершении обработки. Поэтому при
+    перегрузке заполняется очередь воркера и ingress отвечает Telegram 503,
+    а не копит обновления в памяти воркера.
+    """
+
+    def __init__(self, handler, max_concurrency: int):
+        self.handler = handler
+        self.slots = asyncio.Semaphore(max_concurrency)
+        self._tails: Dict[int, asyncio.Task] = {}
+
+    async def acquire(self):
+        """Ожидание слота для следующего обновления"""
+        await self.slots.acquire()
+
+    def submit(self, user_id: int, update: Dict[str, Any]):
+        """Постановка обновления; слот должен быть получен через acquire()"""
+        previous = self._tails.get(user_id)
+        task = asyncio.create_task(self._run(previous, update))
+        self._tails[user_id] = task
+        task.add_done_callback(lambda done: self._release(user_id, done))
+
+    async def _run(self, previous: Optional[asyncio.Task], update: Dict[str, Any]):
+        if previous is not None:
+            await asyncio.gather(previous, return_exceptions=True)
+        try:
+            await self.handler(update)
+        except Exception as e:
+            logger.error(f"Ошибка обработки обновления {update.get('update_id')}: {e}")
+
+    def _release(self, user_id: int, task: asyncio.Task):
+        self.slots.release()
+        if self._tails.get(user_id) is task:
+            del self._tails[user_id]
+
+    async def join(self):
+        """Ожидание всех поставленных обновлений"""
+        while True:
+            pending = [task for task in self._tails.values() if not task.done()]
+            if not pending:
+                return
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def worker_main(index: int, worker_queue: multiprocessing.Queue):
+    """Точка входа процесса-воркера"""
+    # Ctrl+C приходит всей группе процессов - остановкой управляет родитель через drain()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_worker_loop(index, worker_queue))
+
+
+def _next_item(worker_queue: multiprocessing.Queue, wait: bool):
+    """Следующий элемент очереди или _IDLE, если очередь пуста (wait - ждать до _QUEUE_POLL_INTERVAL)"""
+    try:
+        return worker_queue.get(timeout=_QUEUE_POLL_INTERVAL) if wait else worker_queue.get_nowait()
+    except queue.Empty:
+        return _IDLE
+
+
+async def _worker_loop(index: int, worker_queue: multiprocessing.Queue):
+    from modern_escrow_bot import setup_bot
+
+    escrow_bot, dp, bot = setup_bot()
+    await escrow_bot.db.initialize()
+
+    # SIGTERM (остановка при деплое): обработать уже принятые в очередь обновления и выйти
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    if sys.platform != 'win32':
+        loop.add_signal_handler(signal.SIGTERM, stopping.set)
+
+    executor = UserOrderedExecutor(
+        lambda update: dp.feed_raw_update(bot, update),
+        max_concurrency=WEBHOOK_SETTINGS['worker_concurrency']
+    )
+    background_tasks = [asyncio.create_task(_resync_deal_locks(escrow_bot.db))]
+    # Общие для всех воркеров задачи выполняет только первый воркер
+    if index == 0:
+        background_tasks.append(asyncio.create_task(escrow_bot.db.run_stats_reconciliation()))
+        background_tasks.append(asyncio.create_task(escrow_bot.db.run_action_log_retention()))
+        # Один отправщик outbox на все воркеры - сохраняет порядок уведомлений в чате
+        background_tasks.append(asyncio.create_task(NotificationRelay(escrow_bot.db, bot).run()))
+
+    metrics_server = None
+    if METRICS_SETTINGS['enabled']:
+        metrics_server = MetricsServer(escrow_bot.db, METRICS_SETTINGS['host'], METRICS_SETTINGS['port'] + 1 + index)
+        await metrics_server.start()
+    logger.info(f"👷 Воркер {index} запущен")
+
+    parent = multiprocessing.parent_process()
+    try:
+        while True:
+            await executor.acquire()
+            draining = stopping.is_set()
+            item = await loop.run_in_executor(None, _next_item, worker_queue, not draining)
+            if item is _IDLE or item is None:
+                executor.slots.release()
+                if item is None or draining:
+                    break
+                # Родитель убит без drain() - сигнала остановки не будет
+                if parent is not None and not parent.is_alive():
+                    logger.warning(f"⚠️ Процесс приема обновлений завершился, воркер {index} останавливается")
+                    stopping.set()
+                continue
+            user_id, update = item
+            executor.submit(user_id, update)
+    finally:
+        await executor.join()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        if metrics_server is not None:
+            await metrics_server.stop()
+        await escrow_bot.db.close()
+        await dp.storage.close()
+        await bot.session.close()
+        logger.info(f"👋 Воркер {index} остановлен")
+
+
+async def _resync_deal_locks(db):
+    """Периодическая сверка кеша блокировки: его меняют и другие воркеры"""
+    interval = WEBHOOK_SETTINGS['lock_resync_interval']
+    while True:
+        await asyncio.sleep(interval)
+        await db.verify_active_deal_locks(repair=True)